@@ -155,6 +155,9 @@ class PRManRender(bpy.types.RenderEngine):
             return
 
         self.rman_render.rman_scene.bl_scene = scene
+        # we're called when the passes/AOVs were edited, so don't
+        # use a cached dictionary
+        display_utils.clear_dspy_dict_cache()
         dspy_dict = display_utils.get_dspy_dict(self.rman_render.rman_scene)
         self.register_pass(scene, renderlayer, "Combined", 4, "RGBA", 'COLOR')
         for i, dspy_nm in enumerate(dspy_dict['displays'].keys()):
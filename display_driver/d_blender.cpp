@@ -40,11 +40,17 @@
 #include "BlenderOptiXDenoiser.h"
 #endif
 
+#include <algorithm>
 #include <atomic>
+#include <mutex>
 
 typedef bool (*FuncPtr)();
 FuncPtr tag_redraw_func;
 
+// Size, in pixels, of the tiles we use to track which parts
+// of the framebuffer have changed
+static const int kDirtyTileSize = 64;
+
 struct BlenderImage
 {
     BlenderImage()
@@ -53,6 +59,8 @@ struct BlenderImage
         isXpu = false;
         framebuffer = nullptr;
         denoiseFrameBuffer = nullptr;
+        tilesX = 0;
+        tilesY = 0;
     }
 
     int width;
@@ -89,6 +97,14 @@ struct BlenderImage
     size_t noutputs;
     std::atomic<bool> bufferUpdated;
 
+    // One entry per kDirtyTileSize x kDirtyTileSize tile of the
+    // framebuffer, set when the tile is written to and cleared
+    // when read back with GetDirtyTiles
+    int tilesX;
+    int tilesY;
+    std::vector<unsigned char> dirtyTiles;
+    std::mutex dirtyTilesMutex;
+
     // These two aren't currently used
     // but are needed if we decide to use a
     // fragment shader
@@ -131,6 +147,34 @@ private:
 
 static std::vector<BlenderImage*> s_blenderImages;
 
+void ResizeDirtyTiles(BlenderImage* blenderImage)
+{
+    std::lock_guard<std::mutex> lock(blenderImage->dirtyTilesMutex);
+    blenderImage->tilesX = (blenderImage->width + kDirtyTileSize - 1) / kDirtyTileSize;
+    blenderImage->tilesY = (blenderImage->height + kDirtyTileSize - 1) / kDirtyTileSize;
+    blenderImage->dirtyTiles.assign(blenderImage->tilesX * blenderImage->tilesY, 0);
+}
+
+// Mark the tiles overlapping the given framebuffer region as dirty.
+// Coordinates are inclusive, and in framebuffer (flipped) space.
+void MarkDirtyTiles(BlenderImage* blenderImage, int xmin, int xmax, int ymin, int ymax)
+{
+    std::lock_guard<std::mutex> lock(blenderImage->dirtyTilesMutex);
+    if (blenderImage->dirtyTiles.empty())
+        return;
+    int txmin = std::max(xmin, 0) / kDirtyTileSize;
+    int txmax = std::min(xmax / kDirtyTileSize, blenderImage->tilesX - 1);
+    int tymin = std::max(ymin, 0) / kDirtyTileSize;
+    int tymax = std::min(ymax / kDirtyTileSize, blenderImage->tilesY - 1);
+    for (int ty = tymin; ty <= tymax; ++ty)
+    {
+        for (int tx = txmin; tx <= txmax; ++tx)
+        {
+            blenderImage->dirtyTiles[ty * blenderImage->tilesX + tx] = 1;
+        }
+    }
+}
+
 bool DenoiseBuffer(BlenderImage* blenderImage)
 {
 #ifndef OSX
@@ -437,6 +481,41 @@ void DrawBufferToBlender(int viewWidth, int viewHeight)
     glDeleteTextures(1, &blenderImage->texture_id);
 }
 
+// Return the size of the tiles used by GetDirtyTiles
+PRMANEXPORT
+int GetDirtyTileSize()
+{
+    return kDirtyTileSize;
+}
+
+// Copy the dirty tile bitmap for this display into tiles, and clear it.
+// tiles is a row major array of ceil(width/tilesize) * ceil(height/tilesize)
+// entries, with the first row at the start of the framebuffer. Returns the
+// number of dirty tiles, or -1 if numTiles doesn't match this display.
+PRMANEXPORT
+int GetDirtyTiles(size_t pos, unsigned char* tiles, int numTiles)
+{
+    if (s_blenderImages.empty() || pos >= s_blenderImages.size())
+        return -1;
+
+    BlenderImage* blenderImage = s_blenderImages[pos];
+    if (blenderImage == nullptr)
+        return -1;
+
+    std::lock_guard<std::mutex> lock(blenderImage->dirtyTilesMutex);
+    if (numTiles != int(blenderImage->dirtyTiles.size()))
+        return -1;
+
+    int numDirty = 0;
+    for (int i = 0; i < numTiles; ++i)
+    {
+        tiles[i] = blenderImage->dirtyTiles[i];
+        numDirty += tiles[i];
+    }
+    std::fill(blenderImage->dirtyTiles.begin(), blenderImage->dirtyTiles.end(), 0);
+    return numDirty;
+}
+
 PRMANEXPORT
 void SetRedrawCallback(bool(*pyfuncobj)())
 {
@@ -562,6 +641,7 @@ DspyImageOpen(
     /* Reserve a framebuffer */
     blenderImage->size = blenderImage->width * blenderImage->height * blenderImage->entrysize;
     blenderImage->framebuffer = (unsigned char*) std::malloc(blenderImage->size);
+    ResizeDirtyTiles(blenderImage);
 
     *ppvImage = blenderImage;
     s_blenderImages.push_back(blenderImage);
@@ -668,6 +748,10 @@ DspyImageData(
     blenderImage->arXMax = blenderImage->cropXMin + xmax_plus_1 - 1;
     blenderImage->arYMin = blenderImage->cropYMin + ymin;
     blenderImage->arYMax = blenderImage->cropYMin + ymax_plus_1 - 1;
+    MarkDirtyTiles(blenderImage, 
+                   blenderImage->arXMin, blenderImage->arXMax,
+                   (blenderImage->height-1) - blenderImage->arYMax,
+                   (blenderImage->height-1) - blenderImage->arYMin);
     if( blenderImage->arXMin != 0 || 
         blenderImage->arXMax != blenderImage->width-1 || 
         blenderImage->arYMin != 0 || 
@@ -826,6 +910,7 @@ bool DisplayBlender::Rebind(const uint32_t width, const uint32_t height,
    }
 
    m_image->framebuffer = (unsigned char*) std::malloc(m_image->size);
+   ResizeDirtyTiles(m_image);
    if (m_image->use_denoiser)
    {
         m_image->denoiseFrameBuffer = (unsigned char*) std::malloc(m_image->size);
@@ -855,7 +940,17 @@ void DisplayBlender::Notify(const uint32_t iteration, const uint32_t totaliterat
         return;
     }
     CopyXpuBuffer(m_image);
+    // XPU hands us the whole image every iteration
+    MarkDirtyTiles(m_image, 0, m_image->width-1, 0, m_image->height-1);
     m_image->bufferUpdated = true;
+
+    if (tag_redraw_func)
+    {
+        if (!tag_redraw_func())
+        {
+            tag_redraw_func = NULL;
+        }
+    }
 }
 
 static void closeBlenderImages()
@@ -73,6 +73,10 @@ __DEFAULTS__ = {
     'rman_show_advanced_params': False,      
     'rman_config_dir': "",
     'rman_viewport_refresh_rate': 0.01,
+    'rman_viewport_max_fps': 30,
+    'rman_mesh_export_buffers': True,
+    'rman_export_profile': False,
+    'rman_export_profile_dir': os.path.join('<OUT>', 'profiles'),
     'rman_solo_collapse_nodes': True,
     'rman_use_blend_dir_token': True,          
     'rman_ui_framework': "NATIVE",
@@ -453,6 +457,33 @@ class RendermanPreferences(AddonPreferences):
         max=0.1
     )    
 
+    rman_viewport_max_fps: IntProperty(
+        name="Viewport Max Redraws",
+        description="The maximum number of times per second the viewport is redrawn during IPR. Bursts of updates from the renderer are combined into a single redraw. Once the render has converged, the viewport is redrawn much less often.",
+        default=30,
+        min=1,
+        max=120
+    )
+
+    rman_mesh_export_buffers: BoolProperty(
+        name="Export Mesh Buffers",
+        default=True,
+        description="Pass mesh points, normals and topology to RenderMan as contiguous arrays, instead of converting them to Python lists first. This is faster and uses less memory for large meshes. If the RenderMan bindings cannot accept arrays, lists are used automatically."
+    )
+
+    rman_export_profile: BoolProperty(
+        name="Profile Export",
+        default=False,
+        description="Record how long each part of the scene export takes, including per object timing, and write a report for every frame. Reports can be opened with chrome://tracing. Advanced: Setting the RFB_EXPORT_PROFILE environment variable will override this preference."
+    )
+
+    rman_export_profile_dir: StringProperty(
+        name="Profile Directory",
+        subtype='DIR_PATH',
+        description="Directory to write export profile reports to.",
+        default=os.path.join('<OUT>', 'profiles')
+    )
+
     rman_solo_collapse_nodes: BoolProperty(
         name="Collapse Non-Solo Nodes",
         default=True,
@@ -695,6 +726,11 @@ class RendermanPreferences(AddonPreferences):
             col.label(text='Other', icon_value=rman_r_icon.icon_id)
 
             col.prop(self, 'rman_viewport_refresh_rate')  
+            col.prop(self, 'rman_viewport_max_fps')
+            col.prop(self, 'rman_mesh_export_buffers')
+            col.prop(self, 'rman_export_profile')
+            if self.rman_export_profile:
+                col.prop(self, 'rman_export_profile_dir')
             col.prop(self, 'rman_config_dir')   
             if self.rman_do_preview_renders:
                 col.prop(self, 'rman_preview_renders_minSamples')
@@ -0,0 +1,751 @@
+"""Stand-in bpy, mathutils, rman and rman_utils modules.
+
+These are just enough of the real modules for the add-on's translators to
+be imported and run outside of Blender, without a RenderMan install. The rman
+stand-in records every scene graph node that gets created and every primvar,
+param and attribute that gets set, so benchmarks can report how much data
+was exported.
+
+Anything not explicitly faked is filled in by _Stub, which can be called,
+subclassed and have any attribute looked up on it. This keeps the import-time
+use of bpy (operators, panels, properties, handlers) happy.
+
+Usage:
+    fake_modules.install()
+    addon = fake_modules.load_addon(addon_dir)
+"""
+
+import importlib
+import importlib.abc
+import importlib.machinery
+import math
+import os
+import sys
+import tempfile
+import types
+from collections import OrderedDict
+
+import numpy as np
+
+ADDON_PACKAGE_NAME = 'RenderManForBlender'
+
+
+class _StubMeta(type):
+    def __getattr__(cls, name):
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        stub = _StubMeta(name, (_Stub,), {})
+        setattr(cls, name, stub)
+        return stub
+
+    def __iter__(cls):
+        return iter(())
+
+    def __len__(cls):
+        return 0
+
+    def __bool__(cls):
+        return False
+
+
+class _Stub(metaclass=_StubMeta):
+    """Placeholder for anything we don't care about. Instances and
+    classes accept any call, and any attribute lookup."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        return _Stub()
+
+    def __call__(self, *args, **kwargs):
+        return _Stub()
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+    def __bool__(self):
+        return False
+
+
+class _StubModule(types.ModuleType):
+    """Module that makes up a _Stub class for any missing attribute."""
+
+    def __getattr__(self, name):
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        stub = _StubMeta(name, (_Stub,), {})
+        setattr(self, name, stub)
+        return stub
+
+
+def _make_module(name, cls=_StubModule, **attrs):
+    mod = cls(name)
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    sys.modules[name] = mod
+    return mod
+
+
+# ---------------------------------------------------------------------------
+# bpy.props and PropertyGroups
+# ---------------------------------------------------------------------------
+
+class FakeProperty(object):
+    """What bpy.props functions return. Holds on to the property
+    kind and keyword arguments, so PropertyGroups can work out the
+    default value."""
+
+    def __init__(self, kind, args, kwargs):
+        self.kind = kind
+        self.args = args
+        self.kwargs = kwargs
+
+    def __get__(self, instance, owner):
+        # properties added to ID types, ex: bpy.types.Object.renderman
+        if instance is None:
+            return self
+        values = instance.__dict__.setdefault('_fake_props', dict())
+        if id(self) not in values:
+            values[id(self)] = self.get_default()
+        return values[id(self)]
+
+    def get_default(self):
+        kwargs = self.kwargs
+        if self.kind == 'PointerProperty':
+            ptype = kwargs.get('type', None)
+            if isinstance(ptype, type) and issubclass(ptype, FakePropertyGroup):
+                return ptype()
+            return None
+        if self.kind == 'CollectionProperty':
+            return FakeCollection(kwargs.get('type', None))
+        if 'default' in kwargs:
+            dflt = kwargs['default']
+            if self.kind == 'EnumProperty' and isinstance(dflt, set):
+                return set(dflt)
+            if isinstance(dflt, (list, tuple)):
+                return FakeVector(dflt) if self.kind == 'FloatVectorProperty' else list(dflt)
+            return dflt
+        if self.kind == 'BoolProperty':
+            return False
+        if self.kind == 'IntProperty':
+            return 0
+        if self.kind == 'FloatProperty':
+            return 0.0
+        if self.kind == 'StringProperty':
+            return ''
+        if self.kind in ('FloatVectorProperty', 'IntVectorProperty', 'BoolVectorProperty'):
+            size = kwargs.get('size', 3)
+            return FakeVector([0.0] * size)
+        if self.kind == 'EnumProperty':
+            items = kwargs.get('items', None)
+            if isinstance(items, (list, tuple)) and items:
+                return items[0][0]
+            return ''
+        return None
+
+
+def _fake_prop(kind):
+    def prop(*args, **kwargs):
+        return FakeProperty(kind, args, kwargs)
+    prop.__name__ = kind
+    return prop
+
+
+class FakeCollection(list):
+    """Stand-in for bpy_prop_collection."""
+
+    def __init__(self, item_type=None, items=()):
+        super().__init__(items)
+        self.item_type = item_type
+
+    def add(self):
+        item = self.item_type() if self.item_type else FakePropertyGroup()
+        self.append(item)
+        return item
+
+    def get(self, key, default=None):
+        for item in self:
+            if getattr(item, 'name', None) == key:
+                return item
+        return default
+
+    def keys(self):
+        return [getattr(item, 'name', '') for item in self]
+
+    def foreach_get(self, attr, seq):
+        values = np.array([getattr(item, attr) for item in self], dtype=seq.dtype)
+        seq[:] = values.ravel()
+
+
+class FakePropertyGroup(object):
+    """Stand-in for bpy.types.PropertyGroup. Attributes default
+    to the values declared in the class annotations, just like
+    a registered PropertyGroup."""
+
+    def __init__(self, **kwargs):
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+
+    def __getattr__(self, name):
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        for klass in type(self).__mro__:
+            annotations = klass.__dict__.get('__annotations__', dict())
+            prop = annotations.get(name, None)
+            if isinstance(prop, FakeProperty):
+                val = prop.get_default()
+                object.__setattr__(self, name, val)
+                return val
+        raise AttributeError("'%s' has no attribute '%s'" % (type(self).__name__, name))
+
+    @property
+    def bl_rna(self):
+        cls = type(self)
+        bl_rna = cls.__dict__.get('_fake_bl_rna', None)
+        if bl_rna is None:
+            properties = FakeCollection()
+            for klass in reversed(cls.__mro__):
+                for name, prop in klass.__dict__.get('__annotations__', dict()).items():
+                    if not isinstance(prop, FakeProperty):
+                        continue
+                    default = prop.get_default()
+                    is_array = isinstance(default, (list, tuple))
+                    properties.append(types.SimpleNamespace(identifier=name,
+                                                            name=name,
+                                                            type=prop.kind.replace('Property', '').upper(),
+                                                            default=None if is_array else default,
+                                                            default_array=default if is_array else None))
+            bl_rna = types.SimpleNamespace(properties=properties)
+            cls._fake_bl_rna = bl_rna
+        return bl_rna
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def is_property_set(self, name):
+        return name in self.__dict__
+
+
+class FakeVector(list):
+    """Stand-in for mathutils.Vector, and the float array properties."""
+
+    @property
+    def x(self):
+        return self[0]
+
+    @property
+    def y(self):
+        return self[1]
+
+    @property
+    def z(self):
+        return self[2]
+
+    @property
+    def length_squared(self):
+        return sum(v * v for v in self)
+
+    @property
+    def length(self):
+        return math.sqrt(self.length_squared)
+
+    def __getitem__(self, idx):
+        val = list.__getitem__(self, idx)
+        if isinstance(idx, slice):
+            return tuple(val)
+        return val
+
+    def __neg__(self):
+        return FakeVector(-v for v in self)
+
+
+class FakeMatrix(object):
+    """Stand-in for a 4x4 mathutils.Matrix, backed by a NumPy array."""
+
+    def __init__(self, rows=None):
+        if rows is None:
+            self.m = np.identity(4)
+        else:
+            self.m = np.array(rows, dtype=np.float64).reshape(4, 4)
+
+    def __getitem__(self, idx):
+        return self.m[idx]
+
+    def __len__(self):
+        return 4
+
+    def __iter__(self):
+        return iter(self.m)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.m.astype(dtype) if dtype else self.m
+
+    def __matmul__(self, other):
+        if isinstance(other, FakeMatrix):
+            return FakeMatrix(self.m @ other.m)
+        v = np.append(np.asarray(other, dtype=np.float64)[:3], 1.0)
+        return FakeVector((self.m @ v)[:3].tolist())
+
+    def inverted_safe(self):
+        try:
+            return FakeMatrix(np.linalg.inv(self.m))
+        except np.linalg.LinAlgError:
+            return FakeMatrix()
+
+    def inverted(self):
+        return FakeMatrix(np.linalg.inv(self.m))
+
+    def copy(self):
+        return FakeMatrix(self.m.copy())
+
+    @staticmethod
+    def Identity(size):
+        return FakeMatrix()
+
+    @staticmethod
+    def Translation(v):
+        m = FakeMatrix()
+        m.m[:3, 3] = v[:3]
+        return m
+
+
+def _persistent(func):
+    return func
+
+
+# ---------------------------------------------------------------------------
+# rman
+# ---------------------------------------------------------------------------
+
+class FakeStats(object):
+    """Counts of what was handed to the rman stand-in."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = dict()
+        self.calls = 0
+        self.values = 0
+
+    def add_node(self, kind):
+        self.nodes[kind] = self.nodes.get(kind, 0) + 1
+
+    def add_values(self, data):
+        self.calls += 1
+        try:
+            self.values += len(data)
+        except TypeError:
+            self.values += 1
+
+    def as_dict(self):
+        return {'nodes': dict(self.nodes), 'calls': self.calls, 'values': self.values}
+
+
+STATS = FakeStats()
+
+
+class FakeTokens(object):
+    """rman.Tokens.Rix.k_XXX just returns the token name."""
+
+    def __getattr__(self, name):
+        if name.startswith('k_'):
+            return name[2:].replace('_', ':', 1) if name.startswith('k_Ri_') else name[2:]
+        raise AttributeError(name)
+
+
+class FakeParamList(object):
+    """Stand-in for RtParamList/RtPrimVar. Every Set* call is recorded."""
+
+    def __init__(self):
+        self.params = dict()
+
+    def __getattr__(self, name):
+        if name.startswith('Set'):
+            def setter(param_name, data=None, *args):
+                self.params[param_name] = data
+                STATS.add_values(data)
+            return setter
+        if name.startswith('Get'):
+            def getter(param_name, *args):
+                return self.params.get(param_name, None)
+            return getter
+        raise AttributeError(name)
+
+    def Clear(self):
+        self.params.clear()
+
+    def Remove(self, name):
+        self.params.pop(name, None)
+
+    def Inherit(self, other):
+        self.params.update(other.params)
+
+    def SetTimes(self, times):
+        self.params['__times__'] = list(times)
+
+    def HasParam(self, name):
+        return name in self.params
+
+    def Update(self, other):
+        self.params.update(other.params)
+
+
+class FakeIdentifier(object):
+    def __init__(self, name):
+        self.name = name
+
+    def CStr(self):
+        return self.name
+
+
+class FakeSGNode(object):
+    """Stand-in for every RixSceneGraph node type."""
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.children = list()
+        self.primvars = FakeParamList()
+        self.attributes = FakeParamList()
+        self.params = FakeParamList()
+        self.transform = None
+        self.material = None
+        self.hidden = 0
+        STATS.add_node(kind)
+
+    def GetIdentifier(self):
+        return FakeIdentifier(self.name)
+
+    def GetPrimVars(self):
+        pv = FakeParamList()
+        pv.params.update(self.primvars.params)
+        return pv
+
+    def SetPrimVars(self, primvars):
+        self.primvars = primvars
+
+    def GetAttributes(self):
+        attrs = FakeParamList()
+        attrs.params.update(self.attributes.params)
+        return attrs
+
+    def SetAttributes(self, attrs):
+        self.attributes = attrs
+
+    def AddChild(self, child):
+        self.children.append(child)
+
+    def RemoveChild(self, child):
+        if child in self.children:
+            self.children.remove(child)
+
+    def GetNumChildren(self):
+        return len(self.children)
+
+    def GetChild(self, idx):
+        return self.children[idx]
+
+    def SetTransform(self, m):
+        self.transform = m
+
+    def SetMaterial(self, mat):
+        self.material = mat
+
+    def SetHidden(self, hidden):
+        self.hidden = hidden
+
+    def __getattr__(self, name):
+        # Define, SetScheme, SetBxdf, SetTransformNumSamples, etc.
+        if name[0].isupper():
+            def method(*args, **kwargs):
+                STATS.calls += 1
+                return None
+            return method
+        raise AttributeError(name)
+
+
+class FakeSGScene(object):
+    """Stand-in for RixSGScene. Create* returns a FakeSGNode."""
+
+    def __init__(self):
+        self.root = FakeSGNode('Root', '')
+        self.deleted = 0
+
+    def Root(self):
+        return self.root
+
+    def DeleteDagNode(self, node):
+        self.deleted += 1
+
+    def __getattr__(self, name):
+        if name.startswith('Create'):
+            kind = name[len('Create'):]
+
+            def create(db_name='', *args):
+                return FakeSGNode(kind, db_name)
+            return create
+        raise AttributeError(name)
+
+
+class FakeSGManager(object):
+    """Stand-in for rman.SGManager."""
+
+    @staticmethod
+    def RixSGShader(shader_type, name, handle):
+        return FakeSGNode('Shader:%s' % shader_type, handle)
+
+    @staticmethod
+    def CreateScene(*args, **kwargs):
+        return FakeSGScene()
+
+    @staticmethod
+    def DeleteScene(sg_scene):
+        pass
+
+
+class FakeRtFloat3(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+
+class FakeRtMatrix4x4(object):
+    def __init__(self, *args):
+        self.m = list(args)
+
+
+def _make_rman():
+    rman = _make_module('rman')
+    rman.Tokens = types.SimpleNamespace(Rix=FakeTokens())
+    rman.Types = _make_module('rman.Types',
+                              RtParamList=FakeParamList,
+                              RtPrimVar=FakeParamList,
+                              RtFloat3=FakeRtFloat3,
+                              RtColorRGB=FakeRtFloat3,
+                              RtPoint3=FakeRtFloat3,
+                              RtVector3=FakeRtFloat3,
+                              RtNormal3=FakeRtFloat3,
+                              RtMatrix4x4=FakeRtMatrix4x4)
+    rman.SGManager = FakeSGManager
+    return rman
+
+
+# ---------------------------------------------------------------------------
+# rman_utils
+# ---------------------------------------------------------------------------
+
+class FakeNodeDescParam(object):
+    """Stand-in for rman_utils.node_desc_param.NodeDescParam. Only the JSON
+    flavor is actually used, to parse the rman_config files."""
+
+    optional_attrs = []
+    keywords = []
+
+    def __init__(self, pdata=None, *args, **kwargs):
+        pdata = pdata if isinstance(pdata, dict) else dict()
+        self._name = pdata.get('name', '')
+        self.type = pdata.get('type', 'float')
+        self.default = pdata.get('default', None)
+        self.size = pdata.get('size', None)
+        self.connectable = pdata.get('connectable', True)
+        for k, v in pdata.items():
+            if k in ('name', 'options', 'conditionalVisOps', 'conditionalLockOps'):
+                continue
+            setattr(self, k, v)
+        if 'options' in pdata:
+            self._set_options(pdata['options'])
+
+    def _set_options(self, options):
+        if not isinstance(options, str):
+            self.options = options
+            return
+        self.options = OrderedDict()
+        for opt in options.split('|'):
+            label, _, value = opt.partition(':')
+            self.options[label] = value if value else label
+
+    def is_array(self):
+        return self.size is not None and self.size != 1 and self.type not in ('string',)
+
+
+def _osl_metadatum(metadict, name, default=None):
+    return default
+
+
+# ---------------------------------------------------------------------------
+# bpy
+# ---------------------------------------------------------------------------
+
+class FakeID(object):
+    """Base for the fake ID datablocks (objects, meshes, materials)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.name_full = name
+
+    @property
+    def original(self):
+        return self
+
+    def evaluated_get(self, depsgraph):
+        return self
+
+    def __hash__(self):
+        return id(self)
+
+
+def _make_bpy():
+    bpy = _make_module('bpy')
+
+    props = _make_module('bpy.props', cls=types.ModuleType)
+    for kind in ('BoolProperty', 'BoolVectorProperty', 'CollectionProperty',
+                 'EnumProperty', 'FloatProperty', 'FloatVectorProperty',
+                 'IntProperty', 'IntVectorProperty', 'PointerProperty',
+                 'StringProperty', 'RemoveProperty'):
+        setattr(props, kind, _fake_prop(kind))
+    bpy.props = props
+
+    bl_types = _make_module('bpy.types')
+    bl_types.PropertyGroup = FakePropertyGroup
+    bl_types.ID = FakeID
+    for name in ('Object', 'Mesh', 'Material', 'Camera', 'Light', 'World', 'Scene',
+                 'ParticleSystem', 'ParticleSettings', 'NodeTree', 'Node',
+                 'ShaderNode', 'NodeSocket', 'Image', 'Collection',
+                 'DepsgraphObjectInstance'):
+        setattr(bl_types, name, type(name, (FakeID,), {}))
+    alive_state = types.SimpleNamespace(enum_items={'ALIVE': types.SimpleNamespace(value=3)})
+    bl_types.Particle = type('Particle', (object,), {
+        'bl_rna': types.SimpleNamespace(properties={'alive_state': alive_state})})
+    bpy.types = bl_types
+
+    handlers = _make_module('bpy.app.handlers', persistent=_persistent)
+    for name in ('load_pre', 'load_post', 'save_pre', 'save_post',
+                 'depsgraph_update_pre', 'depsgraph_update_post',
+                 'frame_change_pre', 'frame_change_post', 'render_init',
+                 'render_pre', 'render_post', 'render_complete',
+                 'render_cancel', 'version_update'):
+        setattr(handlers, name, list())
+    timers = _make_module('bpy.app.timers',
+                          register=lambda *args, **kwargs: None,
+                          unregister=lambda *args, **kwargs: None,
+                          is_registered=lambda *args, **kwargs: False)
+    bpy.app = _make_module('bpy.app',
+                           background=True,
+                           version=(3, 0, 0),
+                           version_string='3.0.0',
+                           binary_path='',
+                           handlers=handlers,
+                           timers=timers,
+                           translations=_Stub())
+
+    tmp_dir = tempfile.gettempdir()
+    bpy.utils = _make_module('bpy.utils',
+                             register_class=lambda cls: None,
+                             unregister_class=lambda cls: None,
+                             user_resource=lambda *args, **kwargs: tmp_dir,
+                             script_path_user=lambda: tmp_dir)
+    bpy.utils.previews = _make_module('bpy.utils.previews')
+
+    bpy.data = types.SimpleNamespace(filepath='',
+                                     objects=FakeCollection(),
+                                     materials=FakeCollection(),
+                                     meshes=FakeCollection(),
+                                     lights=FakeCollection(),
+                                     worlds=FakeCollection(),
+                                     images=FakeCollection(),
+                                     node_groups=FakeCollection(),
+                                     collections=FakeCollection(),
+                                     scenes=FakeCollection(),
+                                     libraries=FakeCollection(),
+                                     is_dirty=False)
+    bpy.context = types.SimpleNamespace(
+        preferences=types.SimpleNamespace(addons=dict(),
+                                          filepaths=types.SimpleNamespace(temporary_directory=tmp_dir)),
+        scene=None,
+        view_layer=None,
+        engine='PRMAN_RENDER')
+    bpy.ops = _Stub()
+    bpy.path = _make_module('bpy.path', cls=types.ModuleType,
+                            abspath=lambda p, **kwargs: p,
+                            basename=os.path.basename)
+    return bpy
+
+
+# modules that are stubbed out entirely, along with all of their submodules
+STUBBED_PACKAGES = ('bgl', 'blf', 'gpu', 'gpu_extras', 'bpy_extras', 'nodeitems_utils',
+                    'bl_ui', 'bl_operators', 'rman_utils', 'tractor', '_cycles')
+
+
+class _StubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """Import hook that makes up a _StubModule for anything in
+    STUBBED_PACKAGES."""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname.split('.')[0] not in STUBBED_PACKAGES:
+            return None
+        return importlib.machinery.ModuleSpec(fullname, self, is_package=True)
+
+    def create_module(self, spec):
+        mod = _StubModule(spec.name)
+        mod.__path__ = []
+        return mod
+
+    def exec_module(self, module):
+        pass
+
+
+def install():
+    """Put the stand-in modules into sys.modules. Must be
+    called before anything from the add-on is imported."""
+    if 'bpy' in sys.modules:
+        return
+    _make_bpy()
+    _make_module('mathutils', Matrix=FakeMatrix, Vector=FakeVector,
+                 Color=FakeVector, Euler=FakeVector, Quaternion=FakeVector)
+    sys.meta_path.insert(0, _StubFinder())
+    importlib.import_module('rman_utils')
+    _make_module('rman_utils.node_desc_param',
+                 NodeDescParam=FakeNodeDescParam,
+                 NodeDescParamXML=FakeNodeDescParam,
+                 NodeDescParamOSL=FakeNodeDescParam,
+                 NodeDescParamJSON=FakeNodeDescParam,
+                 osl_metadatum=_osl_metadatum)
+    _make_module('rman_utils.node_desc', NodeDesc=_Stub)
+    _make_rman()
+
+
+def load_addon(addon_dir):
+    """Make the add-on importable as a package, without running its
+    __init__.py (which registers everything with Blender), and set up
+    just enough of its environment for the translators to run.
+
+    Returns:
+        (module) - the add-on package
+    """
+    if ADDON_PACKAGE_NAME in sys.modules:
+        return sys.modules[ADDON_PACKAGE_NAME]
+    pkg = types.ModuleType(ADDON_PACKAGE_NAME)
+    pkg.__path__ = [addon_dir]
+    pkg.__file__ = os.path.join(addon_dir, '__init__.py')
+    sys.modules[ADDON_PACKAGE_NAME] = pkg
+
+    envconfig_utils = importlib.import_module('%s.rfb_utils.envconfig_utils' % ADDON_PACKAGE_NAME)
+    envconfig_utils.__RMAN_ENV_CONFIG__ = envconfig_utils.RmanEnvConfig()
+
+    rman_config = importlib.import_module('%s.rman_config' % ADDON_PACKAGE_NAME)
+    rman_config.register()
+
+    # texture_utils and property_utils import each other, and only work
+    # when texture_utils is imported first, which is what happens in Blender
+    importlib.import_module('%s.rfb_utils.texture_utils' % ADDON_PACKAGE_NAME)
+
+    rman_properties = importlib.import_module('%s.rman_properties' % ADDON_PACKAGE_NAME)
+    rman_properties.pre_register()
+    rman_properties.register()
+    return pkg
@@ -0,0 +1,465 @@
+"""Synthetic scenes for the translator benchmarks.
+
+Builds meshes, particle systems, materials, objects and a depsgraph out of
+the stand-in bpy types from fake_modules. All bulk data is kept in NumPy
+arrays and handed out through foreach_get, like the real thing, so the
+translators see the same access patterns they do in Blender.
+
+fake_modules.install() and fake_modules.load_addon() need to be called
+before any of these are created.
+"""
+
+import types
+
+import numpy as np
+
+import bpy
+from fake_modules import FakeCollection, FakeMatrix, FakeVector
+
+# value of the 'ALIVE' item in bpy.types.Particle.alive_state
+ALIVE_STATE = 3
+
+
+class FakeArrayCollection(object):
+    """A bpy_prop_collection whose attributes are stored as NumPy arrays,
+    one row per item."""
+
+    def __init__(self, length, **arrays):
+        self.length = length
+        self.arrays = arrays
+
+    def __len__(self):
+        return self.length
+
+    def foreach_get(self, attr, seq):
+        seq[:] = self.arrays[attr].ravel()
+
+    def foreach_set(self, attr, seq):
+        self.arrays[attr] = np.asarray(seq).reshape(self.arrays[attr].shape)
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+    def __getitem__(self, idx):
+        item = types.SimpleNamespace(index=idx, groups=[])
+        for attr, arr in self.arrays.items():
+            setattr(item, attr, arr[idx])
+        return item
+
+
+class FakeLayer(object):
+    """UV map, or vertex color layer."""
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+
+class FakeLayers(list):
+    """mesh.uv_layers, mesh.vertex_colors, and mesh.attributes."""
+
+    def __init__(self, layers=()):
+        super().__init__(layers)
+        self.active = self[0] if len(self) else None
+
+    def get(self, name, default=None):
+        for layer in self:
+            if layer.name == name:
+                return layer
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.get(key)
+        return list.__getitem__(self, key)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+
+class FakeMesh(bpy.types.Mesh):
+    """A mesh, plus the evaluated mesh returned by Object.to_mesh()."""
+
+    def __init__(self, name, P, nverts, verts, uvs=None, materials=None):
+        super().__init__(name)
+        npolys = len(nverts)
+        nloops = len(verts)
+        loop_start = np.cumsum(nverts) - nverts
+        self.P = P
+        self.vertices = FakeArrayCollection(len(P), co=P)
+        self.polygons = FakeArrayCollection(npolys,
+                                            loop_total=nverts,
+                                            loop_start=loop_start,
+                                            material_index=np.zeros(npolys, dtype=np.int32),
+                                            use_smooth=np.zeros(npolys, dtype=np.int32),
+                                            normal=np.tile(np.array([0.0, 0.0, 1.0], dtype=np.float32), (npolys, 1)))
+        loop_normals = np.tile(np.array([0.0, 0.0, 1.0], dtype=np.float32), (nloops, 1))
+        self.loops = FakeArrayCollection(nloops,
+                                         vertex_index=verts,
+                                         normal=loop_normals,
+                                         tangent=loop_normals,
+                                         bitangent=loop_normals)
+        edges = _get_edges(nverts, verts)
+        self.edges = FakeArrayCollection(len(edges),
+                                         vertices=edges,
+                                         crease=np.zeros(len(edges), dtype=np.float32))
+        layers = []
+        if uvs is not None:
+            layers.append(FakeLayer('UVMap', FakeArrayCollection(nloops, uv=uvs)))
+        self.uv_layers = FakeLayers(layers)
+        self.vertex_colors = FakeLayers()
+        self.attributes = FakeLayers()
+        self.materials = FakeCollection(items=materials or [])
+        self.shape_keys = None
+        self.use_auto_smooth = False
+
+    def set_material_indices(self, material_ids):
+        self.polygons.arrays['material_index'] = np.asarray(material_ids, dtype=np.int32)
+
+    def calc_normals_split(self):
+        pass
+
+    def calc_tangents(self, uvmap=''):
+        pass
+
+    def free_tangents(self):
+        pass
+
+
+def _get_edges(nverts, verts):
+    # unique edges of the polygons
+    loop_start = np.cumsum(nverts) - nverts
+    nxt = np.arange(len(verts)) + 1
+    ends = np.repeat(loop_start + nverts, nverts)
+    nxt[nxt == ends] = np.repeat(loop_start, nverts)[nxt == ends]
+    edges = np.stack([verts, verts[nxt]], axis=1)
+    edges.sort(axis=1)
+    return np.unique(edges, axis=0).astype(np.int32)
+
+
+def make_grid_mesh(name, size, materials=None):
+    """A size x size grid of quads, with a UV map.
+
+    Returns:
+        (FakeMesh) - the mesh
+    """
+    n = size + 1
+    xs, ys = np.meshgrid(np.linspace(-1.0, 1.0, n), np.linspace(-1.0, 1.0, n))
+    P = np.stack([xs.ravel(), ys.ravel(), np.zeros(n * n)], axis=1).astype(np.float32)
+
+    row, col = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    v0 = (row * n + col).ravel()
+    verts = np.stack([v0, v0 + 1, v0 + n + 1, v0 + n], axis=1).ravel().astype(np.int32)
+    nverts = np.full(size * size, 4, dtype=np.int32)
+    uvs = (P[verts][:, :2] * 0.5 + 0.5).astype(np.float32)
+    return FakeMesh(name, P, nverts, verts, uvs=uvs, materials=materials)
+
+
+class FakeMaterial(bpy.types.Material):
+    """A material without a node tree, which gets exported
+    with RmanMaterialTranslator.export_simple_shader."""
+
+    def __init__(self, name, color=(0.8, 0.8, 0.8, 1.0)):
+        super().__init__(name)
+        self.diffuse_color = FakeVector(color)
+        self.metallic = 0.0
+        self.roughness = 0.5
+        self.grease_pencil = None
+        self.node_tree = None
+        self.animation_data = None
+
+
+class FakeMaterialSlot(object):
+    def __init__(self, material):
+        self.material = material
+        self.link = 'DATA'
+
+
+class FakeSocket(object):
+    def __init__(self, name, renderman_type='float'):
+        self.name = name
+        self.renderman_type = renderman_type
+        self.links = []
+
+    @property
+    def is_linked(self):
+        return len(self.links) > 0
+
+
+class FakeNode(object):
+    """A RenderMan pattern node, for walking shading networks."""
+
+    def __init__(self, name, num_inputs=1, renderman_type='float'):
+        self.name = name
+        self.bl_idname = 'PxrBenchmarkPatternNode'
+        self.bl_label = 'PxrBenchmarkPattern'
+        self.renderman_node_type = 'pattern'
+        self.inputs = [FakeSocket('input%d' % i, renderman_type) for i in range(num_inputs)]
+        self.outputs = [FakeSocket('resultF', 'float'), FakeSocket('resultRGB', 'color')]
+
+
+def link_nodes(from_node, output, to_node, input):
+    from_socket = from_node.outputs[output]
+    to_socket = to_node.inputs[input]
+    link = types.SimpleNamespace(from_node=from_node, from_socket=from_socket,
+                                 to_node=to_node, to_socket=to_socket)
+    from_socket.links.append(link)
+    to_socket.links.append(link)
+
+
+def make_node_chain(depth):
+    """A chain of depth nodes, each feeding the next. Every other
+    link is float->color, so it needs a conversion node. Returns the last node."""
+    node = FakeNode('Node0')
+    for i in range(1, depth):
+        next_node = FakeNode('Node%d' % i, renderman_type='color' if i % 2 else 'float')
+        link_nodes(node, 0, next_node, 0)
+        node = next_node
+    return node
+
+
+def make_node_layers(num_layers, width):
+    """num_layers layers of width nodes, where every node is connected to
+    every node of the layer above it, so each node is reached through
+    many paths. Returns the node at the bottom."""
+    layer = [FakeNode('Node0_%d' % i, num_inputs=0) for i in range(width)]
+    for j in range(1, num_layers):
+        next_layer = [FakeNode('Node%d_%d' % (j, i), num_inputs=width) for i in range(width)]
+        for node in next_layer:
+            for i, upstream in enumerate(layer):
+                link_nodes(upstream, 0, node, i)
+        layer = next_layer
+    out = FakeNode('Out', num_inputs=width)
+    for i, upstream in enumerate(layer):
+        link_nodes(upstream, 0, out, i)
+    return out
+
+
+class FakeParticleSettings(bpy.types.ParticleSettings):
+    def __init__(self, name, psys_type, num_children=0):
+        super().__init__(name)
+        self.type = psys_type
+        self.render_type = 'PATH' if psys_type == 'HAIR' else 'HALO'
+        self.material = 1
+        self.child_type = 'INTERPOLATED' if num_children else 'NONE'
+        self.root_radius = 1.0
+        self.tip_radius = 0.0
+        self.radius_scale = 0.01
+        self.render_step = 3
+        self.display_step = 2
+        self.display_percentage = 100
+
+
+class FakeParticleSystem(bpy.types.ParticleSystem):
+    """Hair or emitter particle system. Hair strands are stored as an
+    array of shape (num_strands, steps, 3), which co_hair reads from."""
+
+    def __init__(self, name, settings, num_particles, strands=None, num_children=0):
+        super().__init__(name)
+        self.settings = settings
+        rng = np.random.default_rng(len(name) + num_particles)
+        location = rng.uniform(-1.0, 1.0, (num_particles, 3)).astype(np.float32)
+        self.particles = FakeArrayCollection(
+            num_particles,
+            location=location,
+            velocity=rng.uniform(-0.1, 0.1, (num_particles, 3)).astype(np.float32),
+            angular_velocity=np.zeros((num_particles, 3), dtype=np.float32),
+            size=np.full(num_particles, 0.05, dtype=np.float32),
+            birth_time=np.zeros(num_particles, dtype=np.float32),
+            die_time=np.full(num_particles, 1000.0, dtype=np.float32),
+            lifetime=np.full(num_particles, 1000.0, dtype=np.float32),
+            alive_state=np.full(num_particles, ALIVE_STATE, dtype=np.int32))
+        self.child_particles = FakeArrayCollection(num_children)
+        self.strands = strands
+
+    def co_hair(self, ob, particle_no=0, step=0):
+        if step >= self.strands.shape[1]:
+            return FakeVector((0.0, 0.0, 0.0))
+        return FakeVector(self.strands[particle_no, step].tolist())
+
+
+def make_hair_system(name, num_strands, render_step=3):
+    """Hair with num_strands straight strands, each with
+    (2 ** render_step) + 1 points."""
+    settings = FakeParticleSettings(name, 'HAIR')
+    settings.render_step = render_step
+    steps = (2 ** render_step) + 1
+    rng = np.random.default_rng(num_strands)
+    roots = rng.uniform(-1.0, 1.0, (num_strands, 1, 3))
+    roots[:, :, 2] = 0.01
+    heights = np.linspace(0.0, 0.5, steps)[None, :, None] * np.array([0.0, 0.0, 1.0])
+    strands = (roots + heights).astype(np.float32)
+    return FakeParticleSystem(name, settings, num_strands, strands=strands)
+
+
+def make_emitter_system(name, num_particles):
+    settings = FakeParticleSettings(name, 'EMITTER')
+    return FakeParticleSystem(name, settings, num_particles)
+
+
+class FakeObject(bpy.types.Object):
+    def __init__(self, name, data, ob_type='MESH', matrix=None, materials=None):
+        super().__init__(name)
+        self.type = ob_type
+        self.data = data
+        self.matrix_world = matrix if matrix is not None else FakeMatrix()
+        self.matrix_local = self.matrix_world
+        self.parent = None
+        self.parent_type = 'OBJECT'
+        self.modifiers = []
+        self.particle_systems = []
+        self.material_slots = [FakeMaterialSlot(m) for m in (materials or [])]
+        self.vertex_groups = FakeLayers()
+        self.animation_data = None
+        self.color = FakeVector((1.0, 1.0, 1.0, 1.0))
+        self.show_instancer_for_render = True
+        self.show_instancer_for_viewport = True
+        self.hide_render = False
+        self.hide_viewport = False
+        self.is_instancer = False
+        self.instance_type = 'NONE'
+        self.instance_collection = None
+        self.users_collection = []
+        self.active_material = materials[0] if materials else None
+
+    def to_mesh(self):
+        return self.data
+
+    def to_mesh_clear(self):
+        pass
+
+
+class FakeCollectionDatablock(bpy.types.Collection):
+    """Stand-in for bpy.types.Collection (FakeCollection is the
+    stand-in for bpy_prop_collection)."""
+
+    def __init__(self, name, objects=(), offset=(0.0, 0.0, 0.0)):
+        super().__init__(name)
+        self.objects = FakeCollection(items=objects)
+        self.all_objects = self.objects
+        self.children = FakeCollection()
+        self.instance_offset = FakeVector(offset)
+        self.hide_render = False
+        self.hide_viewport = False
+        for ob in objects:
+            ob.users_collection.append(self)
+
+
+class FakeObjectInstance(bpy.types.DepsgraphObjectInstance):
+    """An object, or an instance of one created by an instancer
+    (when parent is set)."""
+
+    def __init__(self, ob, index, parent=None, matrix=None):
+        super().__init__(ob.name)
+        self.object = parent if parent else ob
+        self.instance_object = ob
+        self.is_instance = parent is not None
+        self.parent = parent
+        self.particle_system = None
+        self.persistent_id = [index + 1, 0]
+        self.show_particles = True
+        self.show_self = True
+        self.matrix = matrix
+
+    @property
+    def matrix_world(self):
+        if self.matrix is not None:
+            return self.matrix
+        return self.object.matrix_world
+
+
+class FakeDepsgraph(object):
+    def __init__(self, scene, objects, materials, instances=()):
+        self.scene = scene
+        self.scene_eval = scene
+        self.ids = list(materials) + list(objects)
+        self.objects = list(objects)
+        self.object_instances = [FakeObjectInstance(ob, i) for i, ob in enumerate(objects)]
+        self.object_instances.extend(instances)
+        self.view_layer = types.SimpleNamespace(objects=list(objects))
+        self.frame_changes = 0
+
+    def update(self):
+        pass
+
+
+class FakeScene(bpy.types.Scene):
+    def __init__(self, name='Scene', frame=1):
+        super().__init__(name)
+        self.frame_current = frame
+        self.camera = None
+        self.objects = FakeCollection()
+
+    def frame_set(self, frame, subframe=0.0):
+        self.frame_current = frame
+
+
+def translate(x, y, z=0.0):
+    return FakeMatrix.Translation((x, y, z))
+
+
+class SceneBuilder(object):
+    """Creates synthetic scenes, and registers their objects
+    in bpy.data so RmanScene can find them."""
+
+    def __init__(self):
+        self.scene = FakeScene()
+        self.objects = []
+        self.materials = []
+        self.instances = []
+
+    def add_material(self, name, color=(0.8, 0.8, 0.8, 1.0)):
+        mat = FakeMaterial(name, color=color)
+        self.materials.append(mat)
+        bpy.data.materials.append(mat)
+        return mat
+
+    def add_mesh_object(self, name, mesh, matrix=None):
+        ob = FakeObject(name, mesh, matrix=matrix, materials=list(mesh.materials))
+        self.objects.append(ob)
+        bpy.data.objects.append(ob)
+        return ob
+
+    def add_grid_objects(self, count, grid_size, materials=None):
+        cols = int(np.ceil(np.sqrt(count)))
+        obs = []
+        for i in range(count):
+            mesh = make_grid_mesh('Grid%d' % i, grid_size, materials=materials)
+            obs.append(self.add_mesh_object('Grid%d' % i, mesh,
+                                            matrix=translate((i % cols) * 3.0, (i // cols) * 3.0)))
+        return obs
+
+    def add_instances(self, parent, ob, matrices):
+        """Instances of ob, like the ones created by a geometry nodes modifier on parent."""
+        for matrix in matrices:
+            index = len(self.instances)
+            inst = FakeObjectInstance(ob, index, parent=parent, matrix=matrix)
+            inst.persistent_id = [index, 0]
+            self.instances.append(inst)
+
+    def add_collection_instances(self, collection, matrices):
+        """Empties instancing collection, and the instances the depsgraph
+        expands them into."""
+        offset = FakeMatrix.Translation(-collection.instance_offset)
+        empties = []
+        for i, matrix in enumerate(matrices):
+            empty = FakeObject('%s_instance%d' % (collection.name, i), None, ob_type='EMPTY', matrix=matrix)
+            empty.is_instancer = True
+            empty.instance_type = 'COLLECTION'
+            empty.instance_collection = collection
+            self.objects.append(empty)
+            bpy.data.objects.append(empty)
+            for j, ob in enumerate(collection.objects):
+                inst = FakeObjectInstance(ob, j, parent=empty, matrix=matrix @ offset @ ob.matrix_world)
+                inst.persistent_id = [j, 0]
+                self.instances.append(inst)
+            empties.append(empty)
+        return empties
+
+    def get_depsgraph(self):
+        return FakeDepsgraph(self.scene, self.objects, self.materials, self.instances)
+
+    def clear(self):
+        for collection in (bpy.data.objects, bpy.data.materials):
+            del collection[:]
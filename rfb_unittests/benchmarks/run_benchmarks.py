@@ -0,0 +1,652 @@
+"""Headless translator benchmarks.
+
+Runs the real translators, and RmanScene's instance export, against
+synthetic scenes using stand-in bpy and rman modules (see fake_modules.py),
+so they can run outside of Blender and without a RenderMan install. For each
+benchmark we report the throughput (items exported per second), the peak
+memory allocated by Python during the export, and how much data was handed
+to the scene graph. The startup benchmarks load the add-on in a fresh
+interpreter, with startup.py.
+
+Results are compared against baseline.json, and the script exits with
+a non-zero status if any benchmark is slower, or uses more memory, than
+the baseline allows. Speed is compared as the ratio of each benchmark's
+time to the time of a fixed reference workload (see time_reference), timed
+right before it, so a baseline recorded on one machine can be checked on
+another. The absolute times and throughputs in baseline.json are only
+there for information.
+
+Usage:
+    python run_benchmarks.py [--scale N] [--repeat N] [--tolerance X]
+                             [--only NAME ...] [--update-baseline]
+
+    --scale            multiply the size of every synthetic scene by N
+    --repeat           run each benchmark N times, and keep the fastest run (default: 5)
+    --tolerance        allowed regression, as a fraction of the baseline (default: 0.3)
+    --only             only run the named benchmarks
+    --update-baseline  write the results to baseline.json, instead of comparing
+
+The baseline is only meaningful for the --scale it was recorded with.
+The ratios still vary somewhat between machines (ex: with different cache
+sizes, or NumPy builds), so if a benchmark keeps failing on a machine where
+nothing changed, re-record the baseline there, rather than loosening the
+tolerance.
+"""
+
+import argparse
+import ctypes
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.dirname(os.path.dirname(BENCHMARKS_DIR))
+BASELINE_FILE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+
+if BENCHMARKS_DIR not in sys.path:
+    sys.path.insert(0, BENCHMARKS_DIR)
+
+import fake_modules  # noqa: E402
+fake_modules.install()
+fake_modules.load_addon(ADDON_DIR)
+
+import bpy  # noqa: E402
+import fake_scene  # noqa: E402
+from RenderManForBlender.rman_scene import RmanScene  # noqa: E402
+from RenderManForBlender.rman_render import RmanRender  # noqa: E402
+from RenderManForBlender.rman_translators import rman_material_translator  # noqa: E402
+from RenderManForBlender.rfb_utils import object_utils  # noqa: E402
+from RenderManForBlender.rfb_utils import shadergraph_utils  # noqa: E402
+from RenderManForBlender.rman_constants import RFB_PREFS_NAME  # noqa: E402
+from RenderManForBlender.preferences import __DEFAULTS__ as PREFS_DEFAULTS  # noqa: E402
+
+DEFORMING_MODIFIER = types.SimpleNamespace(type='WAVE', show_render=True, show_viewport=True)
+
+
+class FakeRender(object):
+    """Stand-in for RmanRender, which RmanScene only uses
+    for the rman module, stats and frame changes."""
+
+    def __init__(self, scene):
+        self.rman = sys.modules['rman']
+        self.stats_mgr = types.SimpleNamespace(set_export_stats=lambda *args: None)
+        self.bl_engine = types.SimpleNamespace(frame_set=scene.frame_set)
+
+
+def create_rman_scene(builder, do_motion_blur=False):
+    depsgraph = builder.get_depsgraph()
+    rman_scene = RmanScene(rman_render=FakeRender(builder.scene))
+    rman_scene.sg_scene = sys.modules['rman'].SGManager.CreateScene()
+    rman_scene.depsgraph = depsgraph
+    rman_scene.bl_scene = depsgraph.scene_eval
+    rman_scene.bl_view_layer = depsgraph.view_layer
+    rman_scene.do_motion_blur = do_motion_blur
+    rman_scene.reset()
+    rman_scene.bl_frame_current = rman_scene.bl_scene.frame_current
+    rman_scene.main_camera = types.SimpleNamespace(is_transforming=False, motion_steps=[])
+    return rman_scene
+
+
+class Benchmark(object):
+    """Base class for benchmarks. setup() builds the scene,
+    run() exports it, and returns the number of items exported.
+
+    Benchmarks that do their work in another process set elapsed,
+    peak_memory and stats from run(), since we can't measure them here.
+    """
+
+    name = ''
+    unit = 'items'
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.builder = None
+        self.elapsed = None
+        self.peak_memory = None
+        self.stats = None
+
+    def setup(self):
+        fake_modules.STATS.reset()
+        rman_material_translator.clear_material_cache()
+        self.builder = fake_scene.SceneBuilder()
+
+    def teardown(self):
+        self.builder.clear()
+        self.builder = None
+
+    def run(self):
+        raise NotImplementedError
+
+
+class MeshExport(Benchmark):
+    """RmanMeshTranslator.export/update on many grid meshes."""
+
+    name = 'mesh_export'
+    unit = 'polys'
+
+    def setup(self):
+        super().setup()
+        self.obs = self.builder.add_grid_objects(8 * self.scale, 100)
+        self.rman_scene = create_rman_scene(self.builder)
+
+    def run(self):
+        translator = self.rman_scene.rman_translators['MESH']
+        npolys = 0
+        for ob in self.obs:
+            rman_sg_mesh = translator.export(ob, object_utils.get_db_name(ob))
+            translator.update(ob, rman_sg_mesh)
+            npolys += rman_sg_mesh.npolys
+        return npolys
+
+
+class MeshListExport(MeshExport):
+    """MeshExport with the rman_mesh_export_buffers preference turned
+    off, so the mesh data is handed to the scene graph as lists."""
+
+    name = 'mesh_list_export'
+
+    def setup(self):
+        super().setup()
+        prefs = dict(PREFS_DEFAULTS)
+        prefs['rman_mesh_export_buffers'] = False
+        bpy.context.preferences.addons[RFB_PREFS_NAME] = types.SimpleNamespace(
+            preferences=types.SimpleNamespace(**prefs))
+
+    def teardown(self):
+        bpy.context.preferences.addons.pop(RFB_PREFS_NAME, None)
+        super().teardown()
+
+
+class MeshMultiMaterialExport(Benchmark):
+    """Meshes with four materials, each assigned to a
+    strip of faces."""
+
+    name = 'mesh_multi_material_export'
+    unit = 'polys'
+
+    def setup(self):
+        super().setup()
+        mats = [self.builder.add_material('Material%d' % i) for i in range(4)]
+        self.obs = self.builder.add_grid_objects(4 * self.scale, 100, materials=mats)
+        for ob in self.obs:
+            npolys = len(ob.data.polygons)
+            ob.data.set_material_indices([i % 4 for i in range(npolys)])
+        self.rman_scene = create_rman_scene(self.builder)
+        self.rman_scene.export_materials(mats)
+
+    def run(self):
+        translator = self.rman_scene.rman_translators['MESH']
+        npolys = 0
+        for ob in self.obs:
+            rman_sg_mesh = translator.export(ob, object_utils.get_db_name(ob))
+            translator.update(ob, rman_sg_mesh)
+            npolys += rman_sg_mesh.npolys
+        return npolys
+
+
+class HairExport(Benchmark):
+    """RmanHairTranslator on a hair particle system."""
+
+    name = 'hair_export'
+    unit = 'strands'
+
+    def setup(self):
+        super().setup()
+        mat = self.builder.add_material('HairMaterial')
+        mesh = fake_scene.make_grid_mesh('Scalp', 10, materials=[mat])
+        self.ob = self.builder.add_mesh_object('Scalp', mesh)
+        self.psys = fake_scene.make_hair_system('Hair', 10000 * self.scale)
+        self.ob.particle_systems.append(self.psys)
+        self.rman_scene = create_rman_scene(self.builder)
+        self.rman_scene.export_materials([mat])
+
+    def run(self):
+        translator = self.rman_scene.rman_translators['HAIR']
+        rman_sg_hair = translator.export(self.ob, self.psys, 'Hair-HAIR')
+        translator.update(self.ob, self.psys, rman_sg_hair)
+        return len(self.psys.particles)
+
+
+class EmitterExport(Benchmark):
+    """RmanEmitterTranslator on an emitter particle system."""
+
+    name = 'emitter_export'
+    unit = 'particles'
+
+    def setup(self):
+        super().setup()
+        mat = self.builder.add_material('ParticleMaterial')
+        mesh = fake_scene.make_grid_mesh('Emitter', 10, materials=[mat])
+        self.ob = self.builder.add_mesh_object('Emitter', mesh)
+        self.psys = fake_scene.make_emitter_system('Particles', 1000000 * self.scale)
+        self.ob.particle_systems.append(self.psys)
+        self.rman_scene = create_rman_scene(self.builder)
+        self.rman_scene.export_materials([mat])
+
+    def run(self):
+        translator = self.rman_scene.rman_translators['EMITTER']
+        rman_sg_emitter = translator.export(self.ob, self.psys, 'Particles-EMITTER')
+        translator.update(self.ob, self.psys, rman_sg_emitter)
+        return rman_sg_emitter.npoints
+
+
+class MaterialExport(Benchmark):
+    """RmanScene.export_materials on many simple materials."""
+
+    name = 'material_export'
+    unit = 'materials'
+
+    def setup(self):
+        super().setup()
+        self.mats = [self.builder.add_material('Material%d' % i, color=(i / 4000.0, 0.5, 0.5, 1.0))
+                     for i in range(4000 * self.scale)]
+        self.rman_scene = create_rman_scene(self.builder)
+
+    def run(self):
+        self.rman_scene.export_materials(self.mats)
+        return len(self.rman_scene.rman_materials)
+
+
+class InstancesExport(Benchmark):
+    """RmanScene.export_data_blocks and export_instances on a scene of
+    meshes. Half of the objects share their mesh with another object."""
+
+    name = 'instances_export'
+    unit = 'instances'
+
+    def setup(self):
+        super().setup()
+        mat = self.builder.add_material('Material')
+        count = 200 * self.scale
+        meshes = [fake_scene.make_grid_mesh('Mesh%d' % i, 20, materials=[mat]) for i in range(count // 2)]
+        for i in range(count):
+            self.builder.add_mesh_object('Object%d' % i, meshes[i // 2],
+                                         matrix=fake_scene.translate(i * 3.0, 0.0))
+        self.rman_scene = create_rman_scene(self.builder)
+
+    def run(self):
+        rman_scene = self.rman_scene
+        rman_scene.export_materials(self.builder.materials)
+        rman_scene.export_data_blocks(self.builder.objects)
+        rman_scene.export_instances()
+        return len(rman_scene.depsgraph.object_instances)
+
+
+class ScatterExport(Benchmark):
+    """RmanScene.export_instances on a scatter of many instances of a
+    few prototypes, like the ones made by geometry nodes."""
+
+    name = 'scatter_export'
+    unit = 'instances'
+
+    def setup(self):
+        super().setup()
+        ground = self.builder.add_mesh_object('Ground', fake_scene.make_grid_mesh('Ground', 10))
+        count = 50000 * self.scale
+        rng = np.random.default_rng(count)
+        for i in range(4):
+            mat = self.builder.add_material('Material%d' % i)
+            prototype = self.builder.add_mesh_object('Prototype%d' % i,
+                                                     fake_scene.make_grid_mesh('Prototype%d' % i, 4, materials=[mat]))
+            offsets = rng.uniform(-100.0, 100.0, (count // 4, 2))
+            self.builder.add_instances(ground, prototype, [fake_scene.translate(x, y) for x, y in offsets])
+        self.rman_scene = create_rman_scene(self.builder)
+
+    def run(self):
+        rman_scene = self.rman_scene
+        rman_scene.export_materials(self.builder.materials)
+        rman_scene.export_data_blocks(self.builder.objects)
+        rman_scene.export_instances()
+        return len(rman_scene.depsgraph.object_instances)
+
+
+class CollectionInstancesExport(Benchmark):
+    """RmanScene.export_instances on a collection of a few objects,
+    instanced many times by collection instancers."""
+
+    name = 'collection_instances_export'
+    unit = 'instances'
+
+    def setup(self):
+        super().setup()
+        mat = self.builder.add_material('Material')
+        members = []
+        for i in range(20):
+            members.append(self.builder.add_mesh_object('Member%d' % i,
+                                                        fake_scene.make_grid_mesh('Member%d' % i, 4, materials=[mat]),
+                                                        matrix=fake_scene.translate(i * 1.5, 0.0)))
+        collection = fake_scene.FakeCollectionDatablock('Collection', members)
+        count = 500 * self.scale
+        self.builder.add_collection_instances(collection, [fake_scene.translate((i % 50) * 40.0, (i // 50) * 40.0)
+                                                           for i in range(count)])
+        self.rman_scene = create_rman_scene(self.builder)
+
+    def run(self):
+        rman_scene = self.rman_scene
+        rman_scene.export_materials(self.builder.materials)
+        rman_scene.export_data_blocks(self.builder.objects)
+        rman_scene.export_instances()
+        return len(rman_scene.depsgraph.object_instances)
+
+
+class InstancesMotionExport(Benchmark):
+    """RmanScene.export_instances_motion, with transform and
+    deformation motion blur on every object."""
+
+    name = 'instances_motion_export'
+    unit = 'instances'
+
+    def setup(self):
+        super().setup()
+        count = 100 * self.scale
+        for i in range(count):
+            mesh = fake_scene.make_grid_mesh('Mesh%d' % i, 20)
+            ob = self.builder.add_mesh_object('Object%d' % i, mesh,
+                                              matrix=fake_scene.translate(i * 3.0, 0.0))
+            ob.animation_data = object()
+            ob.modifiers.append(DEFORMING_MODIFIER)
+        self.rman_scene = create_rman_scene(self.builder, do_motion_blur=True)
+
+    def run(self):
+        rman_scene = self.rman_scene
+        rman_scene.export_data_blocks(self.builder.objects)
+        rman_scene.export_instances_motion()
+        return len(rman_scene.depsgraph.object_instances)
+
+
+class InstancesMotionSparseExport(Benchmark):
+    """RmanScene.export_instances_motion with five motion segments,
+    on a large scene where only a few objects are moving."""
+
+    name = 'instances_motion_sparse_export'
+    unit = 'instances'
+
+    def setup(self):
+        super().setup()
+        count = 2000 * self.scale
+        mesh = fake_scene.make_grid_mesh('Mesh', 2)
+        for i in range(count):
+            ob = self.builder.add_mesh_object('Object%d' % i, mesh,
+                                              matrix=fake_scene.translate(i * 3.0, 0.0))
+            if i % 50 == 0:
+                ob.animation_data = object()
+        self.rman_scene = create_rman_scene(self.builder, do_motion_blur=True)
+        self.rman_scene.bl_scene.renderman.motion_segments = 5
+
+    def run(self):
+        rman_scene = self.rman_scene
+        rman_scene.export_data_blocks(self.builder.objects)
+        rman_scene.export_instances_motion()
+        return len(rman_scene.depsgraph.object_instances)
+
+
+class FakeFramebufferFunc(object):
+    """Stand-in for the display driver's GetFloatFramebuffer, which returns
+    a pointer to the framebuffer, as whatever type restype is set to."""
+
+    def __init__(self, pixels):
+        self.pixels = pixels
+        self.restype = None
+
+    def __call__(self, image_num):
+        return ctypes.pointer(self.restype._type_.from_buffer(self.pixels))
+
+
+class FramebufferConversion(Benchmark):
+    """RmanRender._get_buffer converting an RGB framebuffer, both to the
+    flat RGBA buffer Blender expects, and cropped to a render border."""
+
+    name = 'framebuffer_conversion'
+    unit = 'pixels'
+
+    def setup(self):
+        super().setup()
+        self.width = 1920 * self.scale
+        self.height = 1080
+        pixels = np.random.default_rng(0).random(self.width * self.height * 3, dtype=np.float32)
+        dspy_plugin = types.SimpleNamespace(GetFloatFramebuffer=FakeFramebufferFunc(pixels))
+        # skip RmanRender.__init__, which starts up RenderMan
+        self.rman_render = RmanRender.__new__(RmanRender)
+        self.rman_render.rictl = types.SimpleNamespace(PRManEnd=lambda: None)
+        self.rman_render.get_blender_dspy_plugin = lambda: dspy_plugin
+        self.render = types.SimpleNamespace(use_border=True, border_min_x=0.25, border_max_x=0.75,
+                                            border_min_y=0.25, border_max_y=0.75)
+
+    def run(self):
+        buffer = self.rman_render._get_buffer(self.width, self.height, num_channels=3)
+        cropped = self.rman_render._get_buffer(self.width, self.height, num_channels=3,
+                                               as_flat=False, render=self.render)
+        if buffer is None or cropped is None:
+            raise RuntimeError('_get_buffer failed')
+        return self.width * self.height * 2
+
+
+class GatherNodesDeep(Benchmark):
+    """shadergraph_utils.gather_nodes on a long chain of nodes,
+    where every other link needs a conversion node."""
+
+    name = 'gather_nodes_deep'
+    unit = 'nodes'
+
+    def setup(self):
+        super().setup()
+        self.node = fake_scene.make_node_chain(5000 * self.scale)
+
+    def run(self):
+        count = 0
+        for i in range(10):
+            count += len(shadergraph_utils.gather_nodes(self.node))
+        return count
+
+
+class GatherNodesWide(Benchmark):
+    """shadergraph_utils.gather_nodes on layers of nodes where every node
+    is connected to every node in the layer above, so most of the
+    links lead to a node that has already been gathered."""
+
+    name = 'gather_nodes_wide'
+    unit = 'links'
+
+    def setup(self):
+        super().setup()
+        self.num_layers = 20
+        self.width = 40 * self.scale
+        self.node = fake_scene.make_node_layers(self.num_layers, self.width)
+
+    def run(self):
+        shadergraph_utils.gather_nodes(self.node)
+        return (self.num_layers - 1) * self.width * self.width + self.width
+
+
+class Startup(Benchmark):
+    """Loading the add-on in a fresh interpreter (see startup.py).
+    The count is the number of add-on modules that got imported."""
+
+    name = 'startup'
+    unit = 'modules'
+    args = []
+
+    def run(self):
+        args = [sys.executable, os.path.join(BENCHMARKS_DIR, 'startup.py'), '--scale', str(self.scale)] + self.args
+        if tracemalloc.is_tracing():
+            args.append('--trace')
+        output = subprocess.run(args, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        self.elapsed = result['time']
+        self.peak_memory = result['peak_memory']
+        self.stats = result['stats']
+        return result['count']
+
+
+class FirstRender(Startup):
+    """Loading the add-on in a fresh interpreter, and exporting a small
+    scene with a new RmanScene, with all of the caches still empty."""
+
+    name = 'first_render'
+    unit = 'instances'
+    args = ['--first-render']
+
+
+BENCHMARKS = [
+    MeshExport,
+    MeshListExport,
+    MeshMultiMaterialExport,
+    HairExport,
+    EmitterExport,
+    MaterialExport,
+    InstancesExport,
+    InstancesMotionExport,
+    InstancesMotionSparseExport,
+    ScatterExport,
+    CollectionInstancesExport,
+    FramebufferConversion,
+    GatherNodesDeep,
+    GatherNodesWide,
+    Startup,
+    FirstRender
+]
+
+
+def time_reference(repeat=3):
+    """Return the time of a fixed workload, a mix of interpreter work
+    (dict and attribute lookups) and NumPy array math, like the exports."""
+    values = np.linspace(0.0, 1.0, 200000)
+    item = types.SimpleNamespace(index=0, weight=0.5)
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        counts = dict()
+        for j in range(100000):
+            key = j % 1000
+            counts[key] = counts.get(key, 0.0) + item.weight
+        arr = values
+        for j in range(20):
+            arr = np.sqrt(arr * 1.5 + 1.0)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run_benchmark(cls, scale, repeat):
+    """Run a benchmark repeat times, and return its results.
+
+    The export is timed without tracemalloc, since tracing slows down
+    allocation heavy code a lot. Peak memory comes from one extra run.
+    """
+    bm = cls(scale)
+    best = None
+    count = 0
+    for i in range(repeat):
+        bm.setup()
+        gc.collect()
+        start = time.perf_counter()
+        count = bm.run()
+        elapsed = time.perf_counter() - start
+        if bm.elapsed is not None:
+            elapsed = bm.elapsed
+        bm.teardown()
+        if best is None or elapsed < best:
+            best = elapsed
+
+    bm.setup()
+    gc.collect()
+    tracemalloc.start()
+    bm.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if bm.peak_memory is not None:
+        peak = bm.peak_memory
+    stats = bm.stats if bm.stats is not None else fake_modules.STATS.as_dict()
+    bm.teardown()
+
+    return {'count': count,
+            'unit': bm.unit,
+            'time': best,
+            'throughput': count / best if best > 0.0 else 0.0,
+            'peak_memory': peak,
+            'sg_nodes': sum(stats['nodes'].values()),
+            'sg_values': stats['values']}
+
+
+def compare(name, result, baseline, tolerance):
+    """Return a list of regressions for one benchmark."""
+    regressions = []
+    if 'relative_time' not in baseline:
+        regressions.append('%s: the baseline has no relative time, re-record it with --update-baseline' % name)
+        return regressions
+    if result['count'] != baseline['count']:
+        regressions.append('%s: exported %d %s, baseline exported %d (was the baseline recorded with a different --scale?)'
+                           % (name, result['count'], result['unit'], baseline['count']))
+        return regressions
+    max_relative_time = baseline['relative_time'] * (1.0 + tolerance)
+    if result['relative_time'] > max_relative_time:
+        regressions.append('%s: took %.2fx the reference time, which is slower than the baseline of %.2fx'
+                           % (name, result['relative_time'], baseline['relative_time']))
+    max_memory = baseline['peak_memory'] * (1.0 + tolerance)
+    if result['peak_memory'] > max_memory:
+        regressions.append('%s: peak memory of %.1f MB is more than the baseline of %.1f MB'
+                           % (name, result['peak_memory'] / 2**20, baseline['peak_memory'] / 2**20))
+    return regressions
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return dict()
+    with open(BASELINE_FILE) as fhdl:
+        return json.load(fhdl)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless RenderMan for Blender translator benchmarks.')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--only', nargs='+', default=None)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    benchmarks = BENCHMARKS
+    if args.only:
+        benchmarks = [b for b in BENCHMARKS if b.name in args.only]
+
+    baseline = load_baseline()
+    results = dict()
+    regressions = []
+    print('%-28s %12s %16s %12s %10s %10s %12s' % ('benchmark', 'count', 'throughput/s', 'time (ms)', 'relative',
+                                                   'peak (MB)', 'sg values'))
+    for cls in benchmarks:
+        reference = time_reference()
+        result = run_benchmark(cls, args.scale, args.repeat)
+        result['relative_time'] = result['time'] / reference
+        results[cls.name] = result
+        print('%-28s %12d %16.0f %12.1f %10.2f %10.1f %12d' % (cls.name, result['count'], result['throughput'],
+                                                               result['time'] * 1000.0, result['relative_time'],
+                                                               result['peak_memory'] / 2**20, result['sg_values']))
+        if not args.update_baseline and cls.name in baseline:
+            regressions.extend(compare(cls.name, result, baseline[cls.name], args.tolerance))
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_FILE, 'w') as fhdl:
+            json.dump(baseline, fhdl, indent=4, sort_keys=True)
+        print('Wrote %s' % BASELINE_FILE)
+        return 0
+
+    if regressions:
+        print('\nRegressions:')
+        for r in regressions:
+            print('  %s' % r)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Startup and time-to-first-render, measured in a fresh interpreter.
+
+run_benchmarks.py runs this in a separate process, since the add-on can only
+be loaded once per process. It loads the add-on (with the stand-in modules
+from fake_modules.py), and optionally exports a small scene with a new
+RmanScene, then prints its results as JSON on the last line of its output.
+
+Usage:
+    python startup.py [--first-render] [--scale N] [--trace]
+
+    --first-render  also export a small scene, and include it in the time
+    --scale         multiply the size of the scene by N
+    --trace         report the peak memory allocated, using tracemalloc
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.dirname(os.path.dirname(BENCHMARKS_DIR))
+
+if BENCHMARKS_DIR not in sys.path:
+    sys.path.insert(0, BENCHMARKS_DIR)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Add-on startup benchmark.')
+    parser.add_argument('--first-render', action='store_true')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--trace', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    import fake_modules
+    fake_modules.install()
+    fake_modules.load_addon(ADDON_DIR)
+    from RenderManForBlender import rman_scene  # noqa: F401
+    elapsed = time.perf_counter() - start
+    count = len([name for name in sys.modules if name.startswith(fake_modules.ADDON_PACKAGE_NAME)])
+
+    if args.first_render:
+        # the scene is built outside of the timer, since building
+        # the synthetic scene isn't part of the add-on's work
+        import fake_scene
+        import run_benchmarks
+        builder = fake_scene.SceneBuilder()
+        mats = [builder.add_material('Material%d' % i) for i in range(10)]
+        builder.add_grid_objects(20 * args.scale, 20, materials=mats[:1])
+        fake_modules.STATS.reset()
+        start = time.perf_counter()
+        rman_scene = run_benchmarks.create_rman_scene(builder)
+        rman_scene.export_materials(builder.materials)
+        rman_scene.export_data_blocks(builder.objects)
+        rman_scene.export_instances()
+        elapsed += time.perf_counter() - start
+        count = len(rman_scene.depsgraph.object_instances)
+
+    peak = 0
+    if args.trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    stats = fake_modules.STATS.as_dict()
+    print(json.dumps({'count': count, 'time': elapsed, 'peak_memory': peak, 'stats': stats}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Checks the vectorized hair strand export against the per strand loop
+RmanHairTranslator used before.
+
+Uses the same stand-in bpy and rman modules as the benchmarks, so it can
+run outside of Blender.
+
+Usage:
+    python test_hair_strands.py
+"""
+
+import os
+import sys
+import types
+import unittest
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.dirname(os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import fake_modules  # noqa: E402
+fake_modules.install()
+fake_modules.load_addon(ADDON_DIR)
+
+import fake_scene  # noqa: E402
+from fake_modules import FakeMatrix  # noqa: E402
+from RenderManForBlender.rman_translators import rman_hair_translator  # noqa: E402
+from RenderManForBlender.rman_translators.rman_hair_translator import RmanHairTranslator  # noqa: E402
+
+
+def get_strands_per_strand(ob, psys):
+    """The strand export loop from before it was vectorized, without the
+    scalp ST and vertex colors, which need an emitter modifier."""
+    tip_width = psys.settings.tip_radius * psys.settings.radius_scale
+    base_width = psys.settings.root_radius * psys.settings.radius_scale
+    conwidth = (tip_width == base_width)
+    steps = (2 ** psys.settings.render_step) + 1
+
+    if conwidth:
+        hair_width = base_width
+    else:
+        hair_width = []
+    curve_sets = []
+    points = []
+    vertsArray = []
+    nverts = 0
+
+    ob_inv_mtx = ob.matrix_world.inverted_safe()
+    for pindex in range(len(psys.particles)):
+        strand_points = []
+        for step in range(0, steps):
+            pt = psys.co_hair(ob, particle_no=pindex, step=step)
+            if pt.length_squared == 0:
+                break
+            pt = ob_inv_mtx @ pt
+            strand_points.append(pt)
+
+        if len(strand_points) > 1:
+            strand_points = strand_points[:1] + \
+                strand_points + strand_points[-1:]
+            vertsInStrand = len(strand_points)
+            if vertsInStrand < 4:
+                continue
+
+            if not conwidth:
+                decr = (base_width - tip_width) / (vertsInStrand - 2)
+                hair_width.extend([base_width] + [(base_width - decr * i)
+                                                  for i in range(vertsInStrand - 2)] +
+                                  [tip_width])
+
+            points.extend(strand_points)
+            vertsArray.append(vertsInStrand)
+            nverts += vertsInStrand
+
+        if nverts > 100000:
+            curve_sets.append((vertsArray, points, hair_width))
+            nverts = 0
+            points = []
+            vertsArray = []
+            if not conwidth:
+                hair_width = []
+
+    if nverts > 0:
+        curve_sets.append((vertsArray, points, hair_width))
+
+    return curve_sets
+
+
+def make_ragged_hair_system(name, num_strands, render_step=3):
+    """Hair whose strands end early, at anywhere from one point to the full
+    (2 ** render_step) + 1 points. Strands with a single point get dropped."""
+    psys = fake_scene.make_hair_system(name, num_strands, render_step=render_step)
+    steps = psys.strands.shape[1]
+    rng = np.random.default_rng(num_strands)
+    lengths = rng.integers(1, steps + 1, num_strands)
+    lengths[:4] = [2, 1, steps, 2]
+    lengths[-1] = 2
+    psys.strands[np.arange(steps)[None, :] >= lengths[:, None]] = 0.0
+    return psys
+
+
+class HairStrandsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.translator = RmanHairTranslator(types.SimpleNamespace(is_interactive=False))
+        matrix = FakeMatrix([[2.0, 0.0, 0.0, 1000.0],
+                             [0.0, 0.0, -2.0, -500.0],
+                             [0.0, 2.0, 0.0, 250.0],
+                             [0.0, 0.0, 0.0, 1.0]])
+        self.ob = fake_scene.FakeObject('Scalp', None, matrix=matrix)
+
+    def assert_same_curve_sets(self, psys):
+        curve_sets = self.translator._get_strands_(self.ob, psys)
+        expected = get_strands_per_strand(self.ob, psys)
+        self.assertEqual(len(curve_sets), len(expected))
+        for (verts, P, widths, st, mcols), (exp_verts, exp_P, exp_widths) in zip(curve_sets, expected):
+            self.assertEqual(list(verts), exp_verts)
+            np.testing.assert_allclose(P, np.array(exp_P), rtol=1e-6, atol=1e-4)
+            if isinstance(exp_widths, list):
+                np.testing.assert_allclose(widths, exp_widths, rtol=1e-6, atol=1e-9)
+            else:
+                self.assertEqual(widths, exp_widths)
+        return curve_sets
+
+    def test_ragged_strands(self):
+        psys = make_ragged_hair_system('Hair', 500)
+        curve_sets = self.assert_same_curve_sets(psys)
+        self.assertEqual(len(curve_sets), 1)
+
+    def test_constant_width(self):
+        psys = make_ragged_hair_system('Hair', 500)
+        psys.settings.tip_radius = psys.settings.root_radius
+        curve_sets = self.assert_same_curve_sets(psys)
+        self.assertEqual(len(curve_sets), 1)
+
+    def test_split_curve_sets(self):
+        # enough strands to go over 100000 vertices twice
+        psys = make_ragged_hair_system('Hair', 40000)
+        curve_sets = self.assert_same_curve_sets(psys)
+        self.assertEqual(len(curve_sets), 3)
+
+    def test_strand_point_indices(self):
+        strand_lengths = np.array([2, 3, 2], dtype=np.int32)
+        indices = rman_hair_translator._get_strand_point_indices_(strand_lengths)
+        self.assertEqual(indices.tolist(), [0, 0, 1, 1,
+                                            2, 2, 3, 4, 4,
+                                            5, 5, 6, 6])
+
+    def test_strand_widths(self):
+        verts_array = np.array([4, 5], dtype=np.int32)
+        widths = rman_hair_translator._get_strand_widths_(verts_array, 1.0, 0.1)
+        np.testing.assert_allclose(widths, [1.0, 1.0, 0.55, 0.1,
+                                            1.0, 1.0, 0.7, 0.4, 0.1], rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,8 @@
 import unittest
+import tempfile
+import shutil
+import os
+import time
 import bpy
 from ..rfb_utils import string_utils
 
@@ -9,6 +13,11 @@ class StringExprTest(unittest.TestCase):
         suite.addTest(StringExprTest('test_get_var'))
         suite.addTest(StringExprTest('test_set_var'))
         suite.addTest(StringExprTest('test_expand_string'))
+        suite.addTest(StringExprTest('test_expand_string_cache'))
+        suite.addTest(StringExprTest('test_expand_string_cache_env'))
+        suite.addTest(StringExprTest('test_deferred_makedirs'))
+        suite.addTest(StringExprTest('test_cached_makedirs'))
+        suite.addTest(StringExprTest('test_expand_string_throughput'))
 
     # test getvar 
     def test_get_var(self):
@@ -26,4 +35,99 @@ class StringExprTest(unittest.TestCase):
         string_utils.set_var('OUT', '/var/tmp')
         string_utils.set_var('unittest', 'StringExprTest')
         expanded_str = string_utils.expand_string(s, display='openexr', frame=1)
-        self.assertEqual(expanded_str, compare)
\ No newline at end of file
+        self.assertEqual(expanded_str, compare)
+
+    # test that cached expansions follow frame, display and token changes
+    def test_expand_string_cache(self):
+        s = '<OUT>/<unittest>/<scene>.<f4>.<ext>'
+        string_utils.set_var('OUT', '/var/tmp')
+        string_utils.set_var('unittest', 'StringExprTest')
+        for i in range(2):
+            for frame in (1, 2, 1):
+                compare = f'/var/tmp/StringExprTest/{bpy.context.scene.name}.{frame:04d}.exr'
+                expanded_str = string_utils.expand_string(s, display='openexr', frame=frame)
+                self.assertEqual(expanded_str, compare)
+
+        compare = f'/var/tmp/StringExprTest/{bpy.context.scene.name}.0001.tif'
+        expanded_str = string_utils.expand_string(s, display='tiff', frame=1)
+        self.assertEqual(expanded_str, compare)
+
+        string_utils.set_var('unittest', 'StringExprCacheTest')
+        compare = f'/var/tmp/StringExprCacheTest/{bpy.context.scene.name}.0001.exr'
+        expanded_str = string_utils.expand_string(s, display='openexr', frame=1)
+        self.assertEqual(expanded_str, compare)
+
+    # test that cached expansions follow env var changes
+    def test_expand_string_cache_env(self):
+        s = '$RFB_UNITTEST_JOB/<scene>.<f4>.<ext>'
+        old_val = os.environ.get('RFB_UNITTEST_JOB', None)
+        try:
+            for job in ('/var/tmp/job1', '/var/tmp/job2', '/var/tmp/job1'):
+                os.environ['RFB_UNITTEST_JOB'] = job
+                compare = f'{job}/{bpy.context.scene.name}.0001.exr'
+                expanded_str = string_utils.expand_string(s, display='openexr', frame=1)
+                self.assertEqual(expanded_str, compare)
+
+            del os.environ['RFB_UNITTEST_JOB']
+            compare = f'$RFB_UNITTEST_JOB/{bpy.context.scene.name}.0001.exr'
+            expanded_str = string_utils.expand_string(s, display='openexr', frame=1)
+            self.assertEqual(expanded_str, compare)
+        finally:
+            if old_val is None:
+                os.environ.pop('RFB_UNITTEST_JOB', None)
+            else:
+                os.environ['RFB_UNITTEST_JOB'] = old_val
+
+    # test that directory creation is deferred until the end of the block
+    def test_deferred_makedirs(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            string_utils.set_var('unittest', tmp_dir)
+            with string_utils.deferred_makedirs():
+                for frame in (1, 2):
+                    expanded_str = string_utils.expand_string('<unittest>/<f4>/image.<ext>', display='openexr', frame=frame, asFilePath=True)
+                    self.assertFalse(os.path.exists(os.path.dirname(expanded_str)))
+            for frame in (1, 2):
+                self.assertTrue(os.path.isdir(os.path.join(tmp_dir, '%04d' % frame)))
+
+            expanded_str = string_utils.expand_string('<unittest>/immediate/image.<ext>', display='openexr', asFilePath=True)
+            self.assertTrue(os.path.isdir(os.path.dirname(expanded_str)))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # test that a cached expansion still creates its directory, after
+    # it was removed and a new render started
+    def test_cached_makedirs(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            string_utils.set_var('unittest', tmp_dir)
+            expanded_str = string_utils.expand_string('<unittest>/cached/image.<ext>', display='openexr', asFilePath=True)
+            self.assertTrue(os.path.isdir(os.path.dirname(expanded_str)))
+
+            shutil.rmtree(os.path.dirname(expanded_str))
+            string_utils.clear_known_dirs()
+            expanded_str = string_utils.expand_string('<unittest>/cached/image.<ext>', display='openexr', asFilePath=True)
+            self.assertTrue(os.path.isdir(os.path.dirname(expanded_str)))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # test that repeated expansions are faster than expanding from scratch
+    def test_expand_string_throughput(self):
+        s = '<OUT>/<unittest>/<scene>.<layer>.<f4>.<ext>'
+        string_utils.set_var('OUT', '/var/tmp')
+        string_utils.set_var('unittest', 'StringExprTest')
+        num_iters = 2000
+        converter = string_utils.__SCENE_STRING_CONVERTER__
+
+        start = time.perf_counter()
+        for i in range(num_iters):
+            converter.expr.expand_cache.clear()
+            string_utils.expand_string(s, display='openexr', frame=1)
+        uncached = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(num_iters):
+            string_utils.expand_string(s, display='openexr', frame=1)
+        cached = time.perf_counter() - start
+
+        self.assertLess(cached, uncached)
@@ -0,0 +1,330 @@
+"""Delayed load geometry archives.
+
+Objects (and collection instancers) with Delayed Load Archive turned on, and
+static meshes when Static Geometry Archives is on for an animation export, are
+written to their own RIB archive. The main scene references the archive through
+a DelayedReadArchive procedural with the geometry's bounds, so prman only reads
+it when a ray hits the bounds.
+
+Archives for static geometry are written once, and reused for later frames and
+renders, until anything they were written from is edited (see depsgraph_handler).
+
+Static meshes are written to archives named by a hash of their contents, so
+unchanged geometry is also reused across sessions. Each archive directory has a
+manifest that lists the file each object last used, and the files each RIB file
+references. When an object's contents change, its old file is retired, rather than
+deleted, since RIB files written earlier (ex: queued on the farm) can still need it.
+Retired files are deleted by cleanup_archives, once nothing uses them, and no RIB
+file that references them is left. Processes exporting to the same directory
+share the manifest: it's always read, updated and written under a lock file.
+"""
+
+from . import object_utils
+from ..rfb_logger import rfb_log
+from contextlib import contextmanager
+import numpy as np
+import hashlib
+import json
+import os
+import time
+import bpy
+
+# archives that can be reused, keyed by name. Each entry holds
+# (path, bounds, names of the datablocks the archive was written from,
+# names of the objects whose transforms were written into the archive)
+__RFB_ARCHIVES__ = dict()
+
+# the archive file each object used, as of the last time we read or wrote
+# the manifest of an archive directory. Keyed by directory.
+__RFB_ARCHIVE_MANIFESTS__ = dict()
+
+MANIFEST_FILENAME = 'manifest.json'
+
+# how long to wait for another process to release a manifest's lock,
+# before assuming it died while holding it
+MANIFEST_LOCK_TIMEOUT = 60.0
+
+# how long a RIB file can stay pending, before assuming the process
+# writing it died
+RIB_PENDING_TIMEOUT = 24 * 60 * 60.0
+
+# unit cube corners, to transform bounds with
+_CORNERS = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=np.float64)
+
+
+def get_archive(name):
+    '''Return (path, bounds) for a reusable archive, or None if we don't
+    have one, or its file was removed.
+    '''
+    archive = __RFB_ARCHIVES__.get(name, None)
+    if archive is None:
+        return None
+    if not os.path.exists(archive[0]):
+        del __RFB_ARCHIVES__[name]
+        return None
+    return archive[:2]
+
+
+def add_archive(name, path, bounds, deps, xform_deps=()):
+    __RFB_ARCHIVES__[name] = (path, bounds, set(deps), set(xform_deps))
+
+
+def clear_archives():
+    __RFB_ARCHIVES__.clear()
+    __RFB_ARCHIVE_MANIFESTS__.clear()
+
+
+@contextmanager
+def _manifest_lock(archive_dir):
+    lock_path = os.path.join(archive_dir, MANIFEST_FILENAME + '.lock')
+    start = time.time()
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            if time.time() - start > MANIFEST_LOCK_TIMEOUT:
+                rfb_log().warning("Breaking stale archive manifest lock: %s" % lock_path)
+                try:
+                    os.remove(lock_path)
+                except OSError:
+                    pass
+                start = time.time()
+            time.sleep(0.05)
+        except OSError as e:
+            # we can't lock in this directory, so we can't write to it either
+            rfb_log().warning("Could not lock archive manifest %s: %s" % (lock_path, str(e)))
+            yield False
+            return
+    try:
+        yield True
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def _load_manifest(archive_dir):
+    # Read the manifest from disk. Only call this while holding its lock.
+    manifest = dict()
+    try:
+        with open(os.path.join(archive_dir, MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if not isinstance(manifest, dict):
+        manifest = dict()
+    elif 'objects' not in manifest:
+        # older manifests only mapped object names to files
+        manifest = {'objects': {k: v for k, v in manifest.items() if isinstance(v, str)}}
+    for key in ('objects', 'ribs', 'filesets'):
+        if not isinstance(manifest.get(key, None), dict):
+            manifest[key] = dict()
+    if not isinstance(manifest.get('retired', None), list):
+        manifest['retired'] = list()
+    return manifest
+
+
+def _save_manifest(archive_dir, manifest):
+    path = os.path.join(archive_dir, MANIFEST_FILENAME)
+    tmp_path = '%s.%d' % (path, os.getpid())
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        rfb_log().warning("Could not write archive manifest %s: %s" % (path, str(e)))
+    __RFB_ARCHIVE_MANIFESTS__[archive_dir] = dict(manifest['objects'])
+
+
+def set_archive_file(name, path):
+    '''Record that name now uses the content archive at path. The archive
+    it used before is retired, if nothing else uses it (see cleanup_archives).
+    '''
+    archive_dir, filename = os.path.split(path)
+    if __RFB_ARCHIVE_MANIFESTS__.get(archive_dir, dict()).get(name, None) == filename:
+        return
+    with _manifest_lock(archive_dir) as locked:
+        if not locked:
+            return
+        manifest = _load_manifest(archive_dir)
+        objects = manifest['objects']
+        old_filename = objects.get(name, None)
+        if old_filename != filename:
+            objects[name] = filename
+            retired = manifest['retired']
+            if filename in retired:
+                retired.remove(filename)
+            if old_filename and old_filename not in objects.values() and old_filename not in retired:
+                retired.append(old_filename)
+        _save_manifest(archive_dir, manifest)
+
+
+def add_rib_references(rib_path, paths, pending=False):
+    '''Record the archives a RIB file references, so that cleanup_archives
+    keeps them for as long as the RIB file exists. Call this with pending=True
+    as soon as the frame is exported, since the next frame can retire its
+    archives before the RIB file is written, then again once it's written.
+
+    Args:
+    - rib_path (str): the RIB file
+    - paths (list): paths to the archives it references
+    - pending (bool): whether the RIB file is still being written
+    '''
+    by_dir = dict()
+    for path in paths:
+        archive_dir, filename = os.path.split(path)
+        by_dir.setdefault(archive_dir, set()).add(filename)
+    for archive_dir, filenames in by_dir.items():
+        filenames = sorted(filenames)
+        # most frames reference the same files, so each set is only stored once
+        key = hashlib.md5('\n'.join(filenames).encode('utf-8')).hexdigest()
+        with _manifest_lock(archive_dir) as locked:
+            if not locked:
+                continue
+            manifest = _load_manifest(archive_dir)
+            manifest['filesets'][key] = filenames
+            manifest['ribs'][rib_path] = {'fileset': key, 'pending': pending, 'time': time.time()}
+            _save_manifest(archive_dir, manifest)
+
+
+def cleanup_archives(archive_dir):
+    '''Delete the retired archives in archive_dir that no object uses, and that
+    no RIB file still on disk references. RIB files that were removed are
+    forgotten.
+
+    Returns:
+    - (int): the number of archives deleted
+    '''
+    count = 0
+    with _manifest_lock(archive_dir) as locked:
+        if not locked:
+            return count
+        manifest = _load_manifest(archive_dir)
+        now = time.time()
+        ribs = dict()
+        for rib, entry in manifest['ribs'].items():
+            if not isinstance(entry, dict):
+                continue
+            if entry.get('pending', False):
+                if now - entry.get('time', 0.0) < RIB_PENDING_TIMEOUT:
+                    ribs[rib] = entry
+            elif os.path.exists(rib):
+                ribs[rib] = entry
+        keys = set(entry.get('fileset', None) for entry in ribs.values())
+        filesets = {key: manifest['filesets'][key] for key in keys if key in manifest['filesets']}
+        used = set(manifest['objects'].values())
+        for filenames in filesets.values():
+            used.update(filenames)
+        retired = list()
+        for filename in manifest['retired']:
+            if filename in used:
+                retired.append(filename)
+                continue
+            try:
+                os.remove(os.path.join(archive_dir, filename))
+                count += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                rfb_log().warning("Could not delete archive %s: %s" % (filename, str(e)))
+                retired.append(filename)
+        manifest['ribs'] = ribs
+        manifest['filesets'] = filesets
+        manifest['retired'] = retired
+        _save_manifest(archive_dir, manifest)
+    if count:
+        rfb_log().debug("Deleted %d unused archives from %s" % (count, archive_dir))
+    return count
+
+
+def get_deps(ob):
+    '''Return the names of the datablocks ob's archive depends on'''
+    deps = [ob.name_full]
+    if ob.data:
+        deps.append(ob.data.name_full)
+    for slot in getattr(ob, 'material_slots', list()):
+        if slot.material:
+            deps.append(slot.material.name_full)
+    return deps
+
+
+def _is_modifier_animated(ob):
+    # Whether any of ob's modifier settings are keyed or driven
+    # (ex: an animated array count, or displace strength)
+    anim = ob.animation_data
+    if anim is None:
+        return False
+    fcurves = list(anim.drivers)
+    actions = [anim.action] + [strip.action for track in anim.nla_tracks for strip in track.strips]
+    for action in actions:
+        if action:
+            fcurves.extend(action.fcurves)
+    return any(fcurve.data_path.startswith('modifiers[') for fcurve in fcurves)
+
+
+def is_static(ob):
+    '''Whether ob's geometry is the same on every frame'''
+    if object_utils._is_deforming_(ob):
+        return False
+    for mod in ob.modifiers:
+        if mod.type == 'NODES':
+            # geometry nodes can be driven by the frame
+            return False
+        for prop in mod.bl_rna.properties:
+            if prop.type != 'POINTER':
+                continue
+            if isinstance(getattr(mod, prop.identifier, None), (bpy.types.Object, bpy.types.Collection)):
+                # the result depends on other objects (ex: a boolean cutter, or
+                # a mirror object), which can move
+                return False
+    if _is_modifier_animated(ob):
+        return False
+    return getattr(ob.data, 'animation_data', None) is None
+
+
+def get_bounds(ob, mtx=None, padding=0.0):
+    '''Return ob's bounding box, as (xmin, xmax, ymin, ymax, zmin, zmax).
+
+    Args:
+    - ob (bpy.types.Object): the object
+    - mtx (mathutils.Matrix): transform the bounding box by mtx
+    - padding (float): grow the bounding box by this much, ex: for displacement
+    '''
+    bb = np.asarray([tuple(v) for v in ob.bound_box], dtype=np.float64)
+    bmin = bb.min(axis=0)
+    bmax = bb.max(axis=0)
+    if mtx is not None:
+        m = np.asarray(mtx, dtype=np.float64)
+        pts = (bmin + _CORNERS * (bmax - bmin)) @ m[:3, :3].T + m[:3, 3]
+        bmin = pts.min(axis=0)
+        bmax = pts.max(axis=0)
+    bmin = (bmin - padding).tolist()
+    bmax = (bmax + padding).tolist()
+    return (bmin[0], bmax[0], bmin[1], bmax[1], bmin[2], bmax[2])
+
+
+def union_bounds(bounds_list):
+    if not bounds_list:
+        return (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+    b = np.asarray(bounds_list, dtype=np.float64)
+    return (float(b[:, 0].min()), float(b[:, 1].max()), float(b[:, 2].min()),
+            float(b[:, 3].max()), float(b[:, 4].min()), float(b[:, 5].max()))
+
+
+def depsgraph_handler(bl_scene, depsgraph):
+    # Forget any archives that were written from something that was just edited
+    if not __RFB_ARCHIVES__:
+        return
+    names = set()
+    moved = set()
+    for update in depsgraph.updates:
+        if isinstance(update.id, bpy.types.Object) and update.is_updated_transform and not update.is_updated_geometry:
+            # only moved. This only matters for archives that hold
+            # the object's transform, like collection archives.
+            moved.add(update.id.name_full)
+        else:
+            names.add(update.id.name_full)
+    for name in [k for k, v in __RFB_ARCHIVES__.items() if not (names.isdisjoint(v[2]) and moved.isdisjoint(v[3]))]:
+        del __RFB_ARCHIVES__[name]
@@ -12,6 +12,29 @@ import getpass
 
 __BLENDER_TO_RMAN_DSPY__ = { 'TIFF': 'tiff', 'TARGA': 'targa', 'TARGA_RAW': 'targa', 'OPEN_EXR': 'openexr', 'PNG': 'png'}
 
+# cache of the dictionaries built by get_dspy_dict. See _get_dspy_dict_key
+__DSPY_DICT_CACHE__ = dict()
+
+def clear_dspy_dict_cache():
+    """Invalidate all of the cached display dictionaries. This needs to be called
+    whenever any of the AOV/display settings change.
+    """
+    __DSPY_DICT_CACHE__.clear()
+
+def _get_dspy_dict_key(rman_scene, expandTokens):
+    bl_scene = rman_scene.bl_scene
+    layer = rman_scene.bl_view_layer
+    if not layer:
+        layer = bpy.context.view_layer
+    rm_rl = rman_scene.rm_rl
+    key = (bl_scene.name, layer.name, rm_rl is not None,
+           rman_scene.is_interactive, rman_scene.is_viewport_render,
+           rman_scene.external_render, rman_scene.rman_bake, expandTokens)
+    if expandTokens:
+        # expanded file paths also depend on the frame and the tokens
+        key += (rman_scene.bl_frame_current, string_utils.get_tokens_generation())
+    return key
+
 def get_channel_name(aov, layer_name):
     aov_name = aov.name.replace(' ', '')
     aov_channel_name = aov.channel_name
@@ -565,7 +588,9 @@ def _set_rman_holdouts_dspy_dict(dspys_dict, dspy_drv, rman_scene, expandTokens)
 
 def get_dspy_dict(rman_scene, expandTokens=True):
     """
-    Create a dictionary of display channels and displays. The layout:
+    Create a dictionary of display channels and displays. The result is cached
+    until clear_dspy_dict_cache is called, and is shared between callers,
+    so it should be treated as read-only. The layout:
 
         { 'channels': {
         u'Ci': { u'channelSource': { 'type': u'string', 'value': u'Ci'},
@@ -609,6 +634,14 @@ def get_dspy_dict(rman_scene, expandTokens=True):
 
     """
 
+    key = _get_dspy_dict_key(rman_scene, expandTokens)
+    dspys_dict = __DSPY_DICT_CACHE__.get(key, None)
+    if dspys_dict is None:
+        dspys_dict = _build_dspy_dict(rman_scene, expandTokens)
+        __DSPY_DICT_CACHE__[key] = dspys_dict
+    return dspys_dict
+
+def _build_dspy_dict(rman_scene, expandTokens):
     rm = rman_scene.bl_scene.renderman
     rm_rl = rman_scene.rm_rl
     layer = rman_scene.bl_view_layer
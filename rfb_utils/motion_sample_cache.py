@@ -0,0 +1,119 @@
+"""Motion sample cache.
+
+When rendering an animation in-process, consecutive frames can ask for
+motion samples at the same point in time. For example, with a 360 degree
+shutter the shutter close of one frame is the shutter open of the next.
+MotionSampleCache keeps the transform matrices and deformed points we
+evaluated for a frame, keyed by (name, absolute time), so the next frame
+doesn't need to ask Blender to evaluate the scene at that time again.
+
+The cache is bounded by the number of bytes it holds. When it's full, the
+least recently used samples are dropped first.
+"""
+
+import collections
+
+# size of a cached transform (16 floats), plus some
+# overhead for the key
+_MATRIX_BYTES = 16 * 8 + 64
+
+
+def _get_nbytes(value):
+    nbytes = getattr(value, 'nbytes', None)
+    if nbytes is None:
+        # plain list of floats, or list of vectors
+        nbytes = len(value) * 8
+        if len(value) and hasattr(value[0], '__len__'):
+            nbytes *= len(value[0])
+    return nbytes + 64
+
+
+class MotionSampleCache(object):
+    '''
+    Cache of evaluated motion samples.
+
+    Attributes:
+        max_bytes (int) - the maximum number of bytes to keep
+        nbytes (int) - the number of bytes we're currently holding
+        hits (int) - the number of lookups that were found in the cache
+        misses (int) - the number of lookups that weren't
+        samples_reused (int) - the number of motion samples that were exported without
+                               evaluating the scene, either because everything was in the cache,
+                               or because the scene was already evaluated at that time
+        samples_evaluated (int) - the number of motion samples the scene had to be
+                                  evaluated for
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.samples_reused = 0
+        self.samples_evaluated = 0
+        self.__samples = collections.OrderedDict()
+
+    @staticmethod
+    def get_key(kind, name, time):
+        # round the time, so that subframes computed from different
+        # frames still match
+        return (kind, name, round(time, 4))
+
+    def __contains__(self, key):
+        return key in self.__samples
+
+    def get(self, key):
+        entry = self.__samples.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__samples.move_to_end(key)
+        return entry[0]
+
+    def get_all(self, keys):
+        # Return a dict with the values for all of the keys,
+        # or None if any of them are missing
+        values = dict()
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        if len(values) != len(keys):
+            return None
+        return values
+
+    def put(self, key, value):
+        nbytes = _MATRIX_BYTES if key[0] == 'xform' else _get_nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+        old = self.__samples.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[1]
+        self.__samples[key] = (value, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, (_, old_nbytes) = self.__samples.popitem(last=False)
+            self.nbytes -= old_nbytes
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if not lookups:
+            return 0.0
+        return self.hits / lookups
+
+    def clear(self):
+        self.__samples.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.samples_reused = 0
+        self.samples_evaluated = 0
+
+    def get_stats(self):
+        return 'reused %d of %d motion samples, hit rate: %.1f%%, %d samples cached (%.1f MB)' % (
+            self.samples_reused, self.samples_reused + self.samples_evaluated,
+            self.hit_rate() * 100.0, len(self), self.nbytes / 2**20)
+
+    def __len__(self):
+        return len(self.__samples)
@@ -217,41 +217,54 @@ def _get_used_materials_(ob):
     else:
         return [ob.active_material]     
 
-def _get_mesh_points_(mesh):
+def _get_mesh_points_(mesh, as_array=False):
     nvertices = len(mesh.vertices)
     P = np.zeros(nvertices*3, dtype=np.float32)
     mesh.vertices.foreach_get('co', P)
     P = np.reshape(P, (nvertices, 3))
+    if as_array:
+        return P
     return P.tolist()
 
-def _get_mesh_(mesh, get_normals=False):
+def _get_mesh_(mesh, get_normals=False, as_array=False):
+    """ Get the points, normals and topology of a mesh
 
-    P = _get_mesh_points_(mesh)
+    Args:
+        mesh (bpy.types.Mesh) - the mesh
+        get_normals (bool) - whether to also return normals
+        as_array (bool) - return contiguous float32/int32 NumPy arrays instead
+                          of lists, so they can be handed to the RtPrimVar setters
+                          without boxing every element
+
+    Returns:
+        (tuple) - nverts, verts, P, N
+    """
+
+    P = _get_mesh_points_(mesh, as_array=as_array)
     N = []    
 
     npolygons = len(mesh.polygons)
-    fastnvertices = np.zeros(npolygons, dtype=np.int)
+    fastnvertices = np.zeros(npolygons, dtype=np.int32)
     mesh.polygons.foreach_get('loop_total', fastnvertices)
-    nverts = fastnvertices.tolist()
+    nverts = fastnvertices if as_array else fastnvertices.tolist()
 
     loops = len(mesh.loops)
-    fastvertices = np.zeros(loops, dtype=np.int)
+    fastvertices = np.zeros(loops, dtype=np.int32)
     mesh.loops.foreach_get('vertex_index', fastvertices)
-    verts = fastvertices.tolist()
+    verts = fastvertices if as_array else fastvertices.tolist()
 
     if get_normals:
-        fastsmooth = np.zeros(npolygons, dtype=np.int)
+        fastsmooth = np.zeros(npolygons, dtype=np.int32)
         mesh.polygons.foreach_get('use_smooth', fastsmooth)
         if mesh.use_auto_smooth or True in fastsmooth:
             mesh.calc_normals_split()
             fastnormals = np.zeros(loops*3, dtype=np.float32)
             mesh.loops.foreach_get('normal', fastnormals)
             fastnormals = np.reshape(fastnormals, (loops, 3))
-            N = fastnormals.tolist()            
         else:            
             fastnormals = np.zeros(npolygons*3, dtype=np.float32)
             mesh.polygons.foreach_get('normal', fastnormals)
             fastnormals = np.reshape(fastnormals, (npolygons, 3))
-            N = fastnormals.tolist()
+        N = fastnormals if as_array else fastnormals.tolist()
 
     return (nverts, verts, P, N)
\ No newline at end of file
@@ -1,74 +1,108 @@
-from mathutils import Vector
+from . import scenegraph_utils
+import bpy
+import numpy as np
 
 def valid_particle(pa, valid_frames):
     return pa.die_time >= valid_frames[-1] and pa.birth_time <= valid_frames[0]
 
-def get_particles(ob, psys, inv_mtx, frame, valid_frames=None, get_next_P=False, get_width=True):
-    P = []
-    next_P = []
-    width = []
+def _get_alive_state_value():
+    prop = bpy.types.Particle.bl_rna.properties['alive_state']
+    return prop.enum_items['ALIVE'].value
 
+def get_particle_data(psys):
+    '''Read all of the particle attributes we export in one go,
+    using foreach_get.
+
+    Arguments:
+        psys (bpy.types.ParticleSystem) - the particle system
+
+    Returns:
+        (dict) - NumPy arrays, keyed by attribute name: location, velocity,
+                 angular_velocity, size, birth_time, die_time, lifetime
+                 and is_alive
+    '''
+    particles = psys.particles
+    num_particles = len(particles)
+    data = dict()
+    for attr in ('location', 'velocity', 'angular_velocity'):
+        arr = np.zeros(num_particles * 3, dtype=np.float32)
+        particles.foreach_get(attr, arr)
+        data[attr] = arr.reshape(-1, 3)
+    for attr in ('size', 'birth_time', 'die_time', 'lifetime'):
+        arr = np.zeros(num_particles, dtype=np.float32)
+        particles.foreach_get(attr, arr)
+        data[attr] = arr
+
+    try:
+        alive_state = np.zeros(num_particles, dtype=np.int32)
+        particles.foreach_get('alive_state', alive_state)
+        data['is_alive'] = (alive_state == _get_alive_state_value())
+    except (TypeError, KeyError):
+        # enums can't be read with foreach_get in all versions
+        data['is_alive'] = np.array([pa.alive_state == 'ALIVE' for pa in particles], dtype=bool)
+    return data
+
+def get_valid_particles_mask(particle_data, valid_frames):
+    # vectorized version of valid_particle
+    return (particle_data['die_time'] >= valid_frames[-1]) & (particle_data['birth_time'] <= valid_frames[0])
+
+def get_particles(ob, psys, inv_mtx, frame, valid_frames=None, get_next_P=False, get_width=True, particle_data=None):
     valid_frames = (frame,
                     frame) if valid_frames is None else valid_frames
-    
-    for pa in [p for p in psys.particles if valid_particle(p, valid_frames)]:
-        pt = inv_mtx @ pa.location
-        P.append(pt)
-        
-        if get_next_P:
-            # calculate the point for the next frame using velocity
-            vel = Vector(pa.velocity / pa.lifetime )
-            next_P.append( inv_mtx @ (Vector(pa.location) + vel))
-
-        if get_width:
-            if pa.alive_state != 'ALIVE':
-                width.append(0.0)
-            else:
-                width.append(pa.size)
-    return (P, next_P, width)    
-
-def get_primvars_particle(primvar, frame, psys, subframes, sample):
+    if particle_data is None:
+        particle_data = get_particle_data(psys)
+
+    mask = get_valid_particles_mask(particle_data, valid_frames)
+    mtx = np.array(inv_mtx, dtype=np.float32)
+    location = particle_data['location'][mask]
+    P = location @ mtx[:3, :3].T + mtx[:3, 3]
+
+    next_P = np.zeros((0, 3), dtype=np.float32)
+    if get_next_P:
+        # calculate the point for the next frame using velocity
+        lifetime = particle_data['lifetime'][mask][:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vel = np.where(lifetime != 0.0, particle_data['velocity'][mask] / lifetime, 0.0)
+        next_P = (location + vel) @ mtx[:3, :3].T + mtx[:3, 3]
+
+    width = np.zeros(0, dtype=np.float32)
+    if get_width:
+        width = np.where(particle_data['is_alive'][mask], particle_data['size'][mask], 0.0).astype(np.float32)
+
+    return (P, next_P, width)
+
+def get_primvars_particle(primvar, frame, psys, subframes, sample, particle_data=None):
     rm = psys.settings.renderman
+    if not rm.prim_vars:
+        return
+    if particle_data is None:
+        particle_data = get_particle_data(psys)
+    mask = get_valid_particles_mask(particle_data, subframes)
 
     for p in rm.prim_vars:
-        pvars = []
-
         if p.data_source in ('VELOCITY', 'ANGULAR_VELOCITY'):
             if p.data_source == 'VELOCITY':
-                for pa in \
-                        [p for p in psys.particles if valid_particle(p, subframes)]:
-                    pvars.append(pa.velocity)
+                pvars = particle_data['velocity'][mask]
             elif p.data_source == 'ANGULAR_VELOCITY':
-                for pa in \
-                        [p for p in psys.particles if valid_particle(p, subframes)]:
-                    pvars.append(pa.angular_velocity)
+                pvars = particle_data['angular_velocity'][mask]
 
-            primvar.SetVectorDetail(p.name, pvars, "vertex", sample)
+            scenegraph_utils.set_primvar_buffer(primvar.SetVectorDetail, p.name, pvars, "vertex", sample)
 
         elif p.data_source in \
                 ('SIZE', 'AGE', 'BIRTH_TIME', 'DIE_TIME', 'LIFE_TIME', 'ID'):
             if p.data_source == 'SIZE':
-                for pa in \
-                        [p for p in psys.particles if valid_particle(p, subframes)]:
-                    pvars.append(pa.size)
+                pvars = particle_data['size'][mask]
             elif p.data_source == 'AGE':
-                for pa in \
-                        [p for p in psys.particles if valid_particle(p, subframes)]:
-                    pvars.append((frame - pa.birth_time) / pa.lifetime)
+                lifetime = particle_data['lifetime'][mask]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    pvars = np.where(lifetime != 0.0, (frame - particle_data['birth_time'][mask]) / lifetime, 0.0)
             elif p.data_source == 'BIRTH_TIME':
-                for pa in \
-                        [p for p in psys.particles if valid_particle(p, subframes)]:
-                    pvars.append(pa.birth_time)
+                pvars = particle_data['birth_time'][mask]
             elif p.data_source == 'DIE_TIME':
-                for pa in \
-                        [p for p in psys.particles if valid_particle(p, subframes)]:
-                    pvars.append(pa.die_time)
+                pvars = particle_data['die_time'][mask]
             elif p.data_source == 'LIFE_TIME':
-                for pa in \
-                        [p for p in psys.particles if valid_particle(p, subframes)]:
-                    pvars.append(pa.lifetime)
+                pvars = particle_data['lifetime'][mask]
             elif p.data_source == 'ID':
-                pvars = [id for id, p in psys.particles.items(
-                ) if valid_particle(p, subframes)]
-            
-            primvar.SetFloatDetail(p.name, pvars, "vertex", sample)  
\ No newline at end of file
+                pvars = np.nonzero(mask)[0]
+
+            scenegraph_utils.set_primvar_buffer(primvar.SetFloatDetail, p.name, pvars.astype(np.float32), "vertex", sample)
@@ -0,0 +1,284 @@
+"""Export profiler.
+
+Records how long the different parts of a scene export take, as well as
+per object timing and vertex/primitive counts, and writes one report per
+frame. Reports use the Chrome trace event format, so they can be opened
+with chrome://tracing or https://ui.perfetto.dev. A summary of the slowest
+objects is stored in the report's "otherData" section.
+
+The profiler is turned on with the rman_export_profile preference, or by
+setting the RFB_EXPORT_PROFILE environment variable. If RFB_EXPORT_PROFILE
+is set to a directory, reports are written there, otherwise they go to
+the rman_export_profile_dir preference. Setting RFB_EXPORT_PROFILE to 0
+turns the profiler off, regardless of the preference.
+
+When the profiler is off, scope() and the decorators below only cost a
+global lookup.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from ..rfb_logger import rfb_log
+from .envconfig_utils import envconfig
+from .prefs_utils import get_pref
+
+# the active ExportProfiler, or None if we're not profiling
+__PROFILER__ = None
+
+
+class _NullScope(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set_args(self, **kwargs):
+        pass
+
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope(object):
+    def __init__(self, profiler, name, cat, args):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add_event(self.name, self.cat, self.start, time.perf_counter(), self.args)
+        return False
+
+    def set_args(self, **kwargs):
+        self.args.update(kwargs)
+
+
+class ExportProfiler(object):
+    """Collects timing events for one frame.
+
+    Attributes:
+        frame (int) - the frame being exported
+        events (list) - Chrome trace events
+        totals (dict) - (count, total seconds), keyed by (category, name)
+        objects (dict) - per object stats, keyed by object name
+    """
+
+    COUNT_ATTRS = ('npoints', 'npolys', 'nverts')
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.events = list()
+        self.totals = dict()
+        self.objects = dict()
+        self.pid = os.getpid()
+        self.start_time = time.perf_counter()
+        # names of the objects translators are currently working on
+        self.object_stack = list()
+
+    def add_event(self, name, cat, start, end, args=None):
+        event = {'name': name,
+                 'cat': cat,
+                 'ph': 'X',
+                 'ts': (start - self.start_time) * 1e6,
+                 'dur': (end - start) * 1e6,
+                 'pid': self.pid,
+                 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+        count, total = self.totals.get((cat, name), (0, 0.0))
+        self.totals[(cat, name)] = (count + 1, total + (end - start))
+
+    def get_object_name(self, args):
+        ob = None
+        rman_sg_node = None
+        for arg in args:
+            if ob is None and hasattr(arg, 'name_full'):
+                ob = arg
+            elif rman_sg_node is None and hasattr(arg, 'db_name'):
+                rman_sg_node = arg
+        if ob is not None:
+            return ob.name_full
+        if rman_sg_node is not None:
+            return rman_sg_node.db_name
+        return ''
+
+    def add_translator_call(self, name, start, end, ob_name, args, result):
+        rman_sg_node = None
+        for arg in args:
+            if hasattr(arg, 'db_name'):
+                rman_sg_node = arg
+                break
+        if rman_sg_node is None and hasattr(result, 'db_name'):
+            rman_sg_node = result
+
+        event_args = {'object': ob_name}
+        for attr in self.COUNT_ATTRS:
+            val = getattr(rman_sg_node, attr, -1)
+            if val is not None and val >= 0:
+                event_args[attr] = int(val)
+        self.add_event(name, 'translator', start, end, event_args)
+
+        stats = self.objects.get(ob_name, None)
+        if stats is None:
+            stats = {'time': 0.0, 'calls': 0}
+            self.objects[ob_name] = stats
+        stats['calls'] += 1
+        stats['time'] += (end - start)
+        for attr in self.COUNT_ATTRS:
+            if attr in event_args:
+                stats[attr] = max(stats.get(attr, 0), event_args[attr])
+
+    def get_report(self):
+        totals = [{'cat': cat, 'name': name, 'count': count, 'time': total}
+                  for (cat, name), (count, total) in self.totals.items()]
+        totals.sort(key=lambda x: x['time'], reverse=True)
+        objects = [dict(name=name, **stats) for name, stats in self.objects.items()]
+        objects.sort(key=lambda x: x['time'], reverse=True)
+        return {'traceEvents': self.events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'frame': self.frame,
+                              'totals': totals,
+                              'objects': objects}}
+
+    def write(self, output_dir):
+        """Write the report to output_dir. Returns the path to the report,
+        or None if it could not be written."""
+        filename = 'rfb_export_profile.%04d.json' % self.frame
+        path = os.path.join(output_dir, filename)
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            with open(path, 'w') as fhdl:
+                json.dump(self.get_report(), fhdl)
+        except (IOError, OSError) as e:
+            rfb_log().error("Could not write export profile %s: %s" % (path, str(e)))
+            return None
+        return path
+
+
+def is_enabled():
+    """Whether the export profiler is turned on, either via the
+    RFB_EXPORT_PROFILE environment variable or preference."""
+    env = envconfig()
+    val = env.getenv('RFB_EXPORT_PROFILE') if env else None
+    if val:
+        return val != '0'
+    return get_pref('rman_export_profile', False)
+
+
+def get_output_dir():
+    env = envconfig()
+    val = env.getenv('RFB_EXPORT_PROFILE') if env else None
+    if val and val not in ('0', '1'):
+        output_dir = val
+    else:
+        output_dir = get_pref('rman_export_profile_dir', os.path.join('<OUT>', 'profiles'))
+    from . import string_utils
+    return string_utils.expand_string(output_dir, asFilePath=True)
+
+
+def is_active():
+    return __PROFILER__ is not None
+
+
+@contextlib.contextmanager
+def profile_frame(frame):
+    """Context manager that profiles everything exported inside of it,
+    and writes a report for frame when done. Does nothing if the profiler
+    is off, or a frame is already being profiled."""
+    global __PROFILER__
+    if __PROFILER__ is not None or not is_enabled():
+        yield
+        return
+
+    profiler = ExportProfiler(frame)
+    __PROFILER__ = profiler
+    try:
+        yield
+    finally:
+        __PROFILER__ = None
+        path = profiler.write(get_output_dir())
+        if path:
+            rfb_log().info("Wrote export profile: %s" % path)
+
+
+def scope(name, cat='export', **kwargs):
+    """Return a context manager that times the code inside of it.
+
+    Args:
+        name (str) - name of the event
+        cat (str) - category of the event
+        kwargs - extra values to store with the event
+
+    Example:
+        with profile_utils.scope('txmake_all', cat='textures'):
+            texture_utils.get_txmanager().txmake_all(blocking=True)
+    """
+    profiler = __PROFILER__
+    if profiler is None:
+        return _NULL_SCOPE
+    return _Scope(profiler, name, cat, kwargs)
+
+
+def profile_this(cat='export'):
+    """Decorator that times every call to a function, while
+    the profiler is active."""
+    def decorator(func):
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = __PROFILER__
+            if profiler is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.add_event(name, cat, start, time.perf_counter())
+        return wrapper
+    return decorator
+
+
+def profile_translator(func):
+    """Decorator for translator methods. Besides timing the call, this
+    records the name and vertex/primitive counts of the object being
+    exported. See RmanTranslator.__init_subclass__.
+
+    Calls made while a translator is already working on the same object
+    (ex: curves exported with the mesh translator) are part of the outer
+    call, so they aren't recorded separately, and their time isn't counted twice.
+    """
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        profiler = __PROFILER__
+        if profiler is None:
+            return func(self, *args, **kwargs)
+        ob_name = profiler.get_object_name(args)
+        if ob_name in profiler.object_stack:
+            return func(self, *args, **kwargs)
+        profiler.object_stack.append(ob_name)
+        start = time.perf_counter()
+        result = None
+        try:
+            result = func(self, *args, **kwargs)
+            return result
+        finally:
+            end = time.perf_counter()
+            profiler.object_stack.pop()
+            profiler.add_translator_call(name, start, end, ob_name, args, result)
+    return wrapper
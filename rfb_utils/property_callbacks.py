@@ -4,6 +4,7 @@ from .rman_socket_utils import node_add_outputs
 from .rman_socket_utils import update_inputs
 from .shadergraph_utils import has_lobe_enable_props
 from . import scenegraph_utils
+from . import display_utils
 from ..rfb_logger import rfb_log
 import bpy
 
@@ -213,4 +214,8 @@ def update_options_func(self, context):
     scenegraph_utils.update_sg_options(context)
 
 def update_root_node_func(self, context):
-    scenegraph_utils.update_sg_root_node(context)
\ No newline at end of file
+    scenegraph_utils.update_sg_root_node(context)
+
+def update_dspy_dict_func(self, context):
+    # an AOV or display channel setting changed
+    display_utils.clear_dspy_dict_cache()
\ No newline at end of file
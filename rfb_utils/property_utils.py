@@ -12,6 +12,9 @@ import shutil
 import re
 
 
+# frame tokens in string params, ex: <f>, <f4>, <F4>
+__FRAME_TOKEN_PATTERN__ = re.compile(r'<[fF]\d*>')
+
 __GAINS_TO_ENABLE__ = {
     'diffuseGain': 'enableDiffuse',
     'specularFaceColor': 'enablePrimarySpecular',
@@ -441,17 +444,18 @@ def vstruct_conditional(node, param):
         new_tokens.extend(['else', 'False'])
     return eval(" ".join(new_tokens))
 
-def set_frame_sensitive(rman_sg_node, prop):
-    # check if the prop value has any frame token
+def has_frame_token(val):
+    # whether a string param has any frame token
     # ex: <f>, <f4>, <F4> etc.
-    # if it does, it means we need to issue a material
-    # update if the frame changes
-    pat = re.compile(r'<[f|F]\d*>')
-    m = pat.search(prop)
-    if m:
-        rman_sg_node.is_frame_sensitive = True        
-    else:
-        rman_sg_node.is_frame_sensitive = False  
+    return isinstance(val, str) and __FRAME_TOKEN_PATTERN__.search(val) is not None
+
+def set_frame_sensitive(rman_sg_node, prop):
+    # if the prop value has any frame token, it means we need 
+    # to issue an update if the frame changes. This is called for
+    # every string param of every node, so it never clears the flag;
+    # translators reset it before exporting their params.
+    if has_frame_token(prop):
+        rman_sg_node.is_frame_sensitive = True
 
 def set_dspymeta_params(node, prop_name, params):
     if node.plugin_name not in ['openexr', 'deepexr']:
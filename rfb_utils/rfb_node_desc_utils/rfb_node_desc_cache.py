@@ -0,0 +1,157 @@
+"""On-disk cache of parsed node descriptions.
+
+Parsing every .args and .oso file at startup is slow, so we keep the parsed
+RfbNodeDesc objects in a single pickle file, and only re-parse the files that
+changed since they were cached. The whole cache is thrown away if the add-on
+version, RMANTREE or the RenderMan version changes.
+
+The cache can be turned off by setting RFB_NODE_DESC_CACHE to 0, or moved
+somewhere else by setting RFB_NODE_DESC_CACHE to a file path.
+"""
+
+# pylint: disable=invalid-name
+
+import os
+import pickle
+import bpy
+from ...rfb_logger import rfb_log
+from ... import rman_constants
+from ..envconfig_utils import envconfig
+
+# bump this whenever RfbNodeDesc changes in a way that
+# invalidates already pickled objects
+CACHE_FORMAT_VERSION = 1
+CACHE_FILENAME = 'rfb_node_desc_cache.pickle'
+
+
+def get_cache_file():
+    """Return the path to the cache file, or None if the cache is disabled."""
+    env = envconfig()
+    cache_file = env.getenv('RFB_NODE_DESC_CACHE') if env else None
+    if cache_file == '0':
+        return None
+    if cache_file:
+        return cache_file
+    config_path = bpy.utils.user_resource('CONFIG')
+    if not config_path:
+        return None
+    return os.path.join(config_path, CACHE_FILENAME)
+
+
+def _get_cache_header():
+    env = envconfig()
+    rmantree = ''
+    rman_version = ''
+    if env:
+        rmantree = env.rmantree
+        if env.build_info:
+            rman_version = env.build_info.full_version()
+    return {'format': CACHE_FORMAT_VERSION,
+            'rfb_version': rman_constants.RFB_ADDON_VERSION_STRING,
+            'rmantree': rmantree,
+            'rman_version': rman_version}
+
+
+class RfbNodeDescCache(object):
+    """Cache of pickled RfbNodeDesc objects, keyed by file path. An entry is
+    only valid if the file's mtime and size haven't changed.
+
+    Note that node descriptions are cached as they were parsed, before
+    rman_config.apply_args_overrides is applied to them, so edits to the
+    override json files never require invalidating the cache.
+    """
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.header = _get_cache_header()
+        self.entries = dict()
+        self.used = set()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """Read the cache file, if it exists and matches our header."""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'rb') as fhdl:
+                data = pickle.load(fhdl)
+        except Exception as e:
+            rfb_log().debug("Could not read node description cache %s: %s" % (self.cache_file, str(e)))
+            return
+        if not isinstance(data, dict) or data.get('header', None) != self.header:
+            rfb_log().debug("Node description cache is out of date. Rebuilding.")
+            self.dirty = True
+            return
+        self.entries = data.get('entries', dict())
+
+    def get(self, path, parse_func):
+        """Return the node description for path, either from the cache or
+        by calling parse_func(path).
+
+        Args:
+            path (FilePath): path to the .args or .oso file
+            parse_func (function): function that parses the file
+
+        Returns:
+            (RfbNodeDesc) - the node description
+        """
+        key = str(path)
+        self.used.add(key)
+        try:
+            st = os.stat(key)
+            stamp = (st.st_mtime, st.st_size)
+        except OSError:
+            stamp = None
+
+        entry = self.entries.get(key, None)
+        if stamp and entry and entry[0] == stamp:
+            try:
+                node_desc = pickle.loads(entry[1])
+                self.hits += 1
+                return node_desc
+            except Exception as e:
+                rfb_log().debug("Could not unpickle cached node description %s: %s" % (key, str(e)))
+
+        self.misses += 1
+        node_desc = parse_func(path)
+        if stamp:
+            try:
+                self.entries[key] = (stamp, pickle.dumps(node_desc, protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception as e:
+                rfb_log().debug("Could not cache node description %s: %s" % (key, str(e)))
+                self.entries.pop(key, None)
+            self.dirty = True
+        return node_desc
+
+    def save(self):
+        """Write the cache file, if anything changed. Entries for files that
+        weren't visited this session are dropped."""
+        if not self.cache_file:
+            return
+        stale = [k for k in self.entries if k not in self.used]
+        for k in stale:
+            del self.entries[k]
+        if not self.dirty and not stale:
+            return
+
+        tmp_file = '%s.%d.tmp' % (self.cache_file, os.getpid())
+        try:
+            cache_dir = os.path.dirname(self.cache_file)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_file, 'wb') as fhdl:
+                pickle.dump({'header': self.header, 'entries': self.entries},
+                            fhdl, protocol=pickle.HIGHEST_PROTOCOL)
+            # replace atomically, in case several Blender sessions
+            # start at the same time
+            os.replace(tmp_file, self.cache_file)
+            self.dirty = False
+        except (IOError, OSError) as e:
+            rfb_log().debug("Could not write node description cache %s: %s" % (self.cache_file, str(e)))
+            if os.path.exists(tmp_file):
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
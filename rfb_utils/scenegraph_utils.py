@@ -1,3 +1,5 @@
+from ..rfb_logger import rfb_log
+
 def set_material(sg_node, sg_material_node):
     '''Sets the material on a scenegraph group node and sets the materialid
     user attribute at the same time.
@@ -37,4 +39,31 @@ def export_vol_aggregate(bl_scene, primvar, ob):
                 break
 
     if vol_aggregate_group:
-        primvar.SetStringArray("volume:aggregate", vol_aggregate_group, len(vol_aggregate_group))
\ No newline at end of file
+        primvar.SetStringArray("volume:aggregate", vol_aggregate_group, len(vol_aggregate_group))
+
+__PRIMVAR_BUFFERS_SUPPORTED__ = True
+
+def set_primvar_buffer(setter, name, data, *args):
+    '''Call one of the RtPrimVar Set*Detail/Set*Array functions, passing a
+    NumPy array straight through the buffer protocol. If the rman bindings
+    refuse the buffer, we fall back to a list, and stop trying buffers for the
+    rest of the session.
+
+    Arguments:
+        setter (function) - bound RtPrimVar setter, ex: primvar.SetPointDetail
+        name (str) - name of the primvar
+        data (numpy.ndarray or list) - the primvar data
+        args - any remaining arguments for the setter (detail, time sample, etc.)
+    '''
+    global __PRIMVAR_BUFFERS_SUPPORTED__
+
+    if hasattr(data, 'tolist'):
+        if __PRIMVAR_BUFFERS_SUPPORTED__:
+            try:
+                setter(name, data, *args)
+                return
+            except (TypeError, ValueError) as err:
+                rfb_log().debug("Primvar buffers not supported, falling back to lists: %s" % str(err))
+                __PRIMVAR_BUFFERS_SUPPORTED__ = False
+        data = data.tolist()
+    setter(name, data, *args)
@@ -344,38 +344,72 @@ def find_node_input(node, name):
 
     return None
 
+def _is_exported_node(node):
+    if hasattr(node, 'renderman_node_type'):
+        return node.renderman_node_type != 'output'
+    return node.bl_idname not in ['ShaderNodeOutputMaterial', 'NodeGroupInput', 'NodeGroupOutput']
+
+def _get_convert_node(link, socket):
+    # if this is a float->float3 type or float3->float connections, return 
+    # either a PxrToFloat3 or PxrToFloat conversion node         
+    if link.from_node.bl_idname == 'NodeReroute' or link.to_node.bl_idname == 'NodeReroute':
+        return None
+    if is_socket_float_type(link.from_socket) and is_socket_float3_type(socket):
+        return RmanConvertNode('PxrToFloat3', link.from_node, link.from_socket, link.to_node, link.to_socket)
+    elif is_socket_float3_type(link.from_socket) and is_socket_float_type(socket):
+        return RmanConvertNode('PxrToFloat', link.from_node, link.from_socket, link.to_node, link.to_socket)
+    return None
+
 # walk the tree for nodes to export
 def gather_nodes(node):
+    '''Gather all of the nodes upstream of node that need to be exported, 
+    in the order they need to be exported: every node comes after the nodes
+    connected to its inputs, and inputs are visited in socket order. Each node
+    is returned once, even if it is reached through several paths. Conversion
+    nodes are inserted after the upstream node of any float<->float3 link.
+
+    Arguments:
+        node (bpy.types.Node) - the node to start from
+
+    Returns:
+        (list) - the nodes to export, including RmanConvertNode instances
+    '''
     nodes = []
-    for socket in node.inputs:
-        if socket.is_linked:
-            link = socket.links[0]
-            for sub_node in gather_nodes(socket.links[0].from_node):
-                if sub_node not in nodes:
-                    nodes.append(sub_node)
+    visited = set([node])
+
+    # Each entry is [node, index of the input socket being looked at, 
+    # whether we've already walked up that socket's link]. This is an
+    # iterative post-order walk, so deep networks don't hit the recursion limit.
+    stack = [[node, 0, False]]
+    while stack:
+        entry = stack[-1]
+        cur_node, i, walked = entry
+        if i >= len(cur_node.inputs):
+            stack.pop()
+            if _is_exported_node(cur_node):
+                nodes.append(cur_node)
+            continue
 
-            
-            if link.from_node.bl_idname == 'NodeReroute':
-                continue
+        socket = cur_node.inputs[i]
+        if not socket.is_linked:
+            entry[1] += 1
+            continue
 
-            if node.bl_idname == 'NodeReroute':
+        link = socket.links[0]
+        if not walked:
+            entry[2] = True
+            from_node = link.from_node
+            if from_node not in visited:
+                visited.add(from_node)
+                stack.append([from_node, 0, False])
                 continue
-            
-            # if this is a float->float3 type or float3->float connections, insert
-            # either PxrToFloat3 or PxrToFloat conversion nodes         
-            if is_socket_float_type(link.from_socket) and is_socket_float3_type(socket):
-                convert_node = RmanConvertNode('PxrToFloat3', link.from_node, link.from_socket, link.to_node, link.to_socket)
-                if convert_node not in nodes:
-                    nodes.append(convert_node)
-            elif is_socket_float3_type(link.from_socket) and is_socket_float_type(socket):
-                convert_node = RmanConvertNode('PxrToFloat', link.from_node, link.from_socket, link.to_node, link.to_socket)
-                if convert_node not in nodes:
-                    nodes.append(convert_node)
-
-    if hasattr(node, 'renderman_node_type') and node.renderman_node_type != 'output':
-        nodes.append(node)
-    elif not hasattr(node, 'renderman_node_type') and node.bl_idname not in ['ShaderNodeOutputMaterial', 'NodeGroupInput', 'NodeGroupOutput']:
-        nodes.append(node)
+
+        # everything upstream of this socket has been gathered
+        entry[1] += 1
+        entry[2] = False
+        convert_node = _get_convert_node(link, socket)
+        if convert_node:
+            nodes.append(convert_node)
 
     return nodes    
 
@@ -841,6 +875,8 @@ def has_stylized_pattern_node(ob, node=None):
 
 def create_pxrlayer_nodes(nt, bxdf):
     from .. import rman_bl_nodes
+    rman_bl_nodes.ensure_node_types_registered([rman_bl_nodes.__BL_NODES_MAP__["PxrLayerMixer"],
+                                                rman_bl_nodes.__BL_NODES_MAP__["PxrLayer"]])
 
     mixer = nt.nodes.new(rman_bl_nodes.__BL_NODES_MAP__["PxrLayerMixer"])
     layer1 = nt.nodes.new(rman_bl_nodes.__BL_NODES_MAP__["PxrLayer"])
@@ -996,6 +1032,7 @@ def _convert_grease_pencil_fill_checker(mat, nt, output):
 
 def convert_grease_pencil_mat(mat, nt, output):
     from .. import rman_bl_nodes
+    rman_bl_nodes.ensure_node_types_registered()
 
     gp_mat = mat.grease_pencil
     if gp_mat.show_stroke:
@@ -36,6 +36,131 @@ def time_this(f):
 
 PAD_FMT = ['%d', '%01d', '%02d', '%03d', '%04d']
 
+# tokens that change all the time (ex: per frame, or per display).
+# Setting these doesn't bump the token generation; instead, their values
+# are part of the expansion cache key.
+VOLATILE_TOKENS = ['frame', 'f', 'f2', 'f3', 'f4', 'f5',
+                   'F', 'F2', 'F3', 'F4', 'F5', 'ext']
+
+# max. number of entries in a StringExpression's expansion cache
+EXPAND_CACHE_SIZE = 10000
+
+# directories we know exist, and the directories waiting to be created
+# while directory creation is deferred (see begin_deferred_dirs)
+__KNOWN_DIRS__ = set()
+__PENDING_DIRS__ = None
+__DEFERRED_DIRS_DEPTH__ = 0
+
+
+def _create_dir(dirname):
+    if os.path.exists(dirname):
+        return True
+    try:
+        os.makedirs(dirname, exist_ok=True)
+    except PermissionError:
+        rfb_log().error("Cannot create path: %s" % dirname)
+        return False
+    except OSError as e:
+        rfb_log().error("Cannot create path: %s (%s)" % (dirname, str(e)))
+        return False
+    return True
+
+
+def make_dirs(dirname):
+    """Make sure the directory exists, unless we already know it does. If directory
+    creation is currently deferred, the directory is only queued.
+
+    Args:
+    - dirname (str): the directory
+    """
+    global __PENDING_DIRS__
+    if not dirname or dirname in __KNOWN_DIRS__:
+        return
+    if __PENDING_DIRS__ is not None:
+        __PENDING_DIRS__.add(dirname)
+        return
+    if _create_dir(dirname):
+        __KNOWN_DIRS__.add(dirname)
+
+
+def clear_known_dirs():
+    """Forget which directories exist, so that make_dirs checks for them
+    again. Call this when a render or export starts, in case any of them
+    were removed since the last one."""
+    __KNOWN_DIRS__.clear()
+
+
+def begin_deferred_dirs():
+    """Start queuing the directories from make_dirs, rather than creating
+    them right away. Calls can be nested."""
+    global __PENDING_DIRS__
+    global __DEFERRED_DIRS_DEPTH__
+    if __PENDING_DIRS__ is None:
+        __PENDING_DIRS__ = set()
+    __DEFERRED_DIRS_DEPTH__ += 1
+
+
+def end_deferred_dirs():
+    """Create all of the queued directories in one pass, once the outermost
+    begin_deferred_dirs call has ended."""
+    global __PENDING_DIRS__
+    global __DEFERRED_DIRS_DEPTH__
+    __DEFERRED_DIRS_DEPTH__ = max(0, __DEFERRED_DIRS_DEPTH__ - 1)
+    if __DEFERRED_DIRS_DEPTH__ > 0 or __PENDING_DIRS__ is None:
+        return
+    pending = __PENDING_DIRS__
+    __PENDING_DIRS__ = None
+    # creating the deepest directories also creates their parents
+    for dirname in sorted(pending, key=len, reverse=True):
+        if dirname in __KNOWN_DIRS__:
+            continue
+        if _create_dir(dirname):
+            __KNOWN_DIRS__.add(dirname)
+            parent = os.path.dirname(dirname)
+            while parent and parent not in __KNOWN_DIRS__ and parent != os.path.dirname(parent):
+                __KNOWN_DIRS__.add(parent)
+                parent = os.path.dirname(parent)
+
+
+class TokenDict(dict):
+    """Dictionary of tokens that keeps track of a generation number, bumped
+    whenever a non-volatile token actually changes value. This is used to
+    invalidate the expansion cache."""
+
+    def __init__(self, *args, **kw):
+        super(TokenDict, self).__init__(*args, **kw)
+        self.generation = 0
+
+    def __setitem__(self, key, value):
+        if key not in VOLATILE_TOKENS and self.get(key, None) != value:
+            self.generation += 1
+        super(TokenDict, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.generation += 1
+        super(TokenDict, self).__delitem__(key)
+
+    def update(self, *args, **kw):
+        for k, v in dict(*args, **kw).items():
+            self[k] = v
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, *args):
+        self.generation += 1
+        return super(TokenDict, self).pop(*args)
+
+    def popitem(self):
+        self.generation += 1
+        return super(TokenDict, self).popitem()
+
+    def clear(self):
+        self.generation += 1
+        super(TokenDict, self).clear()
+
 # split the token into 3 groups:
 #   1 - the main token
 #   2 - the token formatting string
@@ -50,6 +175,10 @@ PARSING_EXPR = re.compile(r'<([\w\:]*[\w\.]+)(\?[\w\d\._-]+)*'  # token
                           r'(:[^>]+)*>|'                        # formatter
                           r'\$\{?([A-Z0-9_]{3,})\}?')           # env var
 
+# the env vars in an expression, whose current values go into
+# the expansion cache key
+ENV_VAR_EXPR = re.compile(r'\$\{?([A-Z0-9_]{3,})\}?')
+
 
 class StringExpression(object):
 
@@ -58,7 +187,10 @@ class StringExpression(object):
         self.bl_scene = bpy.context.scene
         if bl_scene:
             self.bl_scene = bl_scene
-        self.tokens = {}
+        self.tokens = TokenDict()
+        self.expand_cache = dict()
+        self.out_token_key = None
+        __KNOWN_DIRS__.clear()
         self.update_temp_token()
         self.update_out_token()
         #self.update_blend_tokens()  
@@ -95,6 +227,15 @@ class StringExpression(object):
     def update_out_token(self):
         if 'blend' not in self.tokens:
             self.update_blend_tokens()
+
+        # skip re-expanding the root path, and the filesystem checks,
+        # if nothing it depends on has changed
+        root_path_output = self.bl_scene.renderman.root_path_output if self.bl_scene else None
+        scene_ptr = self.bl_scene.as_pointer() if self.bl_scene else None
+        out_token_key = (scene_ptr, root_path_output, bpy.data.filepath, self.tokens.generation)
+        if out_token_key == self.out_token_key:
+            return
+
         dflt_path = self.expand('<TEMP>/renderman_for_blender/<blend>')
         if not self.bl_scene:
             self.tokens['OUT'] = dflt_path
@@ -103,12 +244,16 @@ class StringExpression(object):
             if not os.path.isabs(root_path):
                 rfb_log().debug("Root path: %s is not absolute. Using default." % root_path)            
                 root_path = dflt_path
-            elif not os.path.exists(root_path):
-                try:
-                    os.makedirs(root_path, exist_ok=True)
-                except PermissionError:
-                    rfb_log().debug("Cannot create root path: %s. Using default." % root_path)            
-                    root_path = dflt_path
+            elif root_path not in __KNOWN_DIRS__:
+                if os.path.exists(root_path):
+                    __KNOWN_DIRS__.add(root_path)
+                else:
+                    try:
+                        os.makedirs(root_path, exist_ok=True)
+                        __KNOWN_DIRS__.add(root_path)
+                    except PermissionError:
+                        rfb_log().debug("Cannot create root path: %s. Using default." % root_path)            
+                        root_path = dflt_path
             self.tokens['OUT'] = root_path    
             
         unsaved = True if not bpy.data.filepath else False
@@ -117,6 +262,8 @@ class StringExpression(object):
         else:
             self.tokens['blend_dir'] = os.path.split(bpy.data.filepath)[0]     
 
+        self.out_token_key = (scene_ptr, root_path_output, bpy.data.filepath, self.tokens.generation)
+
     def update_blend_tokens(self):
         scene = self.bl_scene
         rm = scene.renderman        
@@ -166,6 +313,33 @@ class StringExpression(object):
         if '<' not in expr and '$' not in expr:
             return expr
 
+        # the frame and display tokens, and the values of any env vars,
+        # are part of the key, everything else is covered by the token
+        # generation
+        cache_key = None
+        if not objTokens:
+            cache_key = (expr, asFilePath, self.tokens.generation,
+                         self.tokens.get('frame', None), self.tokens.get('ext', None))
+            if '$' in expr:
+                cache_key += tuple(os.environ.get(var, None)
+                                   for var in ENV_VAR_EXPR.findall(expr))
+            result = self.expand_cache.get(cache_key, None)
+            if result is not None:
+                if asFilePath:
+                    # the directory may have been removed since
+                    # we cached this (see clear_known_dirs)
+                    make_dirs(os.path.dirname(result))
+                return result
+
+        result = self._expand(expr, objTokens=objTokens, asFilePath=asFilePath)
+
+        if cache_key is not None:
+            if len(self.expand_cache) >= EXPAND_CACHE_SIZE:
+                self.expand_cache.clear()
+            self.expand_cache[cache_key] = result
+        return result
+
+    def _expand(self, expr, objTokens={}, asFilePath=False):
         toks = dict(self.tokens)
         toks.update(objTokens)
         # print toks
@@ -227,12 +401,7 @@ class StringExpression(object):
             # get the real path
             result = filepath_utils.get_real_path(result)
 
-            dirname = os.path.dirname(result)
-            if not os.path.exists(dirname):
-                try:
-                    os.makedirs(dirname, exist_ok=True)
-                except PermissionError:
-                    rfb_log().error("Cannot create path: %s" % dirname)
+            make_dirs(os.path.dirname(result))
     
         return result
 
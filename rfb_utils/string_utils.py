@@ -1,7 +1,9 @@
 from .string_expr import StringExpression
+from . import string_expr
 from . import filepath_utils
 from ..rfb_logger import rfb_log
 from bpy.app.handlers import persistent
+from contextlib import contextmanager
 import bpy
 import os
 import re
@@ -129,14 +131,7 @@ def expand_string(string, display=None, glob_sequence=False, frame=None, token_d
         # get the real path
         if string and asFilePath and os.path.isabs(string):
             string = filepath_utils.get_real_path(string)
-            dirname = os.path.dirname(string)
-            if not os.path.exists(dirname):
-                try:
-                    os.makedirs(dirname, exist_ok=True)
-                except PermissionError as e:
-                    rfb_log().error("Cannot create path: %s (%s)" % (dirname), str(e))
-                except OSError as e:
-                    rfb_log().error("Cannot create path: %s (%s)" % (dirname, str(e)))                                     
+            string_expr.make_dirs(os.path.dirname(string))
         return string
 
     if __SCENE_STRING_CONVERTER__ is None:
@@ -148,6 +143,35 @@ def expand_string(string, display=None, glob_sequence=False, frame=None, token_d
     return __SCENE_STRING_CONVERTER__.expand(
         string, display=display, frame=frame, token_dict=token_dict, asFilePath=asFilePath)
 
+@contextmanager
+def deferred_makedirs():
+    """Defer creating the directories of any asFilePath expansions made inside
+    this block. They are all created in a single pass when the block exits.
+    Use this around loops that expand many output paths (ex: per frame), before
+    anything gets written to those paths.
+    """
+    string_expr.begin_deferred_dirs()
+    try:
+        yield
+    finally:
+        string_expr.end_deferred_dirs()
+
+def clear_known_dirs():
+    """Make the next asFilePath expansions check that their directories
+    still exist. Called at the start of every render and export.
+    """
+    string_expr.clear_known_dirs()
+
+def get_tokens_generation():
+    """Get a value that changes whenever any of the tokens used for expansion
+    change, other than the frame and <ext> tokens. Use this to invalidate
+    caches of expanded strings.
+    """
+    if __SCENE_STRING_CONVERTER__ is None or __SCENE_STRING_CONVERTER__.expr is None:
+        return None
+    expr = __SCENE_STRING_CONVERTER__.expr
+    return (id(expr), expr.tokens.generation)
+
 def converter_validity_check():
     global __SCENE_STRING_CONVERTER__
     if __SCENE_STRING_CONVERTER__ is None:
@@ -1,4 +1,5 @@
 from ..rfb_utils.rfb_node_desc_utils.rfb_node_desc import RfbNodeDesc
+from ..rfb_utils.rfb_node_desc_utils import rfb_node_desc_cache
 from ..rfb_utils import filepath_utils
 from ..rfb_utils.filepath import FilePath
 from ..rfb_utils import generate_property_utils
@@ -22,6 +23,7 @@ from bpy.props import *
 import bpy
 import os
 import sys
+import time
 import traceback
 import nodeitems_utils
 from operator import attrgetter
@@ -92,6 +94,12 @@ __BL_NODES_MAP__ = dict()
 __CYCLES_NODE_DESC_MAP__ = dict()
 __RMAN_NODES_ALREADY_REGISTERED__ = False
 
+# Pattern node types that have been parsed, but not registered yet.
+# See use_lazy_node_registration(). Keyed by both the node typename
+# and the OSL alias typename.
+__RMAN_LAZY_NODE_TYPES__ = dict()
+__LAZY_NODES_PER_TICK__ = 20
+
 def get_cycles_node_desc(node):
     from ..rfb_utils.filepath import FilePath
 
@@ -526,6 +534,137 @@ def generate_node_type(node_desc, is_oso=False):
 
     return (typename, ntype)
 
+def use_lazy_node_registration():
+    '''Whether pattern node types should be registered on demand, rather
+    than all at startup. Turned on by setting RFB_LAZY_NODE_REGISTRATION
+    to 1.
+    '''
+    env = envconfig()
+    if not env:
+        return False
+    return env.getenv('RFB_LAZY_NODE_REGISTRATION', '0') not in ('', '0')
+
+def add_lazy_node_type(node_desc, is_oso=False):
+    ''' Remember a node description, so that its node type can be
+    registered later, by ensure_node_types_registered.
+    '''
+    name = node_desc.name
+    nodeType = node_desc.node_type.capitalize()
+    typename = '%s%sNode' % (name, nodeType)
+    keys = [typename]
+    if is_oso:
+        keys.append('%s%sOSLNode' % (name, nodeType))
+    entry = (node_desc, is_oso, keys)
+    for k in keys:
+        __RMAN_LAZY_NODE_TYPES__[k] = entry
+    return typename
+
+def ensure_node_types_registered(typenames=None):
+    ''' Register node types that were deferred by lazy node registration.
+    This should be called before creating RenderMan nodes with nt.nodes.new.
+    It does nothing if lazy node registration is off, or if the node types
+    are already registered.
+
+    Args:
+        typenames (list) - node typenames to register. If None, all pending
+                           node types are registered.
+
+    Returns:
+        (int) - the number of node types that were registered
+    '''
+    if not __RMAN_LAZY_NODE_TYPES__:
+        return 0
+    if typenames is None:
+        typenames = list(__RMAN_LAZY_NODE_TYPES__.keys())
+
+    count = 0
+    start_time = time.time()
+    for typename in typenames:
+        entry = __RMAN_LAZY_NODE_TYPES__.get(typename, None)
+        if not entry:
+            continue
+        node_desc, is_oso, keys = entry
+        for k in keys:
+            __RMAN_LAZY_NODE_TYPES__.pop(k, None)
+        try:
+            typename, nodetype = generate_node_type(node_desc, is_oso=is_oso)
+        except Exception as e:
+            rfb_log().error("Could not register node type %s: %s" % (typename, str(e)))
+            traceback.print_exc()
+            continue
+        if typename and nodetype:
+            __RMAN_NODE_TYPES__[typename] = nodetype
+            count += 1
+
+    if count:
+        rfb_log().debug("Registered %d deferred node types in %.3fs (%d still pending)." %
+                        (count, time.time() - start_time, len(__RMAN_LAZY_NODE_TYPES__)))
+    return count
+
+def ensure_scene_node_types_registered(ids=None):
+    ''' Register any deferred node types used by node trees in the
+    current blend file. This is called from the load_post handler,
+    before anything else looks at the nodes, and before materials are
+    exported, for materials that were appended or linked after the
+    file was loaded.
+
+    Nodes whose type isn't registered come back as NodeUndefined, and
+    there is no way to ask Blender for their original idname. So we guess
+    from the node names, and if any node is still undefined after that,
+    we give up on being lazy and register everything. This guarantees
+    that a scene always opens with all of its nodes intact.
+
+    Args:
+        ids (list) - only look at the node trees of these materials, lights
+                     or worlds (and the node groups). If None, look at all of them.
+    '''
+    if not __RMAN_LAZY_NODE_TYPES__:
+        return
+
+    def _gather_node_trees():
+        colls = (bpy.data.materials, bpy.data.lights, bpy.data.worlds) if ids is None else (ids,)
+        for coll in colls:
+            for id in coll:
+                if id.node_tree:
+                    yield id.node_tree
+        for nt in bpy.data.node_groups:
+            yield nt
+
+    def _has_undefined_nodes():
+        for nt in _gather_node_trees():
+            for node in nt.nodes:
+                if node.bl_idname == 'NodeUndefined':
+                    return True
+        return False
+
+    start_time = time.time()
+    typenames = set()
+    for nt in _gather_node_trees():
+        for node in nt.nodes:
+            if node.bl_idname in __RMAN_LAZY_NODE_TYPES__:
+                typenames.add(node.bl_idname)
+            elif node.bl_idname == 'NodeUndefined':
+                # node names default to the plugin name, ex: PxrTexture.001
+                typename = __BL_NODES_MAP__.get(node.name.split('.')[0], None)
+                if typename:
+                    typenames.add(typename)
+
+    ensure_node_types_registered(list(typenames))
+    if _has_undefined_nodes():
+        rfb_log().debug("Scene has undefined nodes. Registering all deferred node types.")
+        ensure_node_types_registered()
+    rfb_log().debug("Registered scene node types in %.3fs" % (time.time() - start_time))
+
+def _register_node_types_idle():
+    # register pending node types a few at a time, while the UI is idle
+    if not __RMAN_LAZY_NODE_TYPES__:
+        return None
+    typenames = list(__RMAN_LAZY_NODE_TYPES__.keys())[:__LAZY_NODES_PER_TICK__]
+    ensure_node_types_registered(typenames)
+    if not __RMAN_LAZY_NODE_TYPES__:
+        return None
+    return 0.01
+
 def register_plugin_to_parent(ntype, name, node_desc, plugin_type, parent):
 
     class_generate_properties(ntype, name, node_desc)
@@ -635,6 +774,10 @@ def register_rman_nodes():
     rman_disabled_nodes = rfb_config['disabled_nodes']
 
     rfb_log().debug("Registering RenderMan Plugin Nodes:")
+    start_time = time.time()
+    lazy_registration = use_lazy_node_registration()
+    node_desc_cache = rfb_node_desc_cache.RfbNodeDescCache(rfb_node_desc_cache.get_cache_file())
+    node_desc_cache.load()
     path_list = envconfig().get_shader_registration_paths()
     visited = set()
     for path in path_list:
@@ -660,7 +803,7 @@ def register_rman_nodes():
                         is_args = False
 
                     rfb_log().debug("\t    Parsing: %s" % filename)
-                    node_desc = RfbNodeDesc(FilePath(root).join(FilePath(filename)))
+                    node_desc = node_desc_cache.get(FilePath(root).join(FilePath(filename)), RfbNodeDesc)
 
                     # apply any overrides
                     rman_config.apply_args_overrides(filename, node_desc)
@@ -676,16 +819,24 @@ def register_rman_nodes():
                         register_plugin_types(node_desc)
                         continue
                     
-                    typename, nodetype = generate_node_type(node_desc, is_oso=is_oso)
-                    if not typename and not nodetype:
-                        continue
-
-                    if typename and nodetype:
-                        __RMAN_NODE_TYPES__[typename] = nodetype
+                    if lazy_registration and node_desc.node_type == 'pattern':
+                        # patterns are the bulk of our nodes. Only register them
+                        # when they are needed. See ensure_node_types_registered.
+                        typename = add_lazy_node_type(node_desc, is_oso=is_oso)
                         __BL_NODES_MAP__[node_desc.name] = typename
+                        label = node_desc.name
+                    else:
+                        typename, nodetype = generate_node_type(node_desc, is_oso=is_oso)
+                        if not typename and not nodetype:
+                            continue
+
+                        if typename and nodetype:
+                            __RMAN_NODE_TYPES__[typename] = nodetype
+                            __BL_NODES_MAP__[node_desc.name] = typename
+                        label = nodetype.bl_label
 
                     # categories
-                    node_item = RendermanNodeItem(typename, label=nodetype.bl_label)
+                    node_item = RendermanNodeItem(typename, label=label)
                     if node_desc.node_type == 'pattern': 
                         classification = getattr(node_desc, 'classification', '')                                                       
                         if classification and classification != '':
@@ -765,7 +916,10 @@ def register_rman_nodes():
                         __RMAN_NODE_CATEGORIES__['projection']['projection'][0][1].append(node_item)  
                         __RMAN_NODE_CATEGORIES__['projection']['projection'][1].append(node_desc)                             
 
-    rfb_log().debug("Finished Registering RenderMan Plugin Nodes.")
+    node_desc_cache.save()
+    rfb_log().debug("Finished Registering RenderMan Plugin Nodes in %.3fs (%d cached, %d parsed, %d deferred)." % 
+                    (time.time() - start_time, node_desc_cache.hits, node_desc_cache.misses,
+                    len(set(e[0].name for e in __RMAN_LAZY_NODE_TYPES__.values()))))
 
 
 def register_node_categories():
@@ -805,7 +959,17 @@ def register():
     rman_bl_nodes_ops.register()
     rman_bl_nodes_menus.register()
 
+    # in interactive sessions, register the rest of the deferred
+    # node types in the background, so the add menus and search
+    # have them when the user gets to them
+    if __RMAN_LAZY_NODE_TYPES__ and not bpy.app.background:
+        if not bpy.app.timers.is_registered(_register_node_types_idle):
+            bpy.app.timers.register(_register_node_types_idle, first_interval=2.0, persistent=True)
+
 def unregister():
+    if bpy.app.timers.is_registered(_register_node_types_idle):
+        bpy.app.timers.unregister(_register_node_types_idle)
+
     try:
         nodeitems_utils.unregister_node_categories("RENDERMANSHADERNODES")
     except RuntimeError:
@@ -423,6 +423,7 @@ class NODE_OT_rman_node_create(bpy.types.Operator):
 
         if input_node is None:
             rman_node_name = rman_bl_nodes.__BL_NODES_MAP__.get(self.node_name)
+            rman_bl_nodes.ensure_node_types_registered([rman_node_name])
             if node and socket and nt:
                 newnode = nt.nodes.new(rman_node_name)
                 newnode.select = False
@@ -435,6 +436,7 @@ class NODE_OT_rman_node_create(bpy.types.Operator):
         # replace input node with a new one
         else:
             rman_node_name = rman_bl_nodes.__BL_NODES_MAP__.get(self.node_name)
+            rman_bl_nodes.ensure_node_types_registered([rman_node_name])
             newnode = nt.nodes.new(rman_node_name)
             newnode.select = False
             if socket:
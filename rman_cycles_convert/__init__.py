@@ -195,6 +195,8 @@ def convert_world_nodetree(world, context, df_output=False):
 def convert_cycles_nodetree(id, output_node):
     # find base node
     from . import cycles_convert
+    from .. import rman_bl_nodes
+    rman_bl_nodes.ensure_node_types_registered()
     cycles_convert.converted_nodes = {}
     cycles_convert.__CURRENT_MATERIAL__ = id
     nt = id.node_tree
@@ -2,16 +2,22 @@ from ..rfb_utils import texture_utils
 from ..rfb_utils import string_utils
 from ..rfb_utils import shadergraph_utils
 from ..rfb_utils import upgrade_utils
+from ..rfb_utils import archive_utils
 from ..rman_ui import rman_ui_light_handlers
+from .. import rman_bl_nodes
 from bpy.app.handlers import persistent
 import bpy
 
 @persistent
 def rman_load_post(bl_scene):
+    # this needs to happen first, so that the rest of the handlers
+    # see all of the nodes in the file
+    rman_bl_nodes.ensure_scene_node_types_registered()
     string_utils.update_blender_tokens_cb(bl_scene)
     rman_ui_light_handlers.clear_gl_tex_cache(bl_scene)
     texture_utils.txmanager_load_cb(bl_scene)
     upgrade_utils.upgrade_scene(bl_scene)
+    archive_utils.clear_archives()
 
 @persistent
 def rman_save_pre(bl_scene):
@@ -26,6 +32,7 @@ def rman_save_post(bl_scene):
 @persistent
 def depsgraph_update_post(bl_scene, depsgraph):
     texture_utils.depsgraph_handler(bl_scene, depsgraph)             
+    archive_utils.depsgraph_handler(bl_scene, depsgraph)
 
 def register():
 
@@ -162,10 +162,43 @@ class PRMAN_OT_ExternalRender(bpy.types.Operator):
         else:
             self.report({'ERROR'}, 'Queuing system set to none')       
 
+    def external_rib_render_workers(self, context):
+        # export the RIB files using background Blender processes
+        rm = context.scene.renderman
+        depsgraph = context.evaluated_depsgraph_get()
+
+        rr = RmanRender.get_rman_render()
+        rr.rman_scene.bl_scene = depsgraph.scene_eval
+        rr.rman_scene.bl_view_layer = depsgraph.view_layer
+        rr.rman_scene.bl_frame_current = rr.rman_scene.bl_scene.frame_current
+        rr.rman_scene._find_renderman_layer()
+        rr.rman_scene.external_render = True
+
+        # create a temporary .blend file for the workers
+        bl_scene_file = bpy.data.filepath
+        pid = os.getpid()
+        timestamp = int(time.time())
+        _id = 'pid%s_%d' % (str(pid), timestamp)
+        bl_filepath = os.path.dirname(bl_scene_file)
+        bl_filename = os.path.splitext(os.path.basename(bl_scene_file))[0]
+        # set blend_token to the real filename
+        rm.blend_token = bl_filename
+        bl_stash_scene_file = os.path.join(bl_filepath, '_%s%s_.blend' % (bl_filename, _id))
+        bpy.ops.wm.save_as_mainfile(filepath=bl_stash_scene_file, copy=True)
+        rm.blend_token = ''
+        try:
+            if not rr.start_external_render_workers(depsgraph, bl_stash_scene_file):
+                self.report({'ERROR'}, 'RIB export failed for some frames. See the console for details.')
+        finally:
+            os.remove(bl_stash_scene_file)
+
     def external_rib_render(self, context):
         scene = context.scene
         rm = scene.renderman
         if not rm.is_rman_interactive_running:
+            if rm.external_animation and rm.rib_export_workers > 1 and bpy.data.filepath:
+                self.external_rib_render_workers(context)
+                return
             scene.renderman.enable_external_rendering = True        
             try:
                 bpy.ops.render.render(layer=context.view_layer.name)
@@ -85,6 +85,7 @@ class PRMAN_OT_Attach_Stylized_Pattern(bpy.types.Operator):
         pattern_node.inputs['inputTextureCoords'].ui_open = False
 
     def attach_pattern(self, context, ob):
+        rman_bl_nodes.ensure_node_types_registered()
         mat = object_utils.get_active_material(ob)
         if not mat:
             bpy.ops.object.rman_add_bxdf('EXEC_DEFAULT', bxdf_name='PxrSurface')
@@ -1051,6 +1051,10 @@ def setParams(Asset, node, paramsList):
             setattr(node, enable, True)
 
 def createNodes(Asset):
+    from .. import rman_bl_nodes
+
+    # make sure every node type the preset could use is registered
+    rman_bl_nodes.ensure_node_types_registered()
 
     nodeDict = {}
     nt = None
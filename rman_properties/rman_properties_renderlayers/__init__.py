@@ -7,6 +7,7 @@ from bpy.props import PointerProperty, StringProperty, BoolProperty, \
 from ... import rman_bl_nodes
 from ... import rman_config
 from ...rfb_utils import scene_utils
+from ...rfb_utils.property_callbacks import update_dspy_dict_func
 from ... import rfb_icons
 from ...rman_config import RmanBasePropertyGroup
 
@@ -16,13 +17,15 @@ class RendermanDspyChannel(RmanBasePropertyGroup, bpy.types.PropertyGroup):
 
     def update_name(self, context):
         self.channel_name = self.name
+        update_dspy_dict_func(self, context)
 
     name: StringProperty(name='Channel Name', update=update_name)
     channel_name: StringProperty()
 
     channel_source: StringProperty(name="Channel Source",
             description="Source definition for the channel",
-            default="lpe:C[<.D><.S>][DS]*[<L.>O]"
+            default="lpe:C[<.D><.S>][DS]*[<L.>O]",
+            update=update_dspy_dict_func
             )
 
     channel_type: EnumProperty(name="Channel Type",
@@ -34,14 +37,16 @@ class RendermanDspyChannel(RmanBasePropertyGroup, bpy.types.PropertyGroup):
                 ("normal", "normal", ""),
                 ("point", "point", ""),
                 ("integer", "integer", "")],
-            default="color"
+            default="color",
+            update=update_dspy_dict_func
             )            
 
-    is_custom: BoolProperty(name="Custom", default=False)
+    is_custom: BoolProperty(name="Custom", default=False, update=update_dspy_dict_func)
 
     custom_lpe_string: StringProperty(
         name="lpe String",
-        description="This is where you enter the custom lpe string")
+        description="This is where you enter the custom lpe string",
+        update=update_dspy_dict_func)
 
     def object_groups(self, context):
         items = []
@@ -53,15 +58,15 @@ class RendermanDspyChannel(RmanBasePropertyGroup, bpy.types.PropertyGroup):
             items.append((ogrp.name, ogrp.name, ""))
         return items        
 
-    object_group: EnumProperty(name='Object Group', items=object_groups)       
-    light_group: StringProperty(name='Light Group', default='')
+    object_group: EnumProperty(name='Object Group', items=object_groups, update=update_dspy_dict_func)       
+    light_group: StringProperty(name='Light Group', default='', update=update_dspy_dict_func)
 
 class RendermanDspyChannelPointer(bpy.types.PropertyGroup):
     dspy_chan_idx: IntProperty(default=-1, name="Display Channel Index")
 
 class RendermanAOV(RmanBasePropertyGroup, bpy.types.PropertyGroup):
 
-    name: StringProperty(name='Display Name')
+    name: StringProperty(name='Display Name', update=update_dspy_dict_func)
     rman_config_name: StringProperty(name='rman_config_name',
                                     default='rman_properties_aov') 
 
@@ -84,7 +89,8 @@ class RendermanAOV(RmanBasePropertyGroup, bpy.types.PropertyGroup):
     displaydriver: EnumProperty(
         name="Display Driver",
         description="Display driver for rendering",
-        items=displaydriver_items)
+        items=displaydriver_items,
+        update=update_dspy_dict_func)
 
     dspy_channels_index: IntProperty(min=-1, default=-1)   
     dspy_channels: CollectionProperty(type=RendermanDspyChannelPointer, name="Display Channels") 
@@ -25,7 +25,9 @@ from .rfb_utils.envconfig_utils import envconfig
 from .rfb_utils import string_utils
 from .rfb_utils import display_utils
 from .rfb_utils import scene_utils
+from .rfb_utils import archive_utils
 from .rfb_utils.prefs_utils import get_pref
+from .rfb_utils.motion_sample_cache import MotionSampleCache
 
 # config
 from .rman_config import __RFB_CONFIG_DICT__ as rfb_config
@@ -59,20 +61,108 @@ def __update_areas__():
             area.tag_redraw()
 
 def __draw_callback__():
-    # callback function for the display driver to call tag_redraw
+    # callback function for the display driver to ask for a redraw.
+    # The draw thread does the actual tag_redraw.
     global __RMAN_RENDER__
     if __RMAN_RENDER__.rman_is_viewport_rendering and __RMAN_RENDER__.bl_engine:
-        try:
-            __RMAN_RENDER__.bl_engine.tag_redraw()
-            pass
-        except ReferenceError as e:
-            return  False
+        __RMAN_RENDER__.redraw_scheduler.request()
         return True
     return False     
 
 DRAWCALLBACK_FUNC = ctypes.CFUNCTYPE(ctypes.c_bool)
 __CALLBACK_FUNC__ = DRAWCALLBACK_FUNC(__draw_callback__)    
 
+class RmanRedrawScheduler(object):
+    '''
+    The RmanRedrawScheduler class coalesces redraw requests coming from the
+    display driver, so that the draw thread redraws the viewport at most
+    a fixed number of times per second, no matter how many buckets arrive.
+
+    Attributes:
+        num_requests (int) - number of redraw requests since the last reset
+        num_redraws (int) - number of redraws since the last reset
+        latency (float) - average time, in seconds, between the first request
+                          of a burst and its redraw
+    '''
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = False
+        self._requested_at = 0.0
+        self._redraw_times = list()
+        self.reset()
+
+    def reset(self):
+        with self._cond:
+            self._pending = False
+            self._redraw_times.clear()
+            self.num_requests = 0
+            self.num_redraws = 0
+            self._total_latency = 0.0
+
+    def request(self):
+        # Called from the renderer's threads
+        with self._cond:
+            self.num_requests += 1
+            if not self._pending:
+                self._pending = True
+                self._requested_at = time.time()
+            self._cond.notify()
+
+    def wake(self):
+        # Wake up the draw thread without asking for a redraw
+        with self._cond:
+            self._cond.notify_all()
+
+    def pause(self, timeout, is_running):
+        '''Wait between redraws. Requests that come in meanwhile are kept
+        for the next call to wait.
+
+        Args:
+            timeout (float) - number of seconds to wait
+            is_running (function) - stop waiting as soon as this returns False,
+                                    checked whenever wake is called
+        '''
+        with self._cond:
+            self._cond.wait_for(lambda: not is_running(), timeout)
+
+    def wait(self, timeout):
+        '''Wait for a redraw request.
+
+        Args:
+            timeout (float) - maximum number of seconds to wait
+
+        Returns:
+            (float) - the time of the first request since the last call,
+                      or None if there were no requests
+        '''
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            if not self._pending:
+                return None
+            self._pending = False
+            return self._requested_at
+
+    def record_redraw(self, requested_at):
+        now = time.time()
+        self.num_redraws += 1
+        self._total_latency += now - requested_at
+        self._redraw_times.append(now)
+        while self._redraw_times and self._redraw_times[0] < now - 1.0:
+            self._redraw_times.pop(0)
+
+    @property
+    def latency(self):
+        if not self.num_redraws:
+            return 0.0
+        return self._total_latency / self.num_redraws
+
+    @property
+    def fps(self):
+        # redraws during the last second
+        return len(self._redraw_times)
+
 class ItHandler(chatserver.ItBaseHandler):
 
     def dspyRender(self):
@@ -155,27 +245,41 @@ def start_cmd_server():
 
 def draw_threading_func(db):
     refresh_rate = get_pref('rman_viewport_refresh_rate', default=0.01)
+    max_fps = get_pref('rman_viewport_max_fps', default=30)
+    # redraw rate once the render has converged
+    idle_fps = min(max_fps, 2)
+    scheduler = db.redraw_scheduler
     while db.rman_is_live_rendering:
         if not scene_utils.any_areas_shading():
             # if there are no 3d viewports, stop IPR
             db.del_bl_engine()
             break
-        if db.rman_is_xpu:
-            if db.has_buffer_updated():
-                try:
-                    db.bl_engine.tag_redraw()
-                    db.reset_buffer_updated()
-                
-                except ReferenceError as e:
-                    # calling tag_redraw has failed. This might mean
-                    # that there are no more view_3d areas that are shading. Try to
-                    # stop IPR.
-                    #rfb_log().debug("Error calling tag_redraw (%s). Aborting..." % str(e))
-                    db.del_bl_engine()
-                    return            
-            time.sleep(refresh_rate)
-        else:            
-            time.sleep(1.0)
+
+        # XPU drivers that don't signal us still need to be polled
+        timeout = refresh_rate if db.rman_is_xpu else 1.0
+        requested_at = scheduler.wait(timeout)
+        if db.rman_is_xpu and db.has_buffer_updated():
+            db.reset_buffer_updated()
+            if requested_at is None:
+                requested_at = time.time()
+        if requested_at is None or not db.rman_is_live_rendering:
+            continue
+
+        try:
+            db.bl_engine.tag_redraw()
+        except (ReferenceError, AttributeError) as e:
+            # calling tag_redraw has failed. This might mean
+            # that there are no more view_3d areas that are shading. Try to
+            # stop IPR.
+            #rfb_log().debug("Error calling tag_redraw (%s). Aborting..." % str(e))
+            db.del_bl_engine()
+            return
+        scheduler.record_redraw(requested_at)
+
+        # any requests that come in before the next redraw
+        # is due get folded into it
+        fps = max_fps if db.rman_is_refining else idle_fps
+        scheduler.pause(1.0 / fps, lambda: db.rman_is_live_rendering)
 
 def call_stats_export_payloads(db):
     while db.rman_is_exporting:
@@ -193,7 +297,11 @@ def call_stats_update_payloads(db):
                 db.rman_is_live_rendering = False
                 break        
         db.stats_mgr.update_payloads()
-        time.sleep(0.1)
+        if db.rman_interactive_running and not db.rman_is_refining:
+            # nothing much to report while IPR is idle
+            time.sleep(0.5)
+        else:
+            time.sleep(0.1)
 
 def progress_cb(e, d, db):
     if not db.stats_mgr.is_connected():
@@ -227,6 +335,38 @@ def live_render_cb(e, d, db):
     else:
         db.rman_is_refining = True
 
+def _pad_buffer_channels_(buffer):
+    # Expand a (pixels, channels) buffer to 4 channels. Single channel
+    # images are copied into RGB, any missing channels are set to 1.0
+    num_channels = buffer.shape[1]
+    if num_channels == 4:
+        return buffer
+    pixels = numpy.ones((buffer.shape[0], 4), dtype=numpy.float32)
+    if num_channels == 1:
+        pixels[:, 0:3] = buffer
+    else:
+        pixels[:, 0:num_channels] = buffer
+    return pixels
+
+def _crop_buffer_to_border_(buffer, render):
+    # Crop a (height, width, channels) buffer to the render border
+    height, width = buffer.shape[0:2]
+    start_x = 0
+    end_x = width
+    start_y = 0
+    end_y = height
+
+    if render.border_min_y > 0.0:
+        start_y = int(height * (render.border_min_y))-1
+    if render.border_max_y > 0.0:                        
+        end_y = int(height * (render.border_max_y))-1 
+    if render.border_min_x > 0.0:
+        start_x = int(width * render.border_min_x)-1
+    if render.border_max_x < 1.0:
+        end_x =  int(width * render.border_max_x)-2
+
+    return buffer[start_y:end_y, start_x:end_x]
+
 def preload_xpu():
     """On linux there is a problem with std::call_once and
     blender, by default, being linked with a static libstdc++.
@@ -279,6 +419,8 @@ class RmanRender(object):
         self.rman_render_into = 'blender'
         self.rman_license_failed = False
         self.rman_license_failed_message = ''
+        self.rman_export_failed = False
+        self.rib_write_error = None
         self.it_port = -1 
         self.rman_callbacks = dict()
         self.viewport_res_x = -1
@@ -286,6 +428,7 @@ class RmanRender(object):
         self.viewport_buckets = list()
         self._draw_viewport_buckets = False
         self.stats_mgr = RfBStatsManager(self)
+        self.redraw_scheduler = RmanRedrawScheduler()
         self.deleting_bl_engine = threading.Lock()
         self.stop_render_mtx = threading.Lock()
 
@@ -597,19 +740,19 @@ class RmanRender(object):
                 # for some reason, XPU doesn't seem to reset the progress between renders
                 time.sleep(1.0)
             self.start_stats_thread()
+            # cache of each display's pixels, if the driver
+            # can tell us which tiles have changed
+            buffers = dict() if self.has_dirty_tiles() else None
             while self.bl_engine and not self.bl_engine.test_break() and self.rman_is_live_rendering:
                 time.sleep(0.01)
-                for i, rp in bl_image_rps.items():
-                    buffer = self._get_buffer(width, height, image_num=i, 
-                                                num_channels=rp.channels, 
-                                                as_flat=False, 
-                                                back_fill=False,
-                                                render=render)
-                    if buffer:
-                        rp.rect = buffer
+                updated = self._update_render_passes(bl_image_rps, width, height, render, buffers=buffers)
         
-                if self.bl_engine:
+                if self.bl_engine and updated:
                     self.bl_engine.update_result(result)        
+
+            # pick up anything written since the last poll
+            if self.bl_engine and self._update_render_passes(bl_image_rps, width, height, render, buffers=buffers):
+                self.bl_engine.update_result(result)
         
             if result:
                 if self.bl_engine:
@@ -620,12 +763,12 @@ class RmanRender(object):
                 for i, dspy_nm in enumerate(dspy_dict['displays'].keys()):
                     filepath = dspy_dict['displays'][dspy_nm]['filePath']
                     buffer = self._get_buffer(width, height, image_num=i, as_flat=True)
-                    if buffer:
+                    if buffer is not None:
                         bl_image = bpy.data.images.new(dspy_nm, width, height)
                         try:
                             bl_image.use_generated_float = True
                             bl_image.filepath_raw = filepath                            
-                            bl_image.pixels = buffer
+                            self._set_pixels(bl_image, buffer, attr='pixels')
                             bl_image.file_format = 'OPEN_EXR'
                             bl_image.update()
                             bl_image.save()
@@ -654,6 +797,8 @@ class RmanRender(object):
 
         self.rman_running = True
         self.rman_render_into = ''
+        self.rman_export_failed = False
+        self.rib_write_error = None
         rib_options = ""
         if rm.rib_compression == "gzip":
             rib_options += " -compression gzip"
@@ -667,6 +812,11 @@ class RmanRender(object):
         if rm.external_animation:
             original_frame = bl_scene.frame_current
             rfb_log().debug("Writing to RIB...")             
+            anim_time_start = time.time()
+            rib_writer = None
+            if rm.motion_blur and rm.motion_sample_cache:
+                self.rman_scene.motion_sample_cache = MotionSampleCache(rm.motion_sample_cache_size * 2**20)
+            archive_dirs = set()
             for frame in range(bl_scene.frame_start, bl_scene.frame_end + 1):
                 bl_view_layer = depsgraph.view_layer
                 config = rman.Types.RtParamList()
@@ -674,6 +824,7 @@ class RmanRender(object):
 
                 self.sg_scene = self.sgmngr.CreateScene(config, render_config, self.stats_mgr.rman_stats_session) 
                 try:
+                    time_start = time.time()
                     self.bl_engine.frame_set(frame, subframe=0.0)
                     self.rman_is_exporting = True
                     self.rman_scene.export_for_final_render(depsgraph, self.sg_scene, bl_view_layer, is_external=True)
@@ -681,15 +832,58 @@ class RmanRender(object):
                     rib_output = string_utils.expand_string(rm.path_rib_output, 
                                                             frame=frame, 
                                                             asFilePath=True)                                                                            
-                    self.sg_scene.Render("rib %s %s" % (rib_output, rib_options))
-                    self.sgmngr.DeleteScene(self.sg_scene)     
+                    export_time = time.time() - time_start
+
+                    # record the archives this frame needs before the next frame
+                    # is exported, since that can retire them
+                    archive_paths = list(self.rman_scene.rman_archive_files)
+                    if archive_paths:
+                        archive_utils.add_rib_references(rib_output, archive_paths, pending=True)
+                        archive_dirs.update(os.path.dirname(path) for path in archive_paths)
+
+                    # only one frame is ever being written while
+                    # the next one is exported
+                    if rib_writer:
+                        rib_writer.join()
+                        rib_writer = None
+                    if self.rib_write_error:
+                        raise RuntimeError(self.rib_write_error)
+                    if rm.rib_export_pipelined:
+                        rib_writer = threading.Thread(target=self._write_rib_, 
+                                                    args=(self.sg_scene, rib_output, rib_options, frame, export_time, archive_paths))
+                        rib_writer.start()
+                    else:
+                        self._write_rib_(self.sg_scene, rib_output, rib_options, frame, export_time, archive_paths)
+                        if self.rib_write_error:
+                            raise RuntimeError(self.rib_write_error)
                 except Exception as e:      
+                    if rib_writer:
+                        rib_writer.join()
+                    self.rman_scene.motion_sample_cache = None
                     self.bl_engine.report({'ERROR'}, 'Export failed: %s' % str(e))
                     rfb_log().error('Export Failed:\n%s' % traceback.format_exc())
                     self.stop_render(stop_draw_thread=False)
                     self.del_bl_engine()
+                    self.rman_export_failed = True
                     return False                       
 
+            if rib_writer:
+                rib_writer.join()
+            if self.rib_write_error:
+                self.rman_scene.motion_sample_cache = None
+                self.bl_engine.report({'ERROR'}, 'Export failed: %s' % self.rib_write_error)
+                self.stop_render(stop_draw_thread=False)
+                self.del_bl_engine()
+                self.rman_export_failed = True
+                return False
+            for archive_dir in archive_dirs:
+                archive_utils.cleanup_archives(archive_dir)
+            rfb_log().info("Finished writing RIB for frames %d-%d. Total time: %s" % (bl_scene.frame_start, 
+                            bl_scene.frame_end, 
+                            string_utils._format_time_(time.time() - anim_time_start)))
+            if self.rman_scene.motion_sample_cache is not None:
+                rfb_log().info("Motion sample cache: %s" % self.rman_scene.motion_sample_cache.get_stats())
+                self.rman_scene.motion_sample_cache = None
             self.bl_engine.frame_set(original_frame, subframe=0.0)
             
 
@@ -721,6 +915,7 @@ class RmanRender(object):
                 rfb_log().error('Export Failed:\n%s' % traceback.format_exc())
                 self.stop_render(stop_draw_thread=False)
                 self.del_bl_engine()
+                self.rman_export_failed = True
                 return False                         
 
         if rm.queuing_system != 'none':
@@ -731,6 +926,104 @@ class RmanRender(object):
         self.del_bl_engine()
         return True          
 
+    def _write_rib_(self, sg_scene, rib_output, rib_options, frame, export_time, archive_paths=None):
+        # Write the RIB file for this frame, and delete the scene. This
+        # can be called from a separate thread when pipelining exports, so
+        # instead of raising, errors are stored in rib_write_error.
+        rib_time_start = time.time()
+        try:
+            sg_scene.Render("rib %s %s" % (rib_output, rib_options))
+        except Exception as e:
+            rfb_log().error('Writing RIB for frame %d failed:\n%s' % (frame, traceback.format_exc()))
+            self.rib_write_error = 'Writing RIB for frame %d failed: %s' % (frame, str(e))
+            return
+        finally:
+            self.sgmngr.DeleteScene(sg_scene)
+            if archive_paths:
+                # from now on, the archives are kept for as long as the RIB file exists
+                archive_utils.add_rib_references(rib_output, archive_paths)
+        rfb_log().info("Frame %d: export %s, RIB write %s (%s)" % (frame,
+                        string_utils._format_time_(export_time),
+                        string_utils._format_time_(time.time() - rib_time_start),
+                        rib_output))
+
+    def start_external_render_workers(self, depsgraph, bl_filename):
+        '''Export the RIB files for an animation by splitting the frame range
+        across several background Blender processes. Each batch of frames is
+        spooled as soon as the process writing it finishes, unless cross frame
+        denoising needs the whole range in a single job.
+
+        Args:
+            depsgraph (bpy.types.Depsgraph) - the current depsgraph
+            bl_filename (str) - path to a copy of the current .blend file for the workers to load
+        '''
+
+        bl_scene = depsgraph.scene_eval
+        rm = bl_scene.renderman
+        frame_start = bl_scene.frame_start
+        frame_end = bl_scene.frame_end
+        num_frames = frame_end - frame_start + 1
+        num_workers = max(1, min(rm.rib_export_workers, num_frames))
+        chunk_size = -(-num_frames // num_workers)
+
+        # the script raises if the export fails, so that the process
+        # exits with an error (see --python-exit-code)
+        worker_script = '\n'.join([
+            'import bpy',
+            'from %s import RmanRender' % __name__,
+            'rm = bpy.context.scene.renderman',
+            'rm.enable_external_rendering = True',
+            'rm.external_animation = True',
+            'rm.rib_export_workers = 1',
+            "rm.queuing_system = 'none'",
+            'bpy.ops.render.render(layer=%r)' % depsgraph.view_layer.name,
+            'if RmanRender.get_rman_render().rman_export_failed:',
+            "    raise RuntimeError('RIB export failed')"
+        ])
+
+        self.rman_running = True
+        time_start = time.time()
+        workers = dict()
+        for chunk_start in range(frame_start, frame_end + 1, chunk_size):
+            chunk_end = min(chunk_start + chunk_size - 1, frame_end)
+            args = [bpy.app.binary_path, '-b', bl_filename,
+                    '-S', bl_scene.name,
+                    '-s', str(chunk_start),
+                    '-e', str(chunk_end),
+                    '--python-exit-code', '1',
+                    '--python-expr', worker_script]
+            rfb_log().info("Exporting RIB for frames %d-%d in a background process" % (chunk_start, chunk_end))
+            workers[subprocess.Popen(args)] = (chunk_start, chunk_end)
+
+        spooler = None
+        spool_per_chunk = False
+        if rm.queuing_system != 'none':
+            spooler = rman_spool.RmanSpool(self, self.rman_scene, depsgraph)
+            spool_per_chunk = not spooler.has_crossframe_denoise()
+
+        failed = False
+        while workers:
+            for proc in list(workers.keys()):
+                if proc.poll() is None:
+                    continue
+                (chunk_start, chunk_end) = workers.pop(proc)
+                if proc.returncode != 0:
+                    rfb_log().error("Exporting RIB for frames %d-%d failed (%d)" % (chunk_start, chunk_end, proc.returncode))
+                    failed = True
+                    continue
+                rfb_log().info("Finished writing RIB for frames %d-%d. Time: %s" % (chunk_start, chunk_end,
+                                string_utils._format_time_(time.time() - time_start)))
+                if spool_per_chunk:
+                    spooler.batch_render(frame_begin=chunk_start, frame_end=chunk_end)
+            time.sleep(0.5)
+
+        rfb_log().info("Finished writing RIB for frames %d-%d. Total time: %s" % (frame_start, frame_end,
+                        string_utils._format_time_(time.time() - time_start)))
+        if spooler and not spool_per_chunk and not failed:
+            spooler.batch_render()
+        self.rman_running = False
+        return not failed
+
     def start_bake_render(self, depsgraph, for_background=False):
         self.reset()
         self.bl_scene = depsgraph.scene_eval
@@ -943,10 +1236,10 @@ class RmanRender(object):
             if render_into_org != '':
                 rm.render_ipr_into = render_into_org    
             
-            if not self.rman_is_xpu:
-                # for now, we only set the redraw callback for RIS
-                self.set_redraw_func()
-            # start a thread to periodically call engine.tag_redraw()                
+            # the display driver tells the draw thread when to redraw
+            self.redraw_scheduler.reset()
+            self.set_redraw_func()
+            # start a thread to call engine.tag_redraw()                
             __DRAW_THREAD__ = threading.Thread(target=draw_threading_func, args=(self, ))
             __DRAW_THREAD__.start()
 
@@ -1002,14 +1295,14 @@ class RmanRender(object):
             time.sleep(0.001)
             if layer:
                 buffer = self._get_buffer(width, height, image_num=0, as_flat=False)
-                if buffer:
-                    layer.rect = buffer
+                if buffer is not None:
+                    self._set_pixels(layer, buffer)
                     self.bl_engine.update_result(result)
         # try to get the buffer one last time before exiting
         if layer:
             buffer = self._get_buffer(width, height, image_num=0, as_flat=False)
-            if buffer:
-                layer.rect = buffer
+            if buffer is not None:
+                self._set_pixels(layer, buffer)
                 self.bl_engine.update_result(result)        
         self.stop_render()              
         self.bl_engine.end_result(result)  
@@ -1102,9 +1395,15 @@ class RmanRender(object):
 
         # wait for the drawing thread to finish
         # if we are told to.
+        self.redraw_scheduler.wake()
         if stop_draw_thread and __DRAW_THREAD__:
             __DRAW_THREAD__.join()
             __DRAW_THREAD__ = None
+        if is_main_thread and self.redraw_scheduler.num_redraws:
+            rfb_log().debug("Viewport redraws: %d requests, %d redraws, average latency: %.1fms" % 
+                            (self.redraw_scheduler.num_requests, 
+                            self.redraw_scheduler.num_redraws, 
+                            self.redraw_scheduler.latency * 1000.0))
 
         # stop retrieving stats
         if __RMAN_STATS_THREAD__:
@@ -1240,89 +1539,104 @@ class RmanRender(object):
         f.restype = ctypes.POINTER(ArrayType)
 
         try:
-            buffer = numpy.array(f(ctypes.c_size_t(image_num)).contents)
-            pixels = list()
-
-            # we need to flip the image
-            # also, Blender is expecting a 4 channel image
+            buffer = numpy.array(f(ctypes.c_size_t(image_num)).contents, dtype=numpy.float32)
+            buffer = buffer.reshape(-1, num_channels)
 
             if as_flat:
-                if num_channels == 4:
-                    return buffer.tolist()
-                else:
-                    for y in range(0, height):
-                        i = (width * y * num_channels)
-                        
-                        for x in range(0, width):
-                            j = i + (num_channels * x)
-                            if num_channels == 3:
-                                pixels.append(buffer[j])
-                                pixels.append(buffer[j+1])
-                                pixels.append(buffer[j+2])
-                                pixels.append(1.0)                        
-                            elif num_channels == 2:
-                                pixels.append(buffer[j])
-                                pixels.append(buffer[j+1])
-                                pixels.append(1.0)                        
-                                pixels.append(1.0)
-                            elif num_channels == 1:
-                                pixels.append(buffer[j])
-                                pixels.append(buffer[j])
-                                pixels.append(buffer[j])   
-                                pixels.append(1.0)  
-                    return pixels                             
-            else:
-                if render and render.use_border:
-                    start_x = 0
-                    end_x = width
-                    start_y = 0
-                    end_y = height
+                # Blender is expecting a 4 channel image
+                return _pad_buffer_channels_(buffer).ravel()
 
-                
-                    if render.border_min_y > 0.0:
-                        start_y = int(height * (render.border_min_y))-1
-                    if render.border_max_y > 0.0:                        
-                        end_y = int(height * (render.border_max_y))-1 
-                    if render.border_min_x > 0.0:
-                        start_x = int(width * render.border_min_x)-1
-                    if render.border_max_x < 1.0:
-                        end_x =  int(width * render.border_max_x)-2
-
-                    # return the buffer as a list of lists
-                    for y in range(start_y, end_y):
-                        i = (width * y * num_channels)
-
-                        for x in range(start_x, end_x):
-                            j = i + (num_channels * x)
-                            if not back_fill:
-                                pixels.append(buffer[j:j+num_channels])
-                                continue
-                            
-                            if num_channels == 4:
-                                pixels.append(buffer[j:j+4])
-                                continue
-
-                            pixel = [1.0] * num_channels
-                            pixel[0] = buffer[j]                             
-                            if num_channels == 3:
-                                pixel[1] = buffer[j+1]
-                                pixel[2] = buffer[j+2]
-                            elif num_channels == 2:
-                                pixel[1] = buffer[j+1]
-                            elif num_channels == 1:
-                                pixel[1] = buffer[j]
-                                pixel[2] = buffer[j]
-
-                            pixels.append(pixel)            
-
-                    return pixels
-                else:
-                    buffer = numpy.reshape(buffer, (-1, num_channels))
-                    return buffer.tolist()
+            if render and render.use_border:
+                buffer = _crop_buffer_to_border_(buffer.reshape(height, width, num_channels), render)
+                buffer = buffer.reshape(-1, num_channels)
+
+            # return the buffer as a (pixels, channels) array
+            return buffer
         except Exception as e:
             rfb_log().debug("Could not get buffer: %s" % str(e))
             return None                                     
 
+    def has_dirty_tiles(self):
+        # older versions of the display driver don't track dirty tiles
+        dspy_plugin = self.get_blender_dspy_plugin()
+        return hasattr(dspy_plugin, 'GetDirtyTiles')
+
+    def _copy_dirty_tiles(self, buffer, image_num=0):
+        '''Copy only the tiles of a display that have changed since the last
+        call into buffer.
+
+        Args:
+            buffer (numpy.ndarray) - (height, width, channels) array to update
+            image_num (int) - index of the display
+
+        Returns:
+            (bool) - True if any tiles were copied
+        '''
+
+        dspy_plugin = self.get_blender_dspy_plugin()
+        height, width, num_channels = buffer.shape
+        tile_size = dspy_plugin.GetDirtyTileSize()
+        tiles_x = -(-width // tile_size)
+        tiles_y = -(-height // tile_size)
+        num_tiles = tiles_x * tiles_y
+        tiles = (ctypes.c_ubyte * num_tiles)()
+        num_dirty = dspy_plugin.GetDirtyTiles(ctypes.c_size_t(image_num), tiles, ctypes.c_int(num_tiles))
+        if num_dirty < 1:
+            return False
+
+        ArrayType = ctypes.c_float * (width * height * num_channels)
+        f = dspy_plugin.GetFloatFramebuffer
+        f.restype = ctypes.POINTER(ArrayType)
+        try:
+            # a view of the driver's framebuffer, not a copy
+            framebuffer = numpy.ctypeslib.as_array(f(ctypes.c_size_t(image_num)).contents)
+            framebuffer = framebuffer.reshape(height, width, num_channels)
+        except Exception as e:
+            rfb_log().debug("Could not get buffer: %s" % str(e))
+            return False
+
+        dirty = numpy.frombuffer(tiles, dtype=numpy.uint8).reshape(tiles_y, tiles_x)
+        for ty, tx in zip(*numpy.nonzero(dirty)):
+            ys = slice(ty * tile_size, (ty + 1) * tile_size)
+            xs = slice(tx * tile_size, (tx + 1) * tile_size)
+            buffer[ys, xs] = framebuffer[ys, xs]
+        return True
+
+    def _update_render_passes(self, bl_image_rps, width, height, render, buffers=None):
+        # Copy the displays into their render passes. When buffers is given,
+        # only changed tiles are read from the driver, and passes that haven't
+        # changed are skipped. Returns True if any pass was updated.
+        updated = False
+        for i, rp in bl_image_rps.items():
+            if buffers is None:
+                buffer = self._get_buffer(width, height, image_num=i, 
+                                            num_channels=rp.channels, 
+                                            as_flat=False, 
+                                            back_fill=False,
+                                            render=render)
+                if buffer is None:
+                    continue
+            else:
+                buffer = buffers.get(i, None)
+                if buffer is None:
+                    buffer = numpy.zeros((height, width, rp.channels), dtype=numpy.float32)
+                    buffers[i] = buffer
+                if not self._copy_dirty_tiles(buffer, image_num=i):
+                    continue
+                if render.use_border:
+                    buffer = _crop_buffer_to_border_(buffer, render)
+            self._set_pixels(rp, buffer)
+            updated = True
+        return updated
+
+    def _set_pixels(self, owner, buffer, attr='rect'):
+        # Copy buffer into a float array property, like RenderPass.rect
+        # or Image.pixels, with foreach_set when it's available
+        try:
+            getattr(owner, attr).foreach_set(buffer.ravel())
+        except (AttributeError, TypeError, ValueError):
+            setattr(owner, attr, buffer.tolist())
+
     def save_viewport_snapshot(self, frame=1):
         if not self.rman_is_viewport_rendering:
             return
@@ -1332,14 +1646,14 @@ class RmanRender(object):
         height = int(self.viewport_res_y * res_mult)
 
         pixels = self._get_buffer(width, height)
-        if not pixels:
+        if pixels is None:
             rfb_log().error("Could not save snapshot.")
             return
 
         nm = 'rman_viewport_snapshot_<F4>_%d' % len(bpy.data.images)
         nm = string_utils.expand_string(nm, frame=frame)
         img = bpy.data.images.new(nm, width, height, float_buffer=True, alpha=True)                
-        img.pixels = pixels
+        self._set_pixels(img, pixels, attr='pixels')
         img.update()
        
     def update_scene(self, context, depsgraph):
@@ -2,8 +2,8 @@
 from .rman_translators.rman_camera_translator import RmanCameraTranslator
 from .rman_translators.rman_light_translator import RmanLightTranslator
 from .rman_translators.rman_lightfilter_translator import RmanLightFilterTranslator
-from .rman_translators.rman_mesh_translator import RmanMeshTranslator
-from .rman_translators.rman_material_translator import RmanMaterialTranslator
+from .rman_translators.rman_mesh_translator import RmanMeshTranslator, get_content_hash
+from .rman_translators.rman_material_translator import RmanMaterialTranslator, get_nodetree_hash
 from .rman_translators.rman_hair_translator import RmanHairTranslator
 from .rman_translators.rman_group_translator import RmanGroupTranslator
 from .rman_translators.rman_points_translator import RmanPointsTranslator
@@ -38,6 +38,8 @@ from .rfb_utils.prefs_utils import get_pref
 from .rfb_utils import shadergraph_utils
 from .rfb_utils import color_manager_blender
 from .rfb_utils import scenegraph_utils
+from .rfb_utils import profile_utils
+from .rfb_utils import archive_utils
 
 # config
 from .rman_config import __RFB_CONFIG_DICT__ as rfb_config
@@ -45,10 +47,15 @@ from . import rman_constants
 
 from .rfb_logger import rfb_log
 from .rman_sg_nodes.rman_sg_node import RmanSgNode
+from .rman_sg_nodes.rman_sg_collection import RmanSgCollection
 
 import bpy
+from mathutils import Matrix
 import os
 import sys
+import itertools
+import hashlib
+import numpy as np
 
 class RmanScene(object):
     '''
@@ -68,10 +75,29 @@ class RmanScene(object):
         rman_bake (bool) - user requested a bake render
         is_interactive (bool) - whether we are in interactive mode
         external_render (bool) - whether we are exporting for external (RIB) renders
+        is_archive (bool) - whether we are writing a geometry archive (see _write_archive)
+        use_static_archives (bool) - whether static meshes are written to archives named by their
+                                contents, when exporting an animation to RIB
         is_viewport_render (bool) - whether we are rendering into Blender's viewport
         scene_solo_light (bool) - user has solo'd a light (all other lights are muted)
         rman_materials (dict) - dictionary of scene's materials
         rman_objects (dict) - dictionary of all objects
+        rman_prototypes (dict) - dictionary of geometry shared between objects, keyed by
+                                the result of _get_shared_geometry_key
+        rman_collections (dict) - dictionary of the prototypes for instanced collections, keyed by
+                                collection (see export_collection_prototype)
+        collection_prototype_checks (dict) - whether a collection can be exported as a prototype,
+                                keyed by collection
+        rman_collection_archives (dict) - dictionary of the archives written for instanced collections,
+                                keyed by collection (see export_collection_archive)
+        rman_archive_files (set) - paths of the geometry archives this export references, so
+                                that they aren't deleted while the RIB file needs them
+                                (see archive_utils.add_rib_references)
+        rman_material_hashes (dict) - (hash, whether it has frame tokens) of the materials used by
+                                content archives, keyed by material
+                                (see _get_content_archive_path)
+        instance_index (dict) - the objects with instances that depend on a datablock (mesh, material or
+                                instancer), keyed by datablock. Only filled during IPR (see get_instance_users)
         rman_translators (dict) - dictionary of all RmanTranslator(s)
         rman_particles (dict) - dictionary of all particle systems used
         rman_cameras (dict) - dictionary of all cameras in the scene
@@ -80,6 +106,8 @@ class RmanScene(object):
         processed_obs (dict) - dictionary of objects already processed
         motion_steps (set) - the full set of motion steps for the scene, including 
                             overrides from individual objects
+        motion_sample_cache (MotionSampleCache) - cache of motion samples, kept between the frames
+                            of an animation render. None if we're not caching.
         main_camera (RmanSgCamera) - pointer to the main scene camera                            
         rman_root_sg_node (RixSGGroup) - the main root RixSceneGraph node
         render_default_light (bool) - whether to add a "headlight" light when there are no lights in the scene
@@ -109,6 +137,8 @@ class RmanScene(object):
         self.rman_bake = False
         self.is_interactive = False
         self.external_render = False
+        self.is_archive = False
+        self.use_static_archives = False
         self.is_viewport_render = False
         self.is_swatch_render = False
         self.scene_solo_light = False
@@ -117,6 +147,13 @@ class RmanScene(object):
 
         self.rman_materials = dict()
         self.rman_objects = dict()
+        self.rman_prototypes = dict()
+        self.rman_collections = dict()
+        self.collection_prototype_checks = dict()
+        self.rman_collection_archives = dict()
+        self.rman_archive_files = set()
+        self.rman_material_hashes = dict()
+        self.instance_index = dict()
         self.rman_translators = dict()
         self.rman_particles = dict()
         self.rman_cameras = dict()
@@ -125,6 +162,7 @@ class RmanScene(object):
         self.processed_obs = []
 
         self.motion_steps = set()
+        self.motion_sample_cache = None
         self.main_camera = None
         self.rman_root_sg_node = None
 
@@ -179,6 +217,13 @@ class RmanScene(object):
         # clear out dictionaries etc.
         self.rman_materials.clear()
         self.rman_objects.clear()
+        self.rman_prototypes.clear()
+        self.rman_collections.clear()
+        self.collection_prototype_checks.clear()
+        self.rman_collection_archives.clear()
+        self.rman_archive_files.clear()
+        self.rman_material_hashes.clear()
+        self.instance_index.clear()
         self.rman_particles.clear()
         self.rman_cameras.clear()        
         self.obj_hash.clear() 
@@ -194,6 +239,8 @@ class RmanScene(object):
         self.num_object_instances = 0
         self.num_objects_in_viewlayer = 0
         self.objects_in_viewlayer.clear()
+        display_utils.clear_dspy_dict_cache()
+        string_utils.clear_known_dirs()
 
         try:                
             if self.is_viewport_render:
@@ -216,6 +263,8 @@ class RmanScene(object):
         self.is_viewport_render = False
         self.bl_local_view = False
         self.do_motion_blur = self.bl_scene.renderman.motion_blur
+        rm = self.bl_scene.renderman
+        self.use_static_archives = is_external and rm.external_animation and rm.rib_static_archives
         self.export()
 
     def export_for_bake_render(self, depsgraph, sg_scene, bl_view_layer, is_external=False):
@@ -293,6 +342,11 @@ class RmanScene(object):
         self.export_swatch_render_scene()
 
     def export(self):
+        with profile_utils.profile_frame(self.bl_scene.frame_current):
+            with profile_utils.scope('RmanScene.export', cat='scene'):
+                self._export()
+
+    def _export(self):
 
         self.reset()
 
@@ -311,19 +365,22 @@ class RmanScene(object):
 
         rfb_log().debug("Calling export_materials()")
         #self.export_materials(bpy.data.materials)
-        self.export_materials([m for m in self.depsgraph.ids if isinstance(m, bpy.types.Material)])  
+        with profile_utils.scope('export_materials'):
+            self.export_materials([m for m in self.depsgraph.ids if isinstance(m, bpy.types.Material)])  
                 
         # tell the texture manager to start converting any unconverted textures
         # normally textures are converted as they are added to the scene                
         rfb_log().debug("Calling txmake_all()")
         texture_utils.get_txmanager().rman_scene = self  
-        texture_utils.get_txmanager().txmake_all(blocking=True)
+        with profile_utils.scope('txmake_all', cat='textures'):
+            texture_utils.get_txmanager().txmake_all(blocking=True)
 
         self.scene_any_lights = self._scene_has_lights()
         
         rfb_log().debug("Calling export_data_blocks()")
         #self.export_data_blocks(bpy.data.objects)
-        self.export_data_blocks([x for x in self.depsgraph.ids if isinstance(x, bpy.types.Object)])
+        with profile_utils.scope('export_data_blocks'):
+            self.export_data_blocks([x for x in self.depsgraph.ids if isinstance(x, bpy.types.Object)])
 
         self.export_searchpaths() 
         self.export_global_options()     
@@ -342,10 +399,12 @@ class RmanScene(object):
 
         if self.do_motion_blur:
             rfb_log().debug("Calling export_instances_motion()")
-            self.export_instances_motion()
+            with profile_utils.scope('export_instances_motion'):
+                self.export_instances_motion()
         else:
             rfb_log().debug("Calling export_instances()")
-            self.export_instances()
+            with profile_utils.scope('export_instances'):
+                self.export_instances()
 
         self.rman_render.stats_mgr.set_export_stats("Finished Export", 1.0)
         self.num_object_instances = len(self.depsgraph.object_instances)
@@ -571,6 +630,10 @@ class RmanScene(object):
         return self.sg_scene.Root()
 
     def export_materials(self, materials):
+        from . import rman_bl_nodes
+        # materials appended or linked after the file was loaded can use node
+        # types that haven't been registered yet (see RFB_LAZY_NODE_REGISTRATION)
+        rman_bl_nodes.ensure_scene_node_types_registered([mat.original for mat in materials])
         for mat in materials:   
             db_name = object_utils.get_db_name(mat)
             rman_sg_material = self.rman_translators['MATERIAL'].export(mat.original, db_name)
@@ -586,18 +649,59 @@ class RmanScene(object):
             rfb_log().debug("   Exported %d/%d data blocks... (%s)" % (i, total, obj.name))
             self.rman_render.stats_mgr.set_export_stats("Exporting data blocks",i/total)
 
-    def export_data_block(self, db_ob):
-
-        # FIXME? 
-        # We currently export a unique geometry/mesh per Object
-        # This means we're not actually sharing datablocks per Object, even if they are shared
-        # in Blender. We do this for a couple of reasons:
+    def _get_motion_segments(self, ob):
+        # return the number of transform and deformation motion segments
+        # for this object, or -1 if we're not doing motion blur
+        mb_segs = -1
+        mb_deform_segs = -1
+        if self.do_motion_blur:
+            mb_segs = self.bl_scene.renderman.motion_segments
+            mb_deform_segs = self.bl_scene.renderman.deform_motion_segments
+            if ob.renderman.motion_segments_override:
+                mb_segs = ob.renderman.motion_segments
+                mb_deform_segs = ob.renderman.deform_motion_segments
+        return (mb_segs, mb_deform_segs)
+
+    def _get_shared_geometry_key(self, ob, rman_type):
+        # Return a key that identifies geometry that can be shared between Objects,
+        # or None if this object needs its own unique geometry.
+        #
+        # Each object normally gets its own mesh because:
         # 
         # 1. Each object can have different modifiers applied. This includes applying a subdiv and/or bevel modifiers.
         # 2. Each object may want a different number of deformation motion samples
+        # 3. Object level primvars (ex: displacement bound) are set on the mesh itself
         #
-        # This is incredibly wasteful when these don't apply. We could try and detect this case and
-        # create a shareable geometry.
+        # When none of these apply, objects pointing to the same mesh datablock
+        # can all reference a single RmanSgMesh. We don't do this for IPR, where
+        # edits are tracked per object.
+
+        if self.is_interactive or self.is_swatch_render:
+            return None
+        if rman_type != 'MESH' or ob.type != 'MESH':
+            return None
+        rm = ob.renderman
+        if not getattr(rm, 'rman_share_geometry', True):
+            return None
+        if len(ob.modifiers) > 0 or len(ob.particle_systems) > 0:
+            return None
+        if object_utils._is_deforming_(ob):
+            return None
+        for mat_slot in ob.material_slots:
+            if mat_slot.link == 'OBJECT':
+                return None
+
+        is_transforming = self.do_motion_blur and object_utils.is_transforming(ob)
+        primvars = tuple(str(getattr(rm, prop_name)) for prop_name, meta in rm.prop_meta.items() if 'primvar' in meta)
+
+        return (ob.data.original, rm.primitive, ob.show_instancer_for_render, is_transforming, self._get_motion_segments(ob), primvars)
+
+    def _set_processed(self, ob, rman_sg_node):
+        # ob's geometry is now up to date, and so is every object sharing it
+        self.processed_obs.append(ob.original)
+        self.processed_obs.extend(rman_sg_node.shared_by)
+
+    def export_data_block(self, db_ob):
 
         obj = bpy.data.objects.get(db_ob.name, None)
         if not obj and self.is_swatch_render:
@@ -623,16 +727,36 @@ class RmanScene(object):
             if ob.original in self.rman_objects:
                 return
 
-            rman_sg_node = translator.export(ob, db_name)
-            if not rman_sg_node:
-                return
-            rman_sg_node.rman_type = rman_type
-            self.rman_objects[ob.original] = rman_sg_node       
+            use_archive = rman_type != 'EMPTY' and self._use_geometry_archive(ob, rman_type)
+            shared_key = None if use_archive else self._get_shared_geometry_key(ob, rman_type)
+            rman_sg_node = self.rman_prototypes.get(shared_key, None) if shared_key else None
+            if use_archive:
+                rman_sg_node = self.export_geometry_archive(ob, db_name)
+            if rman_sg_node and use_archive:
+                # the geometry was written to its own archive, which prman
+                # only loads when a ray hits its bounds
+                rman_sg_node.rman_type = rman_type
+                self.rman_objects[ob.original] = rman_sg_node
+                self.processed_obs.append(ob.original)
+            elif rman_sg_node:
+                # this object can reuse the geometry that was already exported
+                # for its mesh datablock
+                rman_sg_node.shared_by.append(ob.original)
+                self.rman_objects[ob.original] = rman_sg_node
+            else:
+                rman_sg_node = translator.export(ob, db_name)
+                if not rman_sg_node:
+                    return
+                rman_sg_node.rman_type = rman_type
+                self.rman_objects[ob.original] = rman_sg_node       
+                if shared_key:
+                    rman_sg_node.shared_by.append(ob.original)
+                    self.rman_prototypes[shared_key] = rman_sg_node
 
-            if self.is_interactive and not ob.show_instancer_for_viewport:
-                rman_sg_node.sg_node.SetHidden(1)  
-            elif not ob.show_instancer_for_render:
-                rman_sg_node.sg_node.SetHidden(1)      
+                if self.is_interactive and not ob.show_instancer_for_viewport:
+                    rman_sg_node.sg_node.SetHidden(1)  
+                elif not ob.show_instancer_for_render:
+                    rman_sg_node.sg_node.SetHidden(1)      
 
             if rman_type in ['MESH', 'POINTS']:
                 # Deal with any particles now. Particles are children to mesh nodes.
@@ -672,21 +796,13 @@ class RmanScene(object):
             # motion blur
             # we set motion steps for this object, even if it's not moving
             # it could be moving as part of a particle system
-            mb_segs = -1
-            mb_deform_segs = -1
+            (mb_segs, mb_deform_segs) = self._get_motion_segments(ob)
             if self.do_motion_blur:
-                mb_segs = self.bl_scene.renderman.motion_segments
-                mb_deform_segs = self.bl_scene.renderman.deform_motion_segments
-                if ob.renderman.motion_segments_override:
-                    mb_segs = ob.renderman.motion_segments
                 if mb_segs > 1:                    
                     subframes = scene_utils._get_subframes_(mb_segs, self.bl_scene)
                     rman_sg_node.motion_steps = subframes
                     self.motion_steps.update(subframes)
 
-                if ob.renderman.motion_segments_override:
-                    mb_deform_segs = ob.renderman.deform_motion_segments                    
-
                 if mb_deform_segs > 1:                       
                     subframes = scene_utils._get_subframes_(mb_deform_segs, self.bl_scene)
                     rman_sg_node.deform_motion_steps = subframes
@@ -701,6 +817,211 @@ class RmanScene(object):
                 if mb_deform_segs < 1:
                     rman_sg_node.is_deforming = False                
 
+    def _use_geometry_archive(self, ob, rman_type):
+        if self.is_interactive or self.is_swatch_render or self.rman_bake or self.is_archive:
+            return False
+        if not getattr(ob.renderman, 'rman_delayed_archive', False):
+            # when exporting an animation, static meshes are written once, and
+            # each frame's RIB only references them
+            return (self.use_static_archives and rman_type == 'MESH' and len(ob.particle_systems) == 0
+                    and self._is_static_geometry(ob))
+        if rman_type == 'EMPTY':
+            # collection instancers can write their collection to an archive,
+            # when the collection can be exported as a prototype
+            return ob.instance_type == 'COLLECTION' and ob.instance_collection is not None
+        if rman_type not in ['MESH', 'QUADRIC', 'POINTS', 'NURBS', 'CURVE']:
+            return False
+        if len(ob.particle_systems) > 0:
+            return False
+        # the archive only holds one deformation sample
+        return not (self.do_motion_blur and object_utils._is_deforming_(ob))
+
+    def _is_static_geometry(self, ob):
+        # Whether ob's geometry and materials are the same on every frame
+        if not archive_utils.is_static(ob):
+            return False
+        for slot in getattr(ob, 'material_slots', list()):
+            mat = slot.material
+            if not mat:
+                continue
+            # look for frame tokens in the node tree itself, rather than trusting
+            # the exported material's is_frame_sensitive
+            if self._get_material_hash_info(mat)[1]:
+                return False
+            if mat.animation_data or (mat.node_tree and mat.node_tree.animation_data):
+                return False
+        return True
+
+    def _get_material_hash_info(self, mat):
+        # Return a material's hash, and whether its node tree has frame tokens
+        mat = mat.original
+        info = self.rman_material_hashes.get(mat, None)
+        if info is None:
+            handle = string_utils.sanitize_node_name(object_utils.get_db_name(mat))
+            if mat.node_tree:
+                info = get_nodetree_hash(mat, handle, self.bl_frame_current)
+            else:
+                info = (repr((handle, tuple(mat.diffuse_color), mat.metallic, mat.roughness)), False)
+            self.rman_material_hashes[mat] = info
+        return info
+
+    def _get_material_hash(self, mat):
+        if not mat:
+            return None
+        return self._get_material_hash_info(mat)[0]
+
+    def _get_content_archive_path(self, ob):
+        # Return the path for a static mesh's archive, named by a hash of its contents.
+        # The same geometry gets the same file, across frames, renders and sessions.
+        mesh = ob.to_mesh()
+        if not mesh:
+            return None
+        try:
+            material_hashes = [self._get_material_hash(slot.material) for slot in getattr(ob, 'material_slots', list())]
+            content_hash = get_content_hash(ob, mesh, self.bl_scene.renderman, material_hashes)
+        finally:
+            ob.to_mesh_clear()
+        path = os.path.join(self.bl_scene.renderman.path_geometry_archives, '%s.rib' % content_hash)
+        return string_utils.expand_string(path, frame=self.bl_frame_current, asFilePath=True)
+
+    def _get_archive_path(self, name, is_static):
+        # static archives are reused across frames, so they don't get a frame number
+        name = name.replace('|', '_')
+        filename = '%s.rib' % name if is_static else '%s.<F4>.rib' % name
+        path = os.path.join(self.bl_scene.renderman.path_geometry_archives, filename)
+        return string_utils.expand_string(path, frame=self.bl_frame_current, asFilePath=True)
+
+    def _write_archive(self, path, obs, collection=None):
+        # Write obs to a RIB archive, using a separate RmanScene and scene graph. If collection 
+        # is given, write the collection's prototype (see export_collection_prototype), 
+        # otherwise obs should be a single object.
+        rman_render = self.rman_render
+        sg_scene = rman_render.sgmngr.CreateScene(self.rman.Types.RtParamList(), 
+                                                  self.rman.Types.RtParamList(), 
+                                                  rman_render.stats_mgr.rman_stats_session)
+        archive_scene = RmanScene(rman_render=rman_render)
+        archive_scene.sg_scene = sg_scene
+        archive_scene.context = self.context
+        archive_scene.depsgraph = self.depsgraph
+        archive_scene.bl_scene = self.bl_scene
+        archive_scene.bl_view_layer = self.bl_view_layer
+        archive_scene.rm_rl = self.rm_rl
+        archive_scene.bl_frame_current = self.bl_frame_current
+        archive_scene.external_render = self.external_render
+        archive_scene.is_archive = True
+        archive_scene.reset()
+        # write to a temporary file first, so that other processes exporting the
+        # same archive never read a partially written one
+        root, ext = os.path.splitext(path)
+        tmp_path = '%s.%d%s' % (root, os.getpid(), ext)
+        try:
+            materials = dict()
+            for ob in obs:
+                for mat in object_utils._get_used_materials_(ob):
+                    if mat:
+                        materials[mat.original] = mat
+            archive_scene.export_materials(list(materials.values()))
+            archive_scene.export_data_blocks(obs)
+            if collection:
+                rman_sg_node = archive_scene.export_collection_prototype(collection)
+            else:
+                ob = obs[0]
+                rman_sg_node = archive_scene.rman_objects[ob.original]
+                translator = archive_scene.rman_translators[rman_sg_node.rman_type]
+                translator.update(ob, rman_sg_node)
+                translator.export_object_primvars(ob, rman_sg_node)
+            archive_scene.get_root_sg_node().AddChild(rman_sg_node.sg_node)
+            sg_scene.Render("rib %s -archive -format binary -compression gzip" % tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            rman_render.sgmngr.DeleteScene(sg_scene)
+            if os.path.exists(tmp_path):
+                # the archive wasn't written
+                os.remove(tmp_path)
+
+    def export_geometry_archive(self, ob, db_name):
+        # Write ob's geometry to an archive, and return a DelayedReadArchive procedural
+        # that loads it. Static objects reuse the archive from an earlier frame or render.
+        # Returns None if the archive couldn't be written.
+        is_static = self._is_static_geometry(ob)
+        archive = archive_utils.get_archive(db_name) if is_static else None
+        if archive is None:
+            path = None
+            if is_static and ob.type == 'MESH':
+                path = self._get_content_archive_path(ob)
+            is_content_archive = path is not None
+            if not is_content_archive:
+                path = self._get_archive_path(db_name, is_static)
+            bounds = archive_utils.get_bounds(ob, padding=getattr(ob.renderman, 'rman_displacementBound', 0.0))
+            if not (is_content_archive and os.path.exists(path)):
+                try:
+                    self._write_archive(path, [ob])
+                except Exception as e:
+                    rfb_log().error("Could not write archive for %s: %s" % (ob.name, str(e)))
+                    return None
+            if is_content_archive:
+                archive_utils.set_archive_file(db_name, path)
+            archive = (path, bounds)
+            if is_static:
+                archive_utils.add_archive(db_name, path, bounds, archive_utils.get_deps(ob))
+        self.rman_archive_files.add(archive[0])
+
+        translator = self.rman_translators['DELAYED_LOAD_ARCHIVE']
+        rman_sg_dra = translator.export(ob, db_name)
+        translator.update_archive(rman_sg_dra, archive[0], archive[1])
+        if self.do_motion_blur:
+            rman_sg_dra.is_transforming = object_utils.is_transforming(ob)
+        return rman_sg_dra
+
+    def _get_collection_archive_contents(self, collection, mtx, obs, bounds):
+        # Gather the objects in collection, including the ones in nested collection instances,
+        # and their bounds in the collection's space.
+        offset = Matrix.Translation(-collection.instance_offset)
+        for ob in self._get_collection_objects(collection):
+            ob = ob.evaluated_get(self.depsgraph)
+            if ob.type in ('ARMATURE', 'CAMERA'):
+                continue
+            obs.append(ob)
+            ob_mtx = mtx @ offset @ ob.matrix_world
+            if ob.is_instancer and ob.instance_type == 'COLLECTION':
+                self._get_collection_archive_contents(ob.instance_collection, ob_mtx, obs, bounds)
+            elif ob.type != 'EMPTY':
+                padding = getattr(ob.renderman, 'rman_displacementBound', 0.0)
+                bounds.append(archive_utils.get_bounds(ob, mtx=ob_mtx, padding=padding))
+
+    def export_collection_archive(self, collection):
+        # Write the prototype for an instanced collection to an archive, and return a
+        # DelayedReadArchive procedural that loads it. Returns None if the archive
+        # couldn't be written.
+        db_name = string_utils.sanitize_node_name('%s|ARCHIVE' % collection.name_full)
+        obs = list()
+        bounds = list()
+        self._get_collection_archive_contents(collection, Matrix.Identity(4), obs, bounds)
+        is_static = all(self._is_static_geometry(ob) and not object_utils.is_transforming(ob) for ob in obs)
+        archive = archive_utils.get_archive(db_name) if is_static else None
+        if archive is None:
+            path = self._get_archive_path(db_name, is_static)
+            try:
+                self._write_archive(path, obs, collection=collection)
+            except Exception as e:
+                rfb_log().error("Could not write archive for %s: %s" % (collection.name, str(e)))
+                return None
+            archive = (path, archive_utils.union_bounds(bounds))
+            if is_static:
+                deps = [collection.name_full]
+                for ob in obs:
+                    deps.extend(archive_utils.get_deps(ob))
+                    if ob.is_instancer and ob.instance_type == 'COLLECTION':
+                        deps.append(ob.instance_collection.name_full)
+                archive_utils.add_archive(db_name, path, archive[1], deps,
+                                          xform_deps=[ob.name_full for ob in obs])
+        self.rman_archive_files.add(archive[0])
+
+        translator = self.rman_translators['DELAYED_LOAD_ARCHIVE']
+        rman_sg_dra = translator.export(None, db_name)
+        translator.update_archive(rman_sg_dra, archive[0], archive[1])
+        return rman_sg_dra
+
     def export_defaultlight(self):
         # Export a headlight light if needed
         if not self.default_light:
@@ -740,7 +1061,14 @@ class RmanScene(object):
             if ob.renderman.export_as_coordsys:
                 self.get_root_sg_node().AddCoordinateSystem(rman_sg_node.sg_node)              
 
+    @profile_utils.profile_this(cat='instances')
     def _export_instance(self, ob_inst, seg=None):
+
+        if self._is_collection_prototype_instance(ob_inst):
+            # this object is part of an instanced collection, which is exported
+            # once as a prototype. Make sure the instancer references it.
+            self.export_collection_instance(ob_inst.parent)
+            return
    
         group_db_name = object_utils.get_group_db_name(ob_inst) 
         rman_group_translator = self.rman_translators['GROUP']
@@ -814,9 +1142,10 @@ class RmanScene(object):
                 if not ob.original in self.processed_obs:
                     translator.update(ob, rman_sg_node)
                     translator.export_object_primvars(ob, rman_sg_node)
-                    self.processed_obs.append(ob.original)
+                    self._set_processed(ob, rman_sg_node)
 
                 rman_sg_group = rman_group_translator.export(ob, group_db_name)
+                rman_sg_group.is_instance = ob_inst.is_instance
                 if ob.is_instancer and ob.instance_type != 'NONE':
                     rman_sg_group.is_instancer = ob.is_instancer
                 if rman_sg_node.sg_node is None:
@@ -844,6 +1173,7 @@ class RmanScene(object):
 
                 # add this instance to rman_sg_node
                 rman_sg_node.instances[group_db_name] = rman_sg_group                     
+                self._index_instance(ob, parent)
 
             # object attrs       
             translator.export_object_attributes(ob, rman_sg_group)                    
@@ -883,11 +1213,380 @@ class RmanScene(object):
             else:
                 rman_group_translator.update_transform(ob_inst, rman_sg_group)
 
+    def _index_instance(self, ob, parent=None):
+        # Remember the datablocks ob's instances depend on, so that during IPR
+        # an update to one of them only touches the objects using it
+        if not self.is_interactive:
+            return
+        datablocks = [ob.data]
+        for o in (ob, parent):
+            if o:
+                datablocks.extend([slot.material for slot in o.material_slots])
+        if parent:
+            datablocks.append(parent)
+        for datablock in datablocks:
+            if datablock:
+                self.instance_index.setdefault(datablock.original, set()).add(ob.original)
+
+    def get_instance_users(self, datablock):
+        # Return the objects, still in the scene, with instances that depend on datablock
+        users = self.instance_index.get(datablock.original, set())
+        return [ob for ob in users if ob in self.rman_objects]
+
+    def _get_shared_prototype_key(self, ob_inst):
+        # Return a key for the group of instances this instance can share its prototype's
+        # attributes and material with, or None if it needs to go through _export_instance.
+        # Instances are grouped by prototype, and by whatever decides their material
+        # (particle system settings and parent).
+
+        if self.is_interactive or self.is_swatch_render or self.do_motion_blur:
+            return None
+        if not ob_inst.is_instance:
+            return None
+        if self._is_collection_prototype_instance(ob_inst):
+            return None
+        ob = ob_inst.instance_object
+        if not getattr(ob.renderman, 'rman_share_instance_prototype', True):
+            return None
+        if ob.type in ('ARMATURE', 'CAMERA') or len(ob.particle_systems) > 0:
+            return None
+        if ob.is_instancer and ob.instance_type != 'NONE':
+            return None
+        rman_type = object_utils._detect_primitive_(ob)
+        if rman_type not in ['MESH', 'QUADRIC', 'POINTS', 'NURBS', 'CURVE', 'OPENVDB']:
+            return None
+        if ob.parent and object_utils._detect_primitive_(ob.parent) == 'EMPTY':
+            return None
+        rman_sg_node = self.rman_objects.get(ob.original, None)
+        if not rman_sg_node or rman_sg_node.sg_node is None:
+            return None
+
+        psys = ob_inst.particle_system
+        psys_settings = psys.settings.original if psys else None
+        return (ob.original, psys_settings, ob_inst.parent.original)
+
+    def _export_shared_prototype_instances(self, ob, parent, psys, matrices, persistent_ids):
+        # Export the instances of a prototype that share a material. The prototype's attributes
+        # and material go on one group, which is shared by all of the instances. Each instance
+        # still gets its own group, holding just its transform and id, with the shared group
+        # as its child: the scene graph has no instancer primitive that could hold them all.
+
+        rman_group_translator = self.rman_translators['GROUP']
+        rman_type = object_utils._detect_primitive_(ob)
+        translator = self.rman_translators[rman_type]
+        rman_sg_node = self.rman_objects[ob.original]
+
+        if psys:
+            parent_sg_node = self.rman_objects.get(parent.original, None)
+            if parent_sg_node:                
+                parent_sg_node.objects_instanced.add(ob.original)
+        elif parent.is_instancer and parent.original not in self.rman_objects:
+            parent_db_name = object_utils.get_db_name(parent)
+            self.rman_objects[parent.original] = rman_group_translator.export(parent, parent_db_name)
+
+        if not ob.original in self.processed_obs:
+            translator.update(ob, rman_sg_node)
+            translator.export_object_primvars(ob, rman_sg_node)
+            self._set_processed(ob, rman_sg_node)
+
+        if psys:
+            shared_db_name = "%s|%s|%s|SHARED" % (parent.name_full, ob.name_full, psys.name)
+        else:
+            shared_db_name = "%s|%s|SHARED" % (parent.name_full, ob.name_full)
+        shared_db_name = string_utils.sanitize_node_name(shared_db_name)
+        rman_sg_group = rman_group_translator.export(ob, shared_db_name)
+        rman_sg_group.is_instance = True
+        rman_sg_group.sg_node.AddChild(rman_sg_node.sg_node)
+        rman_sg_group.rman_sg_node_instance = rman_sg_node
+        rman_sg_node.instances[shared_db_name] = rman_sg_group
+
+        translator.export_object_attributes(ob, rman_sg_group)
+        if psys:
+            self.attach_particle_material(psys.settings, parent, ob, rman_sg_group)
+            rman_sg_group.bl_psys_settings = psys.settings.original
+        else:
+            self.attach_material(ob, rman_sg_group)
+
+        # convert all of the matrices at once, see transform_utils.convert_matrix
+        mtxs = np.asarray(matrices, dtype=np.float64).transpose(0, 2, 1).reshape(-1, 16)
+        ids = np.asarray(persistent_ids, dtype=np.int64)
+        ids[ids == 0] = int(hashlib.sha1(ob.name_full.encode()).hexdigest(), 16) % 10**8
+        name = ob.name_full
+        for persistent_id in np.unique(ids).tolist():
+            self.obj_hash[persistent_id] = name
+
+        root_sg_node = self.get_root_sg_node()
+        k_identifier_id = self.rman.Tokens.Rix.k_identifier_id
+        for i, (mtx, persistent_id) in enumerate(zip(mtxs.tolist(), ids.tolist())):
+            sg_node = self.sg_scene.CreateGroup('%s|%d' % (shared_db_name, i))
+            sg_node.SetTransform(mtx)
+            attrs = sg_node.GetAttributes()
+            attrs.SetInteger(k_identifier_id, persistent_id)
+            sg_node.SetAttributes(attrs)
+            sg_node.AddChild(rman_sg_group.sg_node)
+            root_sg_node.AddChild(sg_node)
+            rman_sg_group.instance_sg_nodes.append(sg_node)
+
+    def _is_collection_prototype_instance(self, ob_inst):
+        # Whether this instance is part of a collection instance, whose
+        # collection is exported as a prototype (see export_collection_prototype)
+        if not ob_inst.is_instance or ob_inst.particle_system:
+            return False
+        parent = ob_inst.parent
+        if parent.instance_type != 'COLLECTION' or not parent.instance_collection:
+            return False
+        return self._use_collection_prototype(parent.instance_collection)
+
+    def _use_collection_prototype(self, collection):
+        if self.do_motion_blur or self.is_swatch_render:
+            return False
+        use = self.collection_prototype_checks.get(collection.original, None)
+        if use is None:
+            use = self._can_use_collection_prototype(collection, list())
+            self.collection_prototype_checks[collection.original] = use
+        return use
+
+    def _can_use_collection_prototype(self, collection, stack):
+        # A collection can be exported as a prototype if it only holds geometry
+        # that doesn't need to know about the instance it's part of. Lights, particle systems, and 
+        # other instancers (apart from other collection instances) go through _export_instance.
+        # stack holds the collection instances we're currently checking, to guard against cycles.
+        if collection.original in stack:
+            return False
+        stack.append(collection.original)
+        use = True
+        for ob in self._get_collection_objects(collection):
+            ob = ob.evaluated_get(self.depsgraph)
+            if ob.type in ('ARMATURE', 'CAMERA'):
+                continue
+            if ob.is_instancer and ob.instance_type != 'NONE':
+                if ob.instance_type != 'COLLECTION' or not ob.instance_collection:
+                    use = False
+                elif not self._can_use_collection_prototype(ob.instance_collection, stack):
+                    use = False
+            elif len(ob.particle_systems) > 0:
+                use = False
+            elif object_utils._detect_primitive_(ob) not in ['EMPTY', 'MESH', 'QUADRIC', 'POINTS', 'NURBS', 'CURVE', 'OPENVDB']:
+                use = False
+            if not use:
+                break
+        stack.pop()
+        return use
+
+    def _get_collection_objects(self, collection, collections=None):
+        # Return the visible objects in collection and its child collections. If
+        # collections is given, every collection we walk is added to it.
+        objects = dict()
+
+        def is_hidden(x):
+            return x.hide_viewport if self.is_interactive else x.hide_render
+
+        def walk(coll):
+            if collections is not None:
+                collections.add(coll.original)
+            for ob in coll.objects:
+                if not is_hidden(ob):
+                    objects[ob.original] = ob
+            for child in coll.children:
+                if not is_hidden(child):
+                    walk(child)
+
+        walk(collection)
+        return list(objects.values())
+
+    def export_collection_prototype(self, collection):
+        # Export the objects in an instanced collection once, under one group. 
+        # Instances of the collection reference this group (see export_collection_instance).
+        # The group is not added to the root, only to the instances.
+        db_name = string_utils.sanitize_node_name('%s|PROTOTYPE' % collection.name_full)
+        sg_group = self.sg_scene.CreateGroup(db_name)
+        rman_sg_collection = RmanSgCollection(self, sg_group, db_name)
+        rman_sg_collection.bl_collection = collection.original
+        self.rman_collections[collection.original] = rman_sg_collection
+        self._export_collection_members(rman_sg_collection)
+        return rman_sg_collection
+
+    def _export_collection_members(self, rman_sg_collection):
+        collection = rman_sg_collection.bl_collection
+        rman_group_translator = self.rman_translators['GROUP']
+
+        # members are placed relative to the collection's instance offset,
+        # the instancer's transform is applied by the instance group
+        offset = Matrix.Translation(-collection.instance_offset)
+        for ob in self._get_collection_objects(collection, rman_sg_collection.collections):
+            ob = ob.evaluated_get(self.depsgraph)
+            if ob.type in ('ARMATURE', 'CAMERA'):
+                continue
+            member_db_name = string_utils.sanitize_node_name('%s|%s' % (collection.name_full, ob.name_full))
+            if ob.is_instancer and ob.instance_type == 'COLLECTION':
+                # nested collection instance. Reference the nested collection's prototype.
+                nested = ob.instance_collection
+                rman_sg_nested = self.rman_collections.get(nested.original, None)
+                if not rman_sg_nested:
+                    rman_sg_nested = self.export_collection_prototype(nested)
+                rman_sg_group = rman_group_translator.export(ob, member_db_name)
+                rman_sg_group.sg_node.AddChild(rman_sg_nested.sg_node)
+                rman_sg_group.rman_sg_node_instance = rman_sg_nested
+                rman_sg_collection.nested.add(nested.original)
+            else:
+                rman_type = object_utils._detect_primitive_(ob)
+                if rman_type == 'EMPTY':
+                    continue
+                rman_sg_node = self.rman_objects.get(ob.original, None)
+                if not rman_sg_node or rman_sg_node.sg_node is None:
+                    continue
+                translator = self.rman_translators[rman_type]
+                if not ob.original in self.processed_obs:
+                    translator.update(ob, rman_sg_node)
+                    translator.export_object_primvars(ob, rman_sg_node)
+                    self._set_processed(ob, rman_sg_node)
+
+                rman_sg_group = rman_group_translator.export(ob, member_db_name)
+                rman_sg_group.sg_node.AddChild(rman_sg_node.sg_node)
+                rman_sg_group.rman_sg_node_instance = rman_sg_node
+                translator.export_object_attributes(ob, rman_sg_group)
+                self.attach_material(ob, rman_sg_group)
+
+            rman_sg_group.is_instance = True
+            self._index_instance(ob)
+            rman_sg_group.sg_node.SetTransform(transform_utils.convert_matrix(offset @ ob.matrix_world))
+            rman_sg_collection.sg_node.AddChild(rman_sg_group.sg_node)
+            rman_sg_collection.members[ob.original] = rman_sg_group
+
+    def _get_collection_instance_prototype(self, ob):
+        # Return what a collection instancer's group should reference: the archive
+        # for the collection, if the instancer asks for one, otherwise the collection's prototype
+        collection = ob.instance_collection
+        if self._use_geometry_archive(ob, 'EMPTY'):
+            if collection.original not in self.rman_collection_archives:
+                # if the archive can't be written, this stays None, and
+                # we use the prototype instead
+                self.rman_collection_archives[collection.original] = self.export_collection_archive(collection)
+            rman_sg_archive = self.rman_collection_archives[collection.original]
+            if rman_sg_archive:
+                return rman_sg_archive
+        rman_sg_collection = self.rman_collections.get(collection.original, None)
+        if not rman_sg_collection:
+            rman_sg_collection = self.export_collection_prototype(collection)
+        return rman_sg_collection
+
+    def export_collection_instance(self, ob):
+        # Export the group for a collection instancer. The group holds the instancer's
+        # transform and id, and references the collection's prototype. Returns the group.
+        rman_group_translator = self.rman_translators['GROUP']
+        rman_sg_node = self.rman_objects.get(ob.original, None)
+        if not rman_sg_node:
+            rman_sg_node = rman_group_translator.export(ob, object_utils.get_db_name(ob))
+            self.rman_objects[ob.original] = rman_sg_node
+
+        instance_db_name = '%s|COLLECTION' % rman_sg_node.db_name
+        rman_sg_group = rman_sg_node.instances.get(instance_db_name, None)
+        if rman_sg_group and not self.is_interactive:
+            # every object in the collection instance gets here, only the first one
+            # needs to do any work
+            return rman_sg_group
+
+        rman_sg_collection = self._get_collection_instance_prototype(ob)
+        if rman_sg_group:
+            if rman_sg_group.rman_sg_node_instance is not rman_sg_collection:
+                # the instancer was switched to a different collection
+                rman_sg_group.sg_node.RemoveChild(rman_sg_group.rman_sg_node_instance.sg_node)
+                rman_sg_group.sg_node.AddChild(rman_sg_collection.sg_node)
+                rman_sg_group.rman_sg_node_instance = rman_sg_collection
+            return rman_sg_group
+
+        rman_sg_group = rman_group_translator.export(ob, instance_db_name)
+        rman_sg_group.is_instance = True
+        rman_sg_group.sg_node.AddChild(rman_sg_collection.sg_node)
+        rman_sg_group.rman_sg_node_instance = rman_sg_collection
+
+        persistent_id = int(hashlib.sha1(ob.name_full.encode()).hexdigest(), 16) % 10**8
+        self.obj_hash[persistent_id] = ob.name_full
+        attrs = rman_sg_group.sg_node.GetAttributes()
+        attrs.SetInteger(self.rman.Tokens.Rix.k_identifier_id, persistent_id)
+        rman_sg_group.sg_node.SetAttributes(attrs)
+        self.update_collection_instance(ob, rman_sg_group)
+
+        if ob.parent and object_utils._detect_primitive_(ob.parent) == 'EMPTY':
+            rman_empty_node = self.rman_objects.get(ob.parent.original)
+            rman_sg_group.sg_node.SetInheritTransform(False)
+            rman_empty_node.sg_node.AddChild(rman_sg_group.sg_node)
+        else:
+            self.get_root_sg_node().AddChild(rman_sg_group.sg_node)
+        rman_sg_node.instances[instance_db_name] = rman_sg_group
+        return rman_sg_group
+
+    def update_collection_instance(self, ob, rman_sg_group):
+        self.rman_translators['GROUP'].update_transform(ob, rman_sg_group)
+        # check local view
+        if self.is_interactive:
+            if not ob.visible_in_viewport_get(self.context.space_data):
+                rman_sg_group.sg_node.SetHidden(1)
+            else:
+                rman_sg_group.sg_node.SetHidden(-1)
+
+    def get_collection_prototypes(self, ob):
+        # Return the prototypes that ob is part of, or that it was just added to
+        users = set()
+        try:
+            ob = ob.original
+            users = {c.original for c in ob.users_collection}
+        except ReferenceError:
+            pass
+        return [rman_sg_collection for rman_sg_collection in self.rman_collections.values()
+                if ob in rman_sg_collection.members or not users.isdisjoint(rman_sg_collection.collections)]
+
+    def update_collection_prototype(self, collection):
+        # Re-export the objects in an instanced collection's prototype (IPR). 
+        # If the collection can't be exported as a prototype anymore, the prototype is 
+        # removed, and its objects have to be exported as individual instances again. 
+        # Returns the collections whose prototypes were removed.
+        rman_sg_collection = self.rman_collections.get(collection.original, None)
+        if not rman_sg_collection:
+            return []
+        self.collection_prototype_checks.pop(collection.original, None)
+        if not self._use_collection_prototype(collection):
+            return self.remove_collection_prototype(collection)
+
+        rman_sg_collection.sg_node.RemoveAllChildren()
+        for rman_sg_group in rman_sg_collection.members.values():
+            self.sg_scene.DeleteDagNode(rman_sg_group.sg_node)
+        rman_sg_collection.members.clear()
+        rman_sg_collection.collections.clear()
+        rman_sg_collection.nested.clear()
+        self._export_collection_members(rman_sg_collection)
+        return []
+
+    def remove_collection_prototype(self, collection):
+        # Delete an instanced collection's prototype, and the instance groups that 
+        # reference it. Prototypes that nest this one are removed as well. Returns
+        # the collections whose prototypes were removed.
+        rman_sg_collection = self.rman_collections.pop(collection.original, None)
+        if not rman_sg_collection:
+            return []
+        self.collection_prototype_checks[collection.original] = False
+        for rman_sg_node in self.rman_objects.values():
+            for k, rman_sg_group in list(rman_sg_node.instances.items()):
+                if rman_sg_group.rman_sg_node_instance is rman_sg_collection:
+                    self.sg_scene.DeleteDagNode(rman_sg_group.sg_node)
+                    del rman_sg_node.instances[k]
+
+        removed = [collection]
+        for other in list(self.rman_collections.values()):
+            if collection.original in other.nested:
+                removed.extend(self.remove_collection_prototype(other.bl_collection))
+        self.sg_scene.DeleteDagNode(rman_sg_collection.sg_node)
+        return removed
+
     def export_instances(self, obj_selected=None):
         total = len(self.depsgraph.object_instances)
         obj_selected_names = []
         if obj_selected:
             obj_selected_names = [o.name for o in obj_selected]
+
+        # instances that share their prototype's group, keyed by _get_shared_prototype_key.
+        # Each entry holds (ob, parent, psys, matrices, persistent ids)
+        shared = dict()
         for i, ob_inst in enumerate(self.depsgraph.object_instances):
             if obj_selected:
                 objFound = False
@@ -904,11 +1603,24 @@ class RmanScene(object):
             #if not self.is_interactive and not ob_inst.show_self:
             #    continue
 
-            self._export_instance(ob_inst)  
+            shared_key = self._get_shared_prototype_key(ob_inst)
+            if shared_key:
+                entry = shared.get(shared_key, None)
+                if not entry:
+                    entry = (ob_inst.instance_object, ob_inst.parent, ob_inst.particle_system, list(), list())
+                    shared[shared_key] = entry
+                entry[3].append(ob_inst.matrix_world.copy())
+                entry[4].append(ob_inst.persistent_id[0])
+            else:
+                self._export_instance(ob_inst)  
             self.rman_render.stats_mgr.set_export_stats("Exporting instances", i/total)
             
             rfb_log().debug("   Exported %d/%d instances..." % (i, total))
 
+        for ob, parent, psys, matrices, persistent_ids in shared.values():
+            self._export_shared_prototype_instances(ob, parent, psys, matrices, persistent_ids)
+            rfb_log().debug("   Exported %d instances of %s" % (len(matrices), ob.name))
+
     def attach_material(self, ob, rman_sg_node):
         mat = object_utils.get_active_material(ob)
         if mat:
@@ -940,128 +1652,302 @@ class RmanScene(object):
                     scenegraph_utils.set_material(group.sg_node, rman_sg_material.sg_node)
                     group.is_meshlight = rman_sg_material.has_meshlight 
 
-    def export_instances_motion(self, obj_selected=None):
-        origframe = self.bl_scene.frame_current
+    def _get_sample_index_map(self, motion_steps):
+        # map each motion step to its time sample index
+        idx_map = dict()
+        for i, s in enumerate(motion_steps):
+            idx_map.setdefault(s, i)
+        return idx_map
+
+    def _get_moving_instance(self, ob_inst):
+        # If this instance needs transform samples after the first motion sample,
+        # return (ob, psys, rman_sg_node, rman_sg_group, group_db_name, sample index map).
+        # Otherwise, return None
+        psys = None
+        if ob_inst.is_instance:
+            ob = ob_inst.instance_object.original  
+            psys = ob_inst.particle_system
+        else:
+            ob = ob_inst.object
 
-        mb_segs = self.bl_scene.renderman.motion_segments
-        origframe = self.bl_scene.frame_current      
+        if ob.name_full not in self.moving_objects and not psys:
+            return None
 
-        motion_steps = sorted(list(self.motion_steps))
+        if ob.type not in ['MESH']:
+            return None
 
-        first_sample = False
-        delta = -motion_steps[0]
-        for samp, seg in enumerate(motion_steps):
-            first_sample = (samp == 0)
-            if seg < 0.0:
-                self.rman_render.bl_engine.frame_set(origframe - 1, subframe=1.0 + seg)
+        rman_sg_node = self.rman_objects.get(ob.original, None)
+        if not rman_sg_node:
+            return None
+
+        if not rman_sg_node.is_transforming and not psys:
+            return None
+
+        group_db_name = object_utils.get_group_db_name(ob_inst)
+        rman_sg_group = rman_sg_node.instances.get(group_db_name, None)
+        if not rman_sg_group:
+            return None
+        idx_map = self._get_sample_index_map(rman_sg_node.motion_steps)
+        return (ob.original, psys, rman_sg_node, rman_sg_group, group_db_name, idx_map)
+
+    def _export_moving_instance_sample(self, ob_inst, moving_instance, seg, time_samp, cache=None, abs_time=0.0, cached=None):
+        (ob, psys, rman_sg_node, rman_sg_group, group_db_name, idx_map) = moving_instance
+        if not rman_sg_node.is_transforming and not psys:
+            # the translator gave up on motion blur for this object
+            return
+        if seg not in idx_map:
+            return
+        mtx = None
+        if cache is not None:
+            key = cache.get_key('xform', group_db_name, abs_time)
+            if cached is not None:
+                mtx = cached[key]
             else:
-                self.rman_render.bl_engine.frame_set(origframe, subframe=seg)  
+                mtx = transform_utils.convert_matrix(ob_inst.matrix_world.copy())
+                cache.put(key, mtx)
+        self.rman_translators['GROUP'].update_transform_sample(ob_inst, rman_sg_group, idx_map[seg], time_samp, mtx=mtx)
+
+    def _export_deforming_sample(self, deforming_ob, seg, cache=None, abs_time=0.0, cached=None):
+        (ob_original, rman_sg_node, translator, idx_map) = deforming_ob
+        # the translator can turn off deformation blur,
+        # if the number of points changes
+        if not rman_sg_node.is_deforming or seg not in idx_map:
+            return
+        if cache is None or rman_sg_node.rman_type != 'MESH':
+            ob = ob_original.evaluated_get(self.depsgraph)
+            translator.export_deform_sample(rman_sg_node, ob, idx_map[seg])
+            return
+        key = cache.get_key('P', rman_sg_node.db_name, abs_time)
+        if cached is not None:
+            translator.export_deform_sample(rman_sg_node, ob_original, idx_map[seg], P=cached[key])
+            return
+        ob = ob_original.evaluated_get(self.depsgraph)
+        P = translator.get_deform_points(ob)
+        cache.put(key, P)
+        translator.export_deform_sample(rman_sg_node, ob, idx_map[seg], P=P)
+
+    def _get_cached_motion_sample(self, cache, abs_time, seg, moving_instances, instanced_movers, psys_obs, deforming_obs, cam_sample_indices):
+        # Return a dict with all of the transforms and deformed points we need
+        # for this motion sample, or None if we need to evaluate the scene
+        if psys_obs:
+            # particles aren't cached
+            return None
+        keys = list()
+        for moving_instance in itertools.chain(moving_instances, instanced_movers.values()):
+            (ob, psys, rman_sg_node, rman_sg_group, group_db_name, idx_map) = moving_instance
+            if (rman_sg_node.is_transforming or psys) and seg in idx_map:
+                keys.append(cache.get_key('xform', group_db_name, abs_time))
+        if self.main_camera.is_transforming and seg in cam_sample_indices:
+            keys.append(cache.get_key('xform', self.main_camera.db_name, abs_time))
+        for ob_original, rman_sg_node, translator, idx_map in deforming_obs:
+            if not rman_sg_node.is_deforming or seg not in idx_map:
+                continue
+            if rman_sg_node.rman_type != 'MESH':
+                return None
+            keys.append(cache.get_key('P', rman_sg_node.db_name, abs_time))
+        return cache.get_all(keys)
+
+    def _index_moving_data(self):
+        # Find the particle systems and deforming geometry that need
+        # samples exported, so we don't have to look at every object
+        # for every motion sample
+        psys_obs = list()
+        deforming_obs = list()
+        for ob_original, rman_sg_node in self.rman_objects.items():
+            if ob_original in self.rman_particles:
+                idx_map = self._get_sample_index_map(rman_sg_node.motion_steps)
+                psys_obs.append((ob_original, idx_map))
+
+            if rman_sg_node.is_deforming and rman_sg_node.rman_type in ['MESH', 'FLUID']:
+                translator = self.rman_translators.get(rman_sg_node.rman_type, None)
+                if translator:
+                    idx_map = self._get_sample_index_map(rman_sg_node.deform_motion_steps)
+                    deforming_obs.append((ob_original, rman_sg_node, translator, idx_map))
+        return (psys_obs, deforming_obs)
+
+    def _export_first_motion_sample(self, obj_selected, seg, time_samp):
+        # Export all instances for the first motion sample, using _export_instance(). 
+        # Returns the instances that need transform samples for the remaining motion samples:
+        #
+        # moving_instances - non-instanced objects that are transforming. These
+        #                    are looked up directly, rather than through depsgraph.object_instances
+        # instanced_movers - moving instances (ex: particle instances), keyed by their position
+        #                    in depsgraph.object_instances
+        moving_instances = list()
+        instanced_movers = dict()
+        rman_group_translator = self.rman_translators['GROUP']
+        total = len(self.depsgraph.object_instances)
+        objFound = False
+        for i, ob_inst in enumerate(self.depsgraph.object_instances):  
+            if obj_selected:
+                if objFound:
+                    break
 
-            self.depsgraph.update()
-            time_samp = seg + delta # get the normlized version of the segment
-            total = len(self.depsgraph.object_instances)
-            objFound = False
-            
-            # update camera
-            if not first_sample and self.main_camera.is_transforming and seg in self.main_camera.motion_steps:
-                cam_translator =  self.rman_translators['CAMERA']
-                idx = 0
-                for i, s in enumerate(self.main_camera.motion_steps):
-                    if s == seg:
-                        idx = i
-                        break
-                cam_translator.update_transform(self.depsgraph.scene_eval.camera, self.main_camera, idx, time_samp)
-
-            for i, ob_inst in enumerate(self.depsgraph.object_instances):  
-                if obj_selected:
-                    if objFound:
-                        break
-
-                    if ob_inst.is_instance:
-                        if ob_inst.instance_object.name == obj_selected:
-                            objFound = True
-                    elif ob_inst.object.name == obj_selected.name:
-                            objFound = True
-
-                    if not objFound:
-                        continue       
-
-                if not ob_inst.show_self:
-                    continue                    
+                if ob_inst.is_instance:
+                    if ob_inst.instance_object.name == obj_selected:
+                        objFound = True
+                elif ob_inst.object.name == obj_selected.name:
+                        objFound = True
 
-                if first_sample:
-                    # for the first motion sample use _export_instance()
-                    self._export_instance(ob_inst, seg=time_samp)  
-                    self.rman_render.stats_mgr.set_export_stats("Exporting instances (%f)" % seg, i/total)
-                    continue  
+                if not objFound:
+                    continue       
 
-                rman_group_translator = self.rman_translators['GROUP']
-                psys = None
+            if not ob_inst.show_self:
+                continue                    
+
+            self._export_instance(ob_inst, seg=time_samp)  
+            moving_instance = self._get_moving_instance(ob_inst)
+            if moving_instance:
+                rman_group_translator.update_transform_num_samples(moving_instance[3], moving_instance[2].motion_steps)
                 if ob_inst.is_instance:
-                    ob = ob_inst.instance_object.original  
-                    psys = ob_inst.particle_system
+                    # instances can only be reached through depsgraph.object_instances,
+                    # so remember where this one was
+                    instanced_movers[i] = moving_instance
                 else:
-                    ob = ob_inst.object
+                    moving_instances.append(moving_instance)
+            self.rman_render.stats_mgr.set_export_stats("Exporting instances (%f)" % seg, i/total)
 
-                if ob.name_full not in self.moving_objects and not psys:
-                    continue
+        return (moving_instances, instanced_movers)
 
-                if ob.type not in ['MESH']:
-                    continue                
+    def export_instances_motion(self, obj_selected=None):
+        origframe = self.bl_scene.frame_current
 
-                group_db_name = object_utils.get_group_db_name(ob_inst)          
+        mb_segs = self.bl_scene.renderman.motion_segments
+        origframe = self.bl_scene.frame_current      
 
-                rman_sg_node = self.rman_objects.get(ob.original, None)
-                if not rman_sg_node:
-                    continue
-                
-                if not seg in rman_sg_node.motion_steps:
-                    continue
+        motion_steps = sorted(list(self.motion_steps))
 
-                idx = 0
-                for i, s in enumerate(rman_sg_node.motion_steps):
-                    if s == seg:
-                        idx = i
-                        break                
+        # Built during the first motion sample. For the remaining samples,
+        # we only visit the instances and geometry that are actually moving.
+        #
+        # psys_obs - objects with particle systems
+        # deforming_obs - objects with deforming geometry
+        moving_instances = list()
+        instanced_movers = dict()
+        num_instances = 0
+        psys_obs = list()
+        deforming_obs = list()
+        cam_sample_indices = self._get_sample_index_map(self.main_camera.motion_steps)
+        psys_translator = self.rman_translators['PARTICLES']
+        delta = -motion_steps[0]
 
-                if rman_sg_node.is_transforming or psys:
-                    rman_sg_group = rman_sg_node.instances.get(group_db_name, None)
-                    if rman_sg_group:
-                        rman_group_translator.update_transform_num_samples(rman_sg_group, rman_sg_node.motion_steps ) # should have been set in _export_instances()                       
-                        rman_group_translator.update_transform_sample( ob_inst, rman_sg_group, idx, time_samp)
+        # When rendering an animation with the motion sample cache, the first pass
+        # over the instances is done at the current frame, which the depsgraph has
+        # already been evaluated for, and every motion sample is exported like the
+        # later samples are. The current frame's sample goes first, so it doesn't need
+        # an evaluation, and the other samples only need one if the cache doesn't have
+        # everything they need (ex: the shutter close of the previous frame).
+        cache = self.motion_sample_cache
+        if obj_selected:
+            cache = None
+        eval_time = None
+        samples = list(enumerate(motion_steps))
+        if cache is not None:
+            eval_time = float(origframe)
+            (moving_instances, instanced_movers) = self._export_first_motion_sample(obj_selected, motion_steps[0], 0.0)
+            num_instances = len(self.depsgraph.object_instances)
+            (psys_obs, deforming_obs) = self._index_moving_data()
+            samples.sort(key=lambda sample: sample[1] != 0.0)
+            # make sure the camera's samples all get set,
+            # regardless of the order we export them in
+            self.main_camera.cam_matrix = None
 
-                self.rman_render.stats_mgr.set_export_stats("Exporting instances (%f)" % seg, i/total)
+        first_sample = False
+        for samp, seg in samples:
+            with profile_utils.scope('motion sample', cat='motion', sample=samp, time=seg):
+                first_sample = (samp == 0) and cache is None
+                abs_time = origframe + seg
+                cached = None
+                if cache is not None:
+                    if abs_time != eval_time:
+                        cached = self._get_cached_motion_sample(cache, abs_time, seg, moving_instances, instanced_movers,
+                                                                psys_obs, deforming_obs, cam_sample_indices)
+                    if abs_time == eval_time or cached is not None:
+                        cache.samples_reused += 1
+                    else:
+                        cache.samples_evaluated += 1
 
-            for ob_original,rman_sg_node in self.rman_objects.items():
-                ob = ob_original.evaluated_get(self.depsgraph)
-                psys_translator = self.rman_translators['PARTICLES']
-                particle_systems = getattr(ob, 'particle_systems', list())
-                for psys in particle_systems:
-                    ob_psys = self.rman_particles.get(ob.original, dict())
-                    rman_sg_particles = ob_psys.get(psys.settings.original, None)
-                    if rman_sg_particles:
-                        if not seg in rman_sg_particles.motion_steps:
-                            continue
-                        idx = 0
-                        for i, s in enumerate(rman_sg_node.motion_steps):
-                            if s == seg:
-                                idx = i
-                                break                           
-                        psys_translator.export_deform_sample(rman_sg_particles, ob, psys, idx)                                    
-
-                if rman_sg_node.is_deforming and seg in rman_sg_node.deform_motion_steps:
-                    rman_type = rman_sg_node.rman_type
-                    if rman_type in ['MESH', 'FLUID']:
-                        translator = self.rman_translators.get(rman_type, None)
-                        if translator:
-                            idx = 0
-                            for i, s in enumerate(rman_sg_node.deform_motion_steps):
-                                if s == seg:
-                                    idx = i
-                                    break                            
-                            translator.export_deform_sample(rman_sg_node, ob, idx)                     
-
-        self.rman_render.bl_engine.frame_set(origframe, subframe=0)  
+                if abs_time != eval_time and cached is None:
+                    if seg < 0.0:
+                        self.rman_render.bl_engine.frame_set(origframe - 1, subframe=1.0 + seg)
+                    else:
+                        self.rman_render.bl_engine.frame_set(origframe, subframe=seg)  
+
+                    self.depsgraph.update()
+                    if cache is not None:
+                        eval_time = abs_time
+                time_samp = seg + delta # get the normlized version of the segment
+                total = len(self.depsgraph.object_instances)
+            
+                # update camera
+                if not first_sample and self.main_camera.is_transforming and seg in cam_sample_indices:
+                    cam_translator =  self.rman_translators['CAMERA']
+                    idx = cam_sample_indices[seg]
+                    if cache is None:
+                        cam_translator.update_transform(self.depsgraph.scene_eval.camera, self.main_camera, idx, time_samp)
+                    else:
+                        key = cache.get_key('xform', self.main_camera.db_name, abs_time)
+                        if cached is not None:
+                            mtx = cached[key]
+                        else:
+                            mtx = cam_translator.get_render_cam_matrix(self.depsgraph.scene_eval.camera)
+                            cache.put(key, mtx)
+                        cam_translator.update_transform(None, self.main_camera, idx, time_samp, mtx=mtx)
+
+                if first_sample:
+                    num_instances = total
+                    # for the first motion sample use _export_instance()
+                    (moving_instances, instanced_movers) = self._export_first_motion_sample(obj_selected, seg, time_samp)
+                    (psys_obs, deforming_obs) = self._index_moving_data()
+
+                else:
+                    num_movers = len(moving_instances) + len(instanced_movers)
+                    for i, moving_instance in enumerate(moving_instances):
+                        ob = None
+                        if cached is None:
+                            ob = moving_instance[0].evaluated_get(self.depsgraph)
+                        self._export_moving_instance_sample(ob, moving_instance, seg, time_samp, cache=cache, abs_time=abs_time, cached=cached)
+                        self.rman_render.stats_mgr.set_export_stats("Exporting instances (%f)" % seg, i/num_movers)
+
+                    if instanced_movers and cached is not None:
+                        for moving_instance in instanced_movers.values():
+                            self._export_moving_instance_sample(None, moving_instance, seg, time_samp, cache=cache, abs_time=abs_time, cached=cached)
+
+                    elif instanced_movers:
+                        # if the instances changed order, we can't trust the positions
+                        # from the first sample, and have to check every instance
+                        check_all = (total != num_instances)
+                        if not check_all:
+                            for i, ob_inst in enumerate(self.depsgraph.object_instances):
+                                moving_instance = instanced_movers.get(i, None)
+                                if not moving_instance:
+                                    continue
+                                if object_utils.get_group_db_name(ob_inst) != moving_instance[4]:
+                                    check_all = True
+                                    break
+                                self._export_moving_instance_sample(ob_inst, moving_instance, seg, time_samp, cache=cache, abs_time=abs_time)
+
+                        if check_all:
+                            for ob_inst in self.depsgraph.object_instances:
+                                if not ob_inst.is_instance or not ob_inst.show_self:
+                                    continue
+                                moving_instance = self._get_moving_instance(ob_inst)
+                                if moving_instance:
+                                    self._export_moving_instance_sample(ob_inst, moving_instance, seg, time_samp, cache=cache, abs_time=abs_time)
+
+                for ob_original, idx_map in psys_obs:
+                    ob = ob_original.evaluated_get(self.depsgraph)
+                    ob_psys = self.rman_particles.get(ob_original, dict())
+                    for psys in ob.particle_systems:
+                        rman_sg_particles = ob_psys.get(psys.settings.original, None)
+                        if rman_sg_particles and seg in rman_sg_particles.motion_steps:
+                            psys_translator.export_deform_sample(rman_sg_particles, ob, psys, idx_map.get(seg, 0))
+
+                for deforming_ob in deforming_obs:
+                    self._export_deforming_sample(deforming_ob, seg, cache=cache, abs_time=abs_time, cached=cached)
+
+        if eval_time != float(origframe):
+            self.rman_render.bl_engine.frame_set(origframe, subframe=0)  
 
     def check_light_local_view(self, ob, rman_sg_node):
         if self.is_interactive and self.context.space_data:
@@ -4,6 +4,7 @@ from .rfb_utils import transform_utils
 from .rfb_utils import texture_utils
 from .rfb_utils import scene_utils
 from .rfb_utils import shadergraph_utils
+from .rfb_utils import display_utils
 
 from .rfb_logger import rfb_log
 from .rman_sg_nodes.rman_sg_lightfilter import RmanSgLightFilter
@@ -22,6 +23,16 @@ class RmanSceneSync(object):
         rman_scene (RmanScene) - pointer to the current RmanScene object
         sg_scene (RixSGSCene) - the RenderMan scene graph object
 
+    Each call to update_scene walks the depsgraph updates and records what
+    changed in the dirty sets below (update_materials, update_geometry,
+    new_objects, update_instances, update_particles, update_collections).
+    They're then flushed in one edit of the scene graph, and the translators
+    are only called for what's in them. An update to a mesh or material
+    is mapped to the objects using it with RmanScene.get_instance_users.
+    Objects that are not instanced by anything are re-emitted directly from
+    their instances dict; only the rest need a walk of the depsgraph's
+    object instances.
+
     '''
 
     def __init__(self, rman_render=None, rman_scene=None, sg_scene=None):
@@ -34,6 +45,9 @@ class RmanSceneSync(object):
         self.new_cameras = set() # set of new camera objects that were added to the scene
         self.update_instances = set() # set of objects we need to update their instances
         self.update_particles = set() # set of objects we need to update their particle systemd
+        self.update_collections = set() # set of instanced collections we need to rebuild the prototypes for
+        self.update_materials = dict() # materials we need to update, keyed by original material
+        self.update_geometry = dict() # objects we need to update the geometry for, keyed by original object
         self.do_delete = False # whether or not we need to do an object deletion
         self.do_add = False # whether or not we need to add an object
         self.num_instances_changed = False # if the number of instances has changed since the last update
@@ -64,6 +78,9 @@ class RmanSceneSync(object):
 
     def _scene_updated(self):
 
+        # any of the AOV/display settings could have changed
+        display_utils.clear_dspy_dict_cache()
+
         # Check changes to local view
         if self.rman_scene.bl_local_view and (self.rman_scene.context.space_data.local_view is None):
             self.rman_scene.bl_local_view = False
@@ -72,8 +89,7 @@ class RmanSceneSync(object):
                     continue
                 self.clear_instances(ob)
                 self.update_instances.add(ob.original)
-            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):         
-                self.rman_scene.check_solo_light()
+            self.rman_scene.check_solo_light()
         elif not self.rman_scene.bl_local_view and (self.rman_scene.context.space_data.local_view is not None):
             self.rman_scene.bl_local_view = True   
             for ob in self.rman_scene.bl_scene.objects:
@@ -81,8 +97,7 @@ class RmanSceneSync(object):
                     continue
                 self.clear_instances(ob)               
                 self.update_instances.add(ob.original)
-            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):                     
-                self.rman_scene.check_solo_light()  
+            self.rman_scene.check_solo_light()  
 
         # Check view_layer
         view_layer = self.rman_scene.depsgraph.view_layer
@@ -115,57 +130,39 @@ class RmanSceneSync(object):
             self.rman_scene.bl_frame_current = self.rman_scene.bl_scene.frame_current
             material_translator = self.rman_scene.rman_translators["MATERIAL"]
 
-            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):  
-                # update frame number
-                options = self.rman_scene.sg_scene.GetOptions()
-                options.SetInteger(self.rman.Tokens.Rix.k_Ri_Frame, self.rman_scene.bl_frame_current)
-                self.rman_scene.sg_scene.SetOptions(options)        
-
-                for mat in bpy.data.materials:   
-                    db_name = object_utils.get_db_name(mat)  
-                    rman_sg_material = self.rman_scene.rman_materials.get(mat.original, None)
-                    if rman_sg_material and rman_sg_material.is_frame_sensitive:
-                        material_translator.update(mat, rman_sg_material)
-
-                for o in bpy.data.objects:
-                    rman_type = object_utils._detect_primitive_(o)
-                    rman_sg_node = self.rman_scene.rman_objects.get(o.original, None)
-                    if not rman_sg_node:
-                        continue
-                    translator = self.rman_scene.rman_translators.get(rman_type, None)
-                    if translator and rman_sg_node.is_frame_sensitive:
-                        translator.update(o, rman_sg_node)                   
+            # update frame number
+            options = self.rman_scene.sg_scene.GetOptions()
+            options.SetInteger(self.rman.Tokens.Rix.k_Ri_Frame, self.rman_scene.bl_frame_current)
+            self.rman_scene.sg_scene.SetOptions(options)        
+
+            for mat in bpy.data.materials:   
+                db_name = object_utils.get_db_name(mat)  
+                rman_sg_material = self.rman_scene.rman_materials.get(mat.original, None)
+                if rman_sg_material and rman_sg_material.is_frame_sensitive:
+                    material_translator.update(mat, rman_sg_material)
+
+            for o in bpy.data.objects:
+                rman_type = object_utils._detect_primitive_(o)
+                rman_sg_node = self.rman_scene.rman_objects.get(o.original, None)
+                if not rman_sg_node:
+                    continue
+                translator = self.rman_scene.rman_translators.get(rman_type, None)
+                if translator and rman_sg_node.is_frame_sensitive:
+                    translator.update(o, rman_sg_node)                   
 
     def _mesh_light_update(self, mat):
-        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-            for ob_inst in self.rman_scene.depsgraph.object_instances:
-                psys = None
-                if ob_inst.is_instance:
-                    ob = ob_inst.instance_object
-                    group_db_name =  object_utils.get_group_db_name(ob_inst)
-                else:
-                    ob = ob_inst.object
-                    group_db_name =  object_utils.get_group_db_name(ob_inst)
-                if not hasattr(ob.data, 'materials'):
-                    continue   
-                if ob.type in ('ARMATURE', 'CURVE', 'CAMERA'):
-                    continue                         
-                rman_sg_node = self.rman_scene.rman_objects.get(ob.original, None)
-                if rman_sg_node:
-                    found = False
-                    for name, material in ob.data.materials.items():
-                        if name == mat.name:
-                            found = True
-
-                    if found:
-                        rman_sg_group = rman_sg_node.instances.get(group_db_name, None)
-                        if rman_sg_group:
-                            rman_sg_node.instances.pop(group_db_name)
-                            self.rman_scene.sg_scene.DeleteDagNode(rman_sg_group.sg_node)                              
-                            self.rman_scene._export_instance(ob_inst)                 
-
-    def _material_updated(self, obj):
-        mat = obj.id
+        # The material was turned into a mesh light, or back. Delete the instances
+        # of the objects using it, so that reemit_instances exports them again.
+        for ob in self.rman_scene.get_instance_users(mat):
+            rman_sg_node = self.rman_scene.rman_objects[ob]
+            for rman_sg_group in rman_sg_node.instances.values():
+                self.rman_scene.sg_scene.DeleteDagNode(rman_sg_group.sg_node)
+            rman_sg_node.instances.clear()
+            self.update_instances.add(ob)
+            for rman_sg_collection in self.rman_scene.get_collection_prototypes(ob):
+                self.update_collections.add(rman_sg_collection.bl_collection)
+
+    def _material_updated(self, mat):
         rman_sg_material = self.rman_scene.rman_materials.get(mat.original, None)
         translator = self.rman_scene.rman_translators["MATERIAL"]         
         db_name = object_utils.get_db_name(mat)
@@ -173,16 +170,17 @@ class RmanSceneSync(object):
             # Double check if we can't find the material because of an undo
             rman_sg_material = self.update_materials_dict(mat)
 
-        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):   
-            mat = obj.id              
-            if not rman_sg_material:
-                rfb_log().debug("New material: %s" % mat.name)
-                db_name = object_utils.get_db_name(mat)
-                rman_sg_material = translator.export(mat, db_name)
-                self.rman_scene.rman_materials[mat.original] = rman_sg_material            
-            else:
-                rfb_log().debug("Material, call update")
-                translator.update(mat, rman_sg_material)   
+        if not rman_sg_material:
+            rfb_log().debug("New material: %s" % mat.name)
+            db_name = object_utils.get_db_name(mat)
+            rman_sg_material = translator.export(mat, db_name)
+            self.rman_scene.rman_materials[mat.original] = rman_sg_material            
+        else:
+            rfb_log().debug("Material, call update")
+            has_meshlight = rman_sg_material.has_meshlight
+            translator.update(mat, rman_sg_material)
+            if has_meshlight != rman_sg_material.has_meshlight:
+                self._mesh_light_update(mat)   
 
         # update db_name
         rman_sg_material.db_name = db_name
@@ -192,77 +190,74 @@ class RmanSceneSync(object):
         rman_sg_lightfilter = self.rman_scene.rman_objects.get(ob.original, None)
         if rman_sg_lightfilter:
             rman_group_translator = self.rman_scene.rman_translators['GROUP']  
-            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):              
-                rman_group_translator.update_transform(ob, rman_sg_lightfilter)
+            rman_group_translator.update_transform(ob, rman_sg_lightfilter)
 
     def _gpencil_transform_updated(self, obj):
         ob = obj.id
         rman_sg_gpencil = self.rman_scene.rman_objects.get(ob.original, None)
         if rman_sg_gpencil:
-            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):       
-                rman_group_translator = self.rman_scene.rman_translators['GROUP']         
-                for ob_inst in self.rman_scene.depsgraph.object_instances: 
-                    group_db_name = object_utils.get_group_db_name(ob_inst)
-                    rman_sg_group = rman_sg_gpencil.instances.get(group_db_name, None)
-                    if rman_sg_group:
-                        rman_group_translator.update_transform(ob, rman_sg_group)                
-
-    def _obj_geometry_updated(self, obj):
-        ob = obj.id
+            rman_group_translator = self.rman_scene.rman_translators['GROUP']         
+            for ob_inst in self.rman_scene.depsgraph.object_instances: 
+                group_db_name = object_utils.get_group_db_name(ob_inst)
+                rman_sg_group = rman_sg_gpencil.instances.get(group_db_name, None)
+                if rman_sg_group:
+                    rman_group_translator.update_transform(ob, rman_sg_group)                
+
+    def _obj_geometry_updated(self, ob):
         rman_type = object_utils._detect_primitive_(ob)
         db_name = object_utils.get_db_name(ob, rman_type=rman_type) 
         rman_sg_node = self.rman_scene.rman_objects.get(ob.original, None)
 
         if rman_type in ['LIGHT', 'LIGHTFILTER', 'CAMERA']:
-            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                if rman_type == 'LIGHTFILTER':
-                    self.rman_scene.rman_translators['LIGHTFILTER'].update(ob, rman_sg_node)
-                    for light_ob in rman_sg_node.lights_list:
-                        if isinstance(light_ob, bpy.types.Material):
-                            rman_sg_material = self.rman_scene.rman_materials.get(light_ob.original, None)
-                            if rman_sg_material:
-                                self.rman_scene.rman_translators['MATERIAL'].update_light_filters(light_ob, rman_sg_material)                      
-                        else:
-                            rman_sg_light = self.rman_scene.rman_objects.get(light_ob.original, None)
-                            if rman_sg_light:
-                                self.rman_scene.rman_translators['LIGHT'].update_light_filters(light_ob, rman_sg_light)                      
+            if rman_type == 'LIGHTFILTER':
+                self.rman_scene.rman_translators['LIGHTFILTER'].update(ob, rman_sg_node)
+                for light_ob in rman_sg_node.lights_list:
+                    if isinstance(light_ob, bpy.types.Material):
+                        rman_sg_material = self.rman_scene.rman_materials.get(light_ob.original, None)
+                        if rman_sg_material:
+                            self.rman_scene.rman_translators['MATERIAL'].update_light_filters(light_ob, rman_sg_material)                      
+                    else:
+                        rman_sg_light = self.rman_scene.rman_objects.get(light_ob.original, None)
+                        if rman_sg_light:
+                            self.rman_scene.rman_translators['LIGHT'].update_light_filters(light_ob, rman_sg_light)                      
 
-                elif rman_type == 'LIGHT':
-                    self.rman_scene.rman_translators['LIGHT'].update(ob, rman_sg_node)
+            elif rman_type == 'LIGHT':
+                self.rman_scene.rman_translators['LIGHT'].update(ob, rman_sg_node)
                                                         
-                    if not self.rman_scene.scene_solo_light:
-                        # only set if a solo light hasn't been set
-                        if not self.rman_scene.check_light_local_view(ob, rman_sg_node):
-                            rman_sg_node.sg_node.SetHidden(ob.data.renderman.mute)
-                elif rman_type == 'CAMERA':
-                    ob = ob.original
-                    rman_camera_translator = self.rman_scene.rman_translators['CAMERA']
-                    if not self.rman_scene.is_viewport_render:
-                        rman_camera_translator.update(ob, rman_sg_node)  
-                    else:
-                        rman_camera_translator.update_viewport_cam(ob, rman_sg_node, force_update=True)       
+                if not self.rman_scene.scene_solo_light:
+                    # only set if a solo light hasn't been set
+                    if not self.rman_scene.check_light_local_view(ob, rman_sg_node):
+                        rman_sg_node.sg_node.SetHidden(ob.data.renderman.mute)
+            elif rman_type == 'CAMERA':
+                ob = ob.original
+                rman_camera_translator = self.rman_scene.rman_translators['CAMERA']
+                if not self.rman_scene.is_viewport_render:
+                    rman_camera_translator.update(ob, rman_sg_node)  
+                else:
+                    rman_camera_translator.update_viewport_cam(ob, rman_sg_node, force_update=True)       
 
         else:
             if rman_sg_node.rman_type != rman_type:
                 # for now, we don't allow the rman_type to be changed
                 rfb_log().error("Changing primitive type is currently not supported.")
                 return
-            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):     
-                translator = self.rman_scene.rman_translators.get(rman_type, None)
-                if not translator:
-                    return
-                translator.update(ob, rman_sg_node)
-                translator.export_object_primvars(ob, rman_sg_node)
-                # material slots could have changed, so we need to double
-                # check that too
-                for k,v in rman_sg_node.instances.items():
-                    self.rman_scene.attach_material(ob, v)
-
-                if rman_sg_node.sg_node:
-                    if not ob.show_instancer_for_viewport:
-                        rman_sg_node.sg_node.SetHidden(1)
-                    else:
-                        rman_sg_node.sg_node.SetHidden(-1)
+            translator = self.rman_scene.rman_translators.get(rman_type, None)
+            if not translator:
+                return
+            translator.update(ob, rman_sg_node)
+            translator.export_object_primvars(ob, rman_sg_node)
+            # material slots could have changed, so we need to double
+            # check that too
+            for k,v in rman_sg_node.instances.items():
+                self.rman_scene.attach_material(ob, v)
+            for rman_sg_collection in self.rman_scene.get_collection_prototypes(ob):
+                self.update_collections.add(rman_sg_collection.bl_collection)
+
+            if rman_sg_node.sg_node:
+                if not ob.show_instancer_for_viewport:
+                    rman_sg_node.sg_node.SetHidden(1)
+                else:
+                    rman_sg_node.sg_node.SetHidden(-1)
 
     def update_light_visibility(self, rman_sg_node, ob):
         if not self.rman_scene.scene_solo_light:
@@ -275,17 +270,16 @@ class RmanSceneSync(object):
             if vis == -1 and not ob.hide_get() and int(ob.renderman.mute) == 0:
                 update_instances = True
                 result = False
-            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                if self.rman_scene.check_light_local_view(ob, rman_sg_node):
-                    update_instances = True
-                    result = True
-                elif not ob.hide_get():
-                    rman_sg_node.sg_node.SetHidden(ob.renderman.mute)
-                    update_instances = True
-                    result = (vis != int(ob.renderman.mute))
-                else:
-                    rman_sg_node.sg_node.SetHidden(1)
-                    result = (vis != 1)
+            if self.rman_scene.check_light_local_view(ob, rman_sg_node):
+                update_instances = True
+                result = True
+            elif not ob.hide_get():
+                rman_sg_node.sg_node.SetHidden(ob.renderman.mute)
+                update_instances = True
+                result = (vis != int(ob.renderman.mute))
+            else:
+                rman_sg_node.sg_node.SetHidden(1)
+                result = (vis != 1)
 
             if update_instances and len(rman_sg_node.instances) < 1:
                 self.update_instances.add(ob.original)
@@ -327,16 +321,14 @@ class RmanSceneSync(object):
                 if psys.settings.type == 'FLIP' and rman_type == 'FLUID':
                     fluid_translator = self.rman_scene.rman_translators['FLUID']
                     rman_sg_node = self.rman_scene.rman_objects.get(ob.original, None)
-                    with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                        fluid_translator.update(ob, rman_sg_node)
+                    fluid_translator.update(ob, rman_sg_node)
                     return
 
                 ob_psys = self.rman_scene.rman_particles.get(obj.id.original, dict())
                 rman_sg_particles = ob_psys.get(psys.settings.original, None)
                 if rman_sg_particles:
-                    with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                        psys_translator = self.rman_scene.rman_translators['PARTICLES']
-                        psys_translator.update(obj.id, psys, rman_sg_particles)
+                    psys_translator = self.rman_scene.rman_translators['PARTICLES']
+                    psys_translator.update(obj.id, psys, rman_sg_particles)
                     return
                 # This is a particle instancer. The instanced object needs to updated
                 elif object_utils.is_particle_instancer(psys):
@@ -360,72 +352,75 @@ class RmanSceneSync(object):
 
     def update_particle_systems(self):
 
-        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):       
-            for ob in self.update_particles:
-                rman_type = object_utils._detect_primitive_(ob)   
-                if rman_type not in ['MESH', 'POINTS']:    
-                    continue
-                rman_sg_node = self.rman_scene.rman_objects.get(ob.original, None)
-                ob_eval = ob.evaluated_get(self.rman_scene.depsgraph)
-                rfb_log().debug("Update  particle systems for: %s" % ob.name)
+        for ob in self.update_particles:
+            rman_type = object_utils._detect_primitive_(ob)   
+            if rman_type not in ['MESH', 'POINTS']:    
+                continue
+            rman_sg_node = self.rman_scene.rman_objects.get(ob.original, None)
+            ob_eval = ob.evaluated_get(self.rman_scene.depsgraph)
+            rfb_log().debug("Update  particle systems for: %s" % ob.name)
 
-                # any objects that this object instanced, need to update their instances
-                for instance_obj in rman_sg_node.objects_instanced:
-                    self.clear_instances(instance_obj)
-                    self.update_instances.add(instance_obj)                
+            # any objects that this object instanced, need to update their instances
+            for instance_obj in rman_sg_node.objects_instanced:
+                self.clear_instances(instance_obj)
+                self.update_instances.add(instance_obj)                
 
-                if rman_sg_node.rman_sg_particle_group_node:
-                    rman_sg_node.rman_sg_particle_group_node.sg_node.RemoveAllChildren()
+            if rman_sg_node.rman_sg_particle_group_node:
+                rman_sg_node.rman_sg_particle_group_node.sg_node.RemoveAllChildren()
 
-                if len(ob_eval.particle_systems) < 1:
-                    continue                
+            if len(ob_eval.particle_systems) < 1:
+                continue                
                 
-                if not rman_sg_node.rman_sg_particle_group_node:
-                    db_name = rman_sg_node.db_name
-                    particles_group_db = ''
-                    rman_sg_node.rman_sg_particle_group_node = self.rman_scene.rman_translators['GROUP'].export(None, particles_group_db) 
-                    rman_sg_node.sg_node.AddChild(rman_sg_node.rman_sg_particle_group_node.sg_node) 
-
-                psys_translator = self.rman_scene.rman_translators['PARTICLES']
-
-                for psys in ob_eval.particle_systems:
-                    if object_utils.is_particle_instancer(psys):
-                        # this particle system is a instancer, add the instanced object
-                        # to the self.update_instances list
-                        inst_ob = getattr(psys.settings, 'instance_object', None) 
-                        collection = getattr(psys.settings, 'instance_collection', None)
-                        if inst_ob:
-                            self.update_instances.add(inst_ob.original)      
-                            rman_instance_sg_node = self.rman_scene.rman_objects.get(inst_ob.original, None)
+            if not rman_sg_node.rman_sg_particle_group_node:
+                db_name = rman_sg_node.db_name
+                particles_group_db = ''
+                rman_sg_node.rman_sg_particle_group_node = self.rman_scene.rman_translators['GROUP'].export(None, particles_group_db) 
+                rman_sg_node.sg_node.AddChild(rman_sg_node.rman_sg_particle_group_node.sg_node) 
+
+            psys_translator = self.rman_scene.rman_translators['PARTICLES']
+
+            for psys in ob_eval.particle_systems:
+                if object_utils.is_particle_instancer(psys):
+                    # this particle system is a instancer, add the instanced object
+                    # to the self.update_instances list
+                    inst_ob = getattr(psys.settings, 'instance_object', None) 
+                    collection = getattr(psys.settings, 'instance_collection', None)
+                    if inst_ob:
+                        self.update_instances.add(inst_ob.original)      
+                        rman_instance_sg_node = self.rman_scene.rman_objects.get(inst_ob.original, None)
+                        if rman_instance_sg_node:
+                            self.clear_instances(inst_ob.original, rman_instance_sg_node)
+                    elif collection:
+                        for col_obj in collection.all_objects:
+                            self.update_instances.add(col_obj.original) 
+                            rman_instance_sg_node = self.rman_scene.rman_objects.get(col_obj.original, None)
                             if rman_instance_sg_node:
-                                self.clear_instances(inst_ob.original, rman_instance_sg_node)
-                        elif collection:
-                            for col_obj in collection.all_objects:
-                                self.update_instances.add(col_obj.original) 
-                                rman_instance_sg_node = self.rman_scene.rman_objects.get(col_obj.original, None)
-                                if rman_instance_sg_node:
-                                    self.clear_instances(col_obj.original, rman_instance_sg_node)
-                                else:
-                                    self.new_objects.add(col_obj.original)                       
-                        continue
+                                self.clear_instances(col_obj.original, rman_instance_sg_node)
+                            else:
+                                self.new_objects.add(col_obj.original)                       
+                    continue
 
-                    ob_psys = self.rman_scene.rman_particles.get(ob_eval.original, dict())
-                    rman_sg_particles = ob_psys.get(psys.settings.original, None)
+                ob_psys = self.rman_scene.rman_particles.get(ob_eval.original, dict())
+                rman_sg_particles = ob_psys.get(psys.settings.original, None)
+                if not rman_sg_particles:
+                    psys_db_name = '%s' % psys.name
+                    rman_sg_particles = psys_translator.export(ob, psys, psys_db_name)
                     if not rman_sg_particles:
-                        psys_db_name = '%s' % psys.name
-                        rman_sg_particles = psys_translator.export(ob, psys, psys_db_name)
-                        if not rman_sg_particles:
-                            continue
-                    psys_translator.update(ob, psys, rman_sg_particles)
-                    ob_psys[psys.settings.original] = rman_sg_particles
-                    self.rman_scene.rman_particles[ob.original] = ob_psys          
-                    rman_sg_node.rman_sg_particle_group_node.sg_node.AddChild(rman_sg_particles.sg_node)    
+                        continue
+                psys_translator.update(ob, psys, rman_sg_particles)
+                ob_psys[psys.settings.original] = rman_sg_particles
+                self.rman_scene.rman_particles[ob.original] = ob_psys          
+                rman_sg_node.rman_sg_particle_group_node.sg_node.AddChild(rman_sg_particles.sg_node)    
 
     def update_empty(self, ob, rman_sg_node=None):
         rfb_log().debug("Update empty: %s" % ob.name)
         if ob.is_instancer:            
             collection = ob.instance_collection
             if collection:
+                if not self.num_instances_changed and self._update_collection_instance(ob, rman_sg_node):
+                    # the collection is exported as a prototype. We only need
+                    # to update the instancer's group
+                    return
                 if self.num_instances_changed:
                     for col_obj in collection.all_objects:
                         self.update_instances.add(col_obj.original) 
@@ -442,64 +437,122 @@ class RmanSceneSync(object):
     
         else:
             translator = self.rman_scene.rman_translators['EMPTY']
-            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                translator.export_transform(ob, rman_sg_node.sg_node)
-                if ob.renderman.export_as_coordsys:
-                    self.rman_scene.get_root_sg_node().AddCoordinateSystem(rman_sg_node.sg_node)
-                else:
-                    self.rman_scene.get_root_sg_node().RemoveCoordinateSystem(rman_sg_node.sg_node)                       
+            translator.export_transform(ob, rman_sg_node.sg_node)
+            if ob.renderman.export_as_coordsys:
+                self.rman_scene.get_root_sg_node().AddCoordinateSystem(rman_sg_node.sg_node)
+            else:
+                self.rman_scene.get_root_sg_node().RemoveCoordinateSystem(rman_sg_node.sg_node)                       
+
+    def _update_collection_instance(self, ob, rman_sg_node=None):
+        if ob.instance_type != 'COLLECTION' or not self.rman_scene._use_collection_prototype(ob.instance_collection):
+            return False
+        if not rman_sg_node:
+            rman_sg_node = self.rman_scene.rman_objects.get(ob.original, None)
+            if not rman_sg_node:
+                return False
+        ob_eval = ob.evaluated_get(self.rman_scene.depsgraph)
+        rman_sg_group = self.rman_scene.export_collection_instance(ob_eval)
+        self.rman_scene.update_collection_instance(ob_eval, rman_sg_group)
+        return True
+
+    def update_collection_prototypes(self):
+        # Objects in instanced collections are exported once, in their collection's
+        # prototype. Rebuild the prototypes of the collections that changed; every instance
+        # of a collection references its prototype, so they all pick up the change at once.
+        for ob in self.update_instances:
+            for rman_sg_collection in self.rman_scene.get_collection_prototypes(ob):
+                self.update_collections.add(rman_sg_collection.bl_collection)
+        if not self.update_collections:
+            return
+        for collection in self.update_collections:
+            rfb_log().debug("Update collection prototype: %s" % collection.name)
+            for removed in self.rman_scene.update_collection_prototype(collection):
+                # this collection can't be exported as a prototype anymore. Its
+                # objects go back to being exported as individual instances.
+                for o in removed.all_objects:
+                    self.update_instances.add(o.original)
+        self.update_collections.clear()
+
+    def _update_instance(self, ob, ob_inst, rman_sg_group, parent=None):
+        rman_group_translator = self.rman_scene.rman_translators['GROUP']
+        rman_group_translator.update_transform(ob_inst, rman_sg_group)
+        # object attrs             
+        rman_group_translator.export_object_attributes(ob, rman_sg_group)  
+        if rman_sg_group.bl_psys_settings:
+            self.rman_scene.attach_particle_material(rman_sg_group.bl_psys_settings, parent, ob, rman_sg_group)
+        else:
+            self.rman_scene.attach_material(ob, rman_sg_group)
+
+    def _reemit_direct_instances(self):
+        # Objects whose only instance is the object itself can be updated
+        # straight from their instances dict, without walking all of the
+        # depsgraph's object instances. Returns the objects that still need
+        # the full walk.
+        pending = set(self.update_instances)
+        for ob in self.update_instances:
+            rman_sg_node = self.rman_scene.rman_objects.get(ob.original, None)
+            if not rman_sg_node or not rman_sg_node.instances:
+                continue
+            if any(getattr(g, 'is_instance', True) for g in rman_sg_node.instances.values()):
+                continue
+            ob_eval = ob.evaluated_get(self.rman_scene.depsgraph)
+            rman_type = object_utils._detect_primitive_(ob_eval)
+            translator = self.rman_scene.rman_translators.get(rman_type, None)
+            if not translator:
+                continue
+            translator.export_object_primvars(ob_eval, rman_sg_node)
+            for rman_sg_group in rman_sg_node.instances.values():
+                self._update_instance(ob_eval, ob_eval, rman_sg_group)
+            pending.discard(ob)
+        return pending
 
     def reemit_instances(self):    
+        self.update_collection_prototypes()
+
         # update instances
         if not self.update_instances:
             return
-        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-            # Re-emit instances for all objects in self.update_instances
-            rfb_log().debug("Re-emit instances")
-            rman_group_translator = self.rman_scene.rman_translators['GROUP']
-            for ob_inst in self.rman_scene.depsgraph.object_instances: 
-                parent = None
-                if ob_inst.is_instance:
-                    ob = ob_inst.instance_object
-                    parent = ob_inst.parent
-                else:
-                    ob = ob_inst.object
+        # Re-emit instances for all objects in self.update_instances
+        rfb_log().debug("Re-emit instances")
+        pending = self._reemit_direct_instances()
+        if not pending:
+            return
+        for ob_inst in self.rman_scene.depsgraph.object_instances: 
+            parent = None
+            if ob_inst.is_instance:
+                ob = ob_inst.instance_object
+                parent = ob_inst.parent
+            else:
+                ob = ob_inst.object
 
-                if ob.original not in self.update_instances:
-                    continue
+            if ob.original not in pending:
+                continue
 
-                rman_type = object_utils._detect_primitive_(ob)
-                rman_sg_node = self.rman_scene.rman_objects.get(ob.original, None)
-                if rman_sg_node:
-                    translator = self.rman_scene.rman_translators.get(rman_type, None)
-                    translator.export_object_primvars(ob, rman_sg_node)
-
-                    group_db_name = object_utils.get_group_db_name(ob_inst) 
-                    rman_sg_group = rman_sg_node.instances.get(group_db_name, None)
-                    if rman_sg_group:
-                        rman_group_translator.update_transform(ob_inst, rman_sg_group)
-                        # object attrs             
-                        rman_group_translator.export_object_attributes(ob, rman_sg_group)  
-                        if rman_sg_group.bl_psys_settings:
-                            self.rman_scene.attach_particle_material(rman_sg_group.bl_psys_settings, parent, ob, rman_sg_group)
-                        else:
-                            self.rman_scene.attach_material(ob, rman_sg_group)
-                        continue                    
+            rman_type = object_utils._detect_primitive_(ob)
+            rman_sg_node = self.rman_scene.rman_objects.get(ob.original, None)
+            if rman_sg_node:
+                translator = self.rman_scene.rman_translators.get(rman_type, None)
+                translator.export_object_primvars(ob, rman_sg_node)
+
+                group_db_name = object_utils.get_group_db_name(ob_inst) 
+                rman_sg_group = rman_sg_node.instances.get(group_db_name, None)
+                if rman_sg_group:
+                    self._update_instance(ob, ob_inst, rman_sg_group, parent=parent)
+                    continue                    
                 
-                self.rman_scene._export_instance(ob_inst)            
+            self.rman_scene._export_instance(ob_inst)            
 
     def clear_instances(self, ob, rman_sg_node=None):
         rfb_log().debug("Deleting instances")
-        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-            if not rman_sg_node:
-                rman_sg_node = self.rman_scene.rman_objects.get(ob.original)
-            for k,rman_sg_group in rman_sg_node.instances.items():
-                if ob.parent and object_utils._detect_primitive_(ob.parent) == 'EMPTY':
-                    rman_empty_node = self.rman_scene.rman_objects.get(ob.parent.original)
-                    rman_empty_node.sg_node.RemoveChild(rman_sg_group.sg_node)
-                else:
-                    self.rman_scene.get_root_sg_node().RemoveChild(rman_sg_group.sg_node)                            
-            rman_sg_node.instances.clear()      
+        if not rman_sg_node:
+            rman_sg_node = self.rman_scene.rman_objects.get(ob.original)
+        for k,rman_sg_group in rman_sg_node.instances.items():
+            if ob.parent and object_utils._detect_primitive_(ob.parent) == 'EMPTY':
+                rman_empty_node = self.rman_scene.rman_objects.get(ob.parent.original)
+                rman_empty_node.sg_node.RemoveChild(rman_sg_group.sg_node)
+            else:
+                self.rman_scene.get_root_sg_node().RemoveChild(rman_sg_group.sg_node)                            
+        rman_sg_node.instances.clear()      
 
     def update_materials_dict(self, mat):    
         # See comment below in update_objects_dict 
@@ -541,6 +594,10 @@ class RmanSceneSync(object):
         # the collection could have been updated with new objects
         # FIXME: like grease pencil above we seem to crash when removing and adding instances 
         # of curves, we need to figure out what's going on
+        for rman_sg_collection in self.rman_scene.rman_collections.values():
+            if coll.original in rman_sg_collection.collections:
+                self.update_collections.add(rman_sg_collection.bl_collection)
+
         for o in coll.all_objects:
             if o.type in ('ARMATURE', 'CURVE', 'CAMERA'):
                 continue
@@ -555,9 +612,8 @@ class RmanSceneSync(object):
 
             if rman_type == 'LIGHT':
                 # Check light visibility. Light visibility is already handled elsewhere
-                with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene): 
-                    if self.rman_scene.check_light_local_view(o, rman_sg_node):
-                        continue
+                if self.rman_scene.check_light_local_view(o, rman_sg_node):
+                    continue
 
             self.update_instances.add(o.original)
             self.update_particles.add(o)  
@@ -593,21 +649,66 @@ class RmanSceneSync(object):
                         update_geo_instances(modifier.node_group.nodes)
 
     def update_portals(self, ob):
-        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-            translator = self.rman_scene.rman_translators['LIGHT']
-            for portal in scene_utils.get_all_portals(ob):
-                rman_sg_node = self.rman_scene.rman_objects.get(portal.original, None)
-                if rman_sg_node:
-                    translator.update(portal, rman_sg_node)
+        translator = self.rman_scene.rman_translators['LIGHT']
+        for portal in scene_utils.get_all_portals(ob):
+            rman_sg_node = self.rman_scene.rman_objects.get(portal.original, None)
+            if rman_sg_node:
+                translator.update(portal, rman_sg_node)
 
 
     def update_scene(self, context, depsgraph):
+        # Record what changed in the dirty sets, then flush them. All of the
+        # edits for this update are made in this one edit of the scene graph;
+        # none of the helpers below open their own.
+        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
+            complete = self._update_scene(context, depsgraph)
+            self._flush_updates(complete)
+            rfb_log().debug("------End update scene----------")
+
+    def _flush_updates(self, complete=True):
+        # materials first, so that objects exported or re-emitted
+        # below pick up the updated ones
+        for mat in self.update_materials.values():
+            self._material_updated(mat)
+        for ob in self.update_geometry.values():
+            self._obj_geometry_updated(ob)
+
+        # call txmake all in case of new textures
+        texture_utils.get_txmanager().txmake_all(blocking=False)
+        if not complete:
+            # an object was added that we can't tell the type of yet
+            # (see _update_scene). It'll be added in the next update.
+            return
+
+        # add new objs:
+        if self.new_objects:
+            self.add_objects()
+        elif self.do_add:
+            # if we didn't detect any new objects, but the number of
+            # instances changed, check our existing objects for object
+            # deletion and/or visibility
+            self.delete_objects()
+
+        # delete any objects, if necessary    
+        if self.do_delete:
+            self.delete_objects()
+
+        # update any particle systems
+        self.update_particle_systems()
+
+        # re-emit any instances needed
+        self.reemit_instances()
+
+    def _update_scene(self, context, depsgraph):
         ## FIXME: this function is waaayyy too big and is doing too much stuff
 
         self.new_objects.clear() 
         self.new_cameras.clear()
         self.update_instances.clear()
         self.update_particles.clear()
+        self.update_collections.clear()
+        self.update_materials.clear()
+        self.update_geometry.clear()
 
         self.do_delete = False # whether or not we need to do an object deletion
         self.do_add = False # whether or not we need to add an object
@@ -638,11 +739,10 @@ class RmanSceneSync(object):
                 self._scene_updated()
 
             elif isinstance(obj.id, bpy.types.World):
-                with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene): 
-                    self.rman_scene.export_integrator()
-                    self.rman_scene.export_samplefilters()
-                    self.rman_scene.export_displayfilters()
-                    self.rman_scene.export_viewport_stats()
+                self.rman_scene.export_integrator()
+                self.rman_scene.export_samplefilters()
+                self.rman_scene.export_displayfilters()
+                self.rman_scene.export_viewport_stats()
 
             elif isinstance(obj.id, bpy.types.Camera):
                 rfb_log().debug("Camera updated: %s" % obj.id.name)
@@ -651,45 +751,28 @@ class RmanSceneSync(object):
                         continue
                     rman_sg_camera = self.rman_scene.main_camera
                     translator = self.rman_scene.rman_translators['CAMERA']
-                    with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                        translator.update_viewport_cam(self.rman_scene.bl_scene.camera, rman_sg_camera, force_update=True)       
+                    translator.update_viewport_cam(self.rman_scene.bl_scene.camera, rman_sg_camera, force_update=True)       
                 else:
                     translator = self.rman_scene.rman_translators['CAMERA']                 
-                    with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                        for ob, rman_sg_camera in self.rman_scene.rman_cameras.items():     
-                            if ob.original.name != obj.id.name:
-                                continue
-                            translator._update_render_cam(ob.original, rman_sg_camera)
+                    for ob, rman_sg_camera in self.rman_scene.rman_cameras.items():     
+                        if ob.original.name != obj.id.name:
+                            continue
+                        translator._update_render_cam(ob.original, rman_sg_camera)
 
             elif isinstance(obj.id, bpy.types.Material):
                 rfb_log().debug("Material updated: %s" % obj.id.name)
-                self._material_updated(obj)    
+                self.update_materials[obj.id.original] = obj.id
 
             elif isinstance(obj.id, bpy.types.Mesh):
                 rfb_log().debug("Mesh updated: %s" % obj.id.name)
-                '''
-                # Experimental code path. We can use context.blend_data.user_map to ask
-                # what objects use this mesh. We can then loop thru and call object_update on these
-                # objects.
-                # We could also try doing the same thing when we add a new Material. i.e.:
-                # use user_map to figure out what objects are using this material; however, that would require
-                # two loops thru user_map
-                users = context.blend_data.user_map(subset={obj.id.original}, value_types={'OBJECT'})
-                translator = self.rman_scene.rman_translators['MESH']
-                with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                    for o in users[obj.id.original]:
-                        rman_type = object_utils._detect_primitive_(o)
-                        if rman_type != 'MESH':
-                            continue
-                        rman_sg_node = self.rman_scene.rman_objects.get(o.original, None)
-                        translator.update(o, rman_sg_node)
-                        translator.export_object_primvars(o, rman_sg_node)
-                        # material slots could have changed, so we need to double
-                        # check that too
-                        for k,v in rman_sg_node.instances.items():
-                            self.rman_scene.attach_material(o, v)                
-                return
-                '''
+                if self.num_instances_changed:
+                    continue
+                # update every object using this mesh. Their own updates, if
+                # we get them, end up in the same entry of update_geometry.
+                for o in self.rman_scene.get_instance_users(obj.id):
+                    if o.hide_get():
+                        continue
+                    self.update_geometry[o] = o.evaluated_get(depsgraph)
 
             elif isinstance(obj.id, bpy.types.ParticleSettings):
                 rfb_log().debug("ParticleSettings updated: %s" % obj.id.name)
@@ -751,15 +834,13 @@ class RmanSceneSync(object):
                                 # add this light just yet.
                                 if not shadergraph_utils.is_rman_light(ob):
                                     self.rman_scene.num_object_instances = prev_num_instances
-                                    rfb_log().debug("------End update scene----------")
-                                    return
+                                    return False
                             elif rman_type == 'EMPTY':
                                 # same issue can also happen with empty
                                 # we have not been able to tag our types before Blender
                                 # tells us an empty has been added
                                 self.rman_scene.num_object_instances = prev_num_instances
-                                rfb_log().debug("------End update scene----------")
-                                return
+                                return False
                             rfb_log().debug("New object added: %s" % obj.id.name)                           
                             self.new_objects.add(obj.id.original)
                             self.update_instances.add(obj.id.original)
@@ -788,8 +869,7 @@ class RmanSceneSync(object):
                         if rman_sg_camera == self.rman_scene.main_camera:
                             continue
                         translator = self.rman_scene.rman_translators['CAMERA']
-                        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                            translator._update_render_cam_transform(ob, rman_sg_camera)                        
+                        translator._update_render_cam_transform(ob, rman_sg_camera)                        
                         continue
                     
                     if rman_type == 'LIGHTFILTER':
@@ -825,9 +905,8 @@ class RmanSceneSync(object):
                     rman_sg_camera = self.rman_scene.main_camera
                     if rman_sg_camera.rman_focus_object and rman_sg_camera.rman_focus_object == rman_sg_node:
                         translator = self.rman_scene.rman_translators['CAMERA']
-                        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-                            cam_object = translator.find_scene_camera()
-                            translator.update(cam_object, rman_sg_camera)
+                        cam_object = translator.find_scene_camera()
+                        translator.update(cam_object, rman_sg_camera)
 
                 if obj.is_updated_geometry:
                     if is_hidden:
@@ -844,7 +923,7 @@ class RmanSceneSync(object):
                         self.update_particles.add(obj.id)
 
                         if not self.num_instances_changed:
-                            self._obj_geometry_updated(obj)
+                            self.update_geometry[obj.id.original] = obj.id
 
             elif isinstance(obj.id, bpy.types.Collection):
                 # don't check the collection if we know objects
@@ -858,87 +937,66 @@ class RmanSceneSync(object):
             else:
                 self.update_geometry_node_instances(obj.id)
 
-        # call txmake all in case of new textures
-        texture_utils.get_txmanager().txmake_all(blocking=False)       
-        # add new objs:
-        if self.new_objects:
-            self.add_objects()
-        elif self.do_add:
-            # if we didn't detect any new objects, but the number of
-            # instances changed, check our existing objects for object
-            # deletion and/or visibility
-            self.delete_objects()
-
-        # delete any objects, if necessary    
-        if self.do_delete:
-            self.delete_objects()
-
-        # update any particle systems
-        self.update_particle_systems()
-
-        # re-emit any instances needed
-        self.reemit_instances()                          
-                        
-        rfb_log().debug("------End update scene----------")
+        return True
 
     def add_objects(self):
-        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene): 
-            rfb_log().debug("Adding new objects:")
-            self.rman_scene.export_data_blocks(self.new_objects)
+        rfb_log().debug("Adding new objects:")
+        self.rman_scene.export_data_blocks(self.new_objects)
 
-            self.rman_scene.scene_any_lights = self.rman_scene._scene_has_lights()
-            if self.rman_scene.scene_any_lights:
-                self.rman_scene.default_light.SetHidden(1)           
+        self.rman_scene.scene_any_lights = self.rman_scene._scene_has_lights()
+        if self.rman_scene.scene_any_lights:
+            self.rman_scene.default_light.SetHidden(1)           
 
     def delete_objects(self):
         rfb_log().debug("Deleting objects")
-        with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
-            keys = [k for k in self.rman_scene.rman_objects.keys()]
-            for obj in keys:
+        keys = [k for k in self.rman_scene.rman_objects.keys()]
+        for obj in keys:
+            try:
+                ob = self.rman_scene.bl_scene.objects.get(obj.name_full, None)
+                # NOTE: objects that are hidden from the viewport are considered deleted
+                # objects as well
+                if ob and not ob.hide_viewport:
+                    rman_sg_node = self.rman_scene.rman_objects.get(obj, None)
+                    if rman_sg_node:
+                        # Double check object visibility
+                        self.update_object_visibility(rman_sg_node, ob)
+                    continue
+            except Exception as e:
+                pass
+    
+            rman_sg_node = self.rman_scene.rman_objects.get(obj, None)
+            if rman_sg_node:                        
+                for rman_sg_collection in self.rman_scene.get_collection_prototypes(obj):
+                    self.update_collections.add(rman_sg_collection.bl_collection)
+                for k,v in rman_sg_node.instances.items():
+                    if v.sg_node:
+                        self.rman_scene.sg_scene.DeleteDagNode(v.sg_node)    
+                rman_sg_node.instances.clear()             
+
+                # For now, don't delete the geometry itself
+                # there may be a collection instance still referencing the geo
+
+                # self.rman_scene.sg_scene.DeleteDagNode(rman_sg_node.sg_node)                     
+                del self.rman_scene.rman_objects[obj]
+
+                # We just deleted a light filter. We need to tell all lights
+                # associated with this light filter to update
+                if isinstance(rman_sg_node, RmanSgLightFilter):
+                    for light_ob in rman_sg_node.lights_list:
+                        light_key = object_utils.get_db_name(light_ob, rman_type='LIGHT')
+                        rman_sg_light = self.rman_scene.rman_objects.get(light_ob.original, None)
+                        if rman_sg_light:
+                            self.rman_scene.rman_translators['LIGHT'].update_light_filters(light_ob, rman_sg_light)                                
                 try:
-                    ob = self.rman_scene.bl_scene.objects.get(obj.name_full, None)
-                    # NOTE: objects that are hidden from the viewport are considered deleted
-                    # objects as well
-                    if ob and not ob.hide_viewport:
-                        rman_sg_node = self.rman_scene.rman_objects.get(obj, None)
-                        if rman_sg_node:
-                            # Double check object visibility
-                            self.update_object_visibility(rman_sg_node, ob)
-                        continue
-                except Exception as e:
+                    self.rman_scene.processed_obs.remove(obj)
+                except ValueError:
+                    rfb_log().debug("Obj not in self.rman_scene.processed_obs: %s")
                     pass
-    
-                rman_sg_node = self.rman_scene.rman_objects.get(obj, None)
-                if rman_sg_node:                        
-                    for k,v in rman_sg_node.instances.items():
-                        if v.sg_node:
-                            self.rman_scene.sg_scene.DeleteDagNode(v.sg_node)    
-                    rman_sg_node.instances.clear()             
-
-                    # For now, don't delete the geometry itself
-                    # there may be a collection instance still referencing the geo
-
-                    # self.rman_scene.sg_scene.DeleteDagNode(rman_sg_node.sg_node)                     
-                    del self.rman_scene.rman_objects[obj]
-
-                    # We just deleted a light filter. We need to tell all lights
-                    # associated with this light filter to update
-                    if isinstance(rman_sg_node, RmanSgLightFilter):
-                        for light_ob in rman_sg_node.lights_list:
-                            light_key = object_utils.get_db_name(light_ob, rman_type='LIGHT')
-                            rman_sg_light = self.rman_scene.rman_objects.get(light_ob.original, None)
-                            if rman_sg_light:
-                                self.rman_scene.rman_translators['LIGHT'].update_light_filters(light_ob, rman_sg_light)                                
-                    try:
-                        self.rman_scene.processed_obs.remove(obj)
-                    except ValueError:
-                        rfb_log().debug("Obj not in self.rman_scene.processed_obs: %s")
-                        pass
-
-                if self.rman_scene.render_default_light:
-                    self.rman_scene.scene_any_lights = self.rman_scene._scene_has_lights()     
-                    if not self.rman_scene.scene_any_lights:
-                        self.rman_scene.default_light.SetHidden(0)             
+
+            if self.rman_scene.render_default_light:
+                self.rman_scene.scene_any_lights = self.rman_scene._scene_has_lights()     
+                if not self.rman_scene.scene_any_lights:
+                    self.rman_scene.default_light.SetHidden(0)             
 
     def update_cropwindow(self, cropwindow=None):
         if not self.rman_render.rman_interactive_running:
@@ -1015,7 +1073,11 @@ class RmanSceneSync(object):
             # we're dealing with a mesh light
             rfb_log().debug("Manually calling mesh_light_update")
             self.rman_scene.depsgraph = bpy.context.evaluated_depsgraph_get()
-            self._mesh_light_update(mat)    
+            self.update_instances.clear()
+            self.update_collections.clear()
+            with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
+                self._mesh_light_update(mat)
+                self.reemit_instances()
 
     def update_light(self, ob):
         if not self.rman_render.rman_interactive_running:
@@ -1093,6 +1155,7 @@ class RmanSceneSync(object):
             return        
         self.rman_scene.bl_scene = context.scene    
         self.rman_scene._find_renderman_layer()
+        display_utils.clear_dspy_dict_cache()
         with self.rman_scene.rman.SGManager.ScopedEdit(self.rman_scene.sg_scene):
             self.rman_scene.export_displays()         
 
@@ -0,0 +1,31 @@
+from .rman_sg_group import RmanSgGroup
+
+class RmanSgCollection(RmanSgGroup):
+    '''
+    The prototype for a collection that is instanced by collection instancers
+    (objects with instance_type == 'COLLECTION'). The collection's objects are exported
+    once, as groups under sg_node, and each instancer gets a group holding just its transform,
+    with sg_node as its child.
+
+    Attributes:
+        bl_collection (bpy.types.Collection) - the instanced collection
+        members (dict) - the groups for the objects in the collection, keyed by object
+        collections (set) - the collection, and all of its child collections, that the
+                            members were gathered from
+        nested (set) - the collections instanced by collection instancers inside this collection
+    '''
+
+    def __init__(self, rman_scene, sg_node, db_name):
+        super().__init__(rman_scene, sg_node, db_name)
+        self.bl_collection = None
+        self.members = dict()
+        self.collections = set()
+        self.nested = set()
+
+    @property
+    def bl_collection(self):
+        return self.__bl_collection
+
+    @bl_collection.setter
+    def bl_collection(self, bl_collection):
+        self.__bl_collection = bl_collection
@@ -6,6 +6,16 @@ class RmanSgGroup(RmanSgNode):
         super().__init__(rman_scene, sg_node, db_name)
         self.matrix_world = None
 
+        # whether this group was created for an instance generated
+        # by an instancer (particles, collection instances, geometry nodes)
+        # rather than for the object itself
+        self.is_instance = False
+
+        # for a group shared by the instances of a prototype (see
+        # RmanScene._export_shared_prototype_instances), the group nodes
+        # holding each instance's transform
+        self.instance_sg_nodes = list()
+
     @property
     def matrix_world(self):
         return self.__matrix_world
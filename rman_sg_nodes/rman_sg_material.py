@@ -11,6 +11,10 @@ class RmanSgMaterial(RmanSgNode):
         self.sg_fill_mat = None
         self.nodes_to_blnodeinfo = dict()
 
+        # the shader lists last handed to sg_node, keyed by
+        # 'bxdf' and 'displace'. Used by the material cache.
+        self.sg_shaders = dict()
+
     @property
     def has_meshlight(self):
         return self.__has_meshlight
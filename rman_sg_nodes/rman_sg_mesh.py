@@ -13,6 +13,10 @@ class RmanSgMesh(RmanSgNode):
         self.is_multi_material = False
         self.multi_material_children = []
 
+        # hash of the topology and facevarying data last sent
+        # to sg_node. See RmanMeshTranslator.update
+        self.topology_fingerprint = None
+
     @property
     def matrix_world(self):
         return self.__matrix_world
@@ -59,4 +63,12 @@ class RmanSgMesh(RmanSgNode):
 
     @subdiv_scheme.setter
     def subdiv_scheme(self, subdiv_scheme):
-        self.__subdiv_scheme = subdiv_scheme                                       
\ No newline at end of file
+        self.__subdiv_scheme = subdiv_scheme
+
+    @property
+    def topology_fingerprint(self):
+        return self.__topology_fingerprint
+
+    @topology_fingerprint.setter
+    def topology_fingerprint(self, topology_fingerprint):
+        self.__topology_fingerprint = topology_fingerprint
@@ -16,6 +16,7 @@ class RmanSgNode(object):
         is_meshlight (bool) - if this object is a mesh light.
         is_hidden (bool) - whether this object is considered hidden
         is_frame_sensitive (bool) - indicates that the sg_node should be updated on frame changes
+        shared_by (list) - the Blender objects that use this node's geometry, if it's shared
  
     '''
     def __init__(self, rman_scene, sg_node, db_name):
@@ -53,6 +54,10 @@ class RmanSgNode(object):
         # psys
         self.bl_psys_settings = None
 
+        # objects that share this geometry, if any, including
+        # the one it was exported for
+        self.shared_by = list()
+
     @property
     def rman_scene(self):
         return self.__rman_scene
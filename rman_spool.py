@@ -204,6 +204,13 @@ class RmanSpool(object):
 
             parent_task.addChild(renderframestask)
 
+    def has_crossframe_denoise(self):
+        dspys_dict = display_utils.get_dspy_dict(self.rman_scene, expandTokens=False)  
+        for dspy,params in dspys_dict['displays'].items():
+            if params['denoise'] and params['denoise_mode'] == 'crossframe':
+                return True
+        return False
+
     def generate_denoise_tasks(self, start, last, by):
 
         tasktitle = "Denoiser Renders"
@@ -326,6 +333,10 @@ class RmanSpool(object):
         frame_end = self.bl_scene.frame_end
         by = self.bl_scene.frame_step     
 
+        # we don't go through RmanScene.reset() when spooling, so make
+        # sure we don't use displays cached from an earlier render
+        display_utils.clear_dspy_dict_cache()
+
         # update variables
         string_utils.set_var('scene', self.bl_scene.name)
         string_utils.set_var('layer', self.rman_scene.bl_view_layer.name)           
@@ -361,15 +372,18 @@ class RmanSpool(object):
         parent_task.title = tasktitle
         anim = (frame_begin != frame_end)
 
-        self.generate_blender_batch_tasks(anim, parent_task, tasktitle,
-                                frame_begin, frame_end, by, bl_filename)
+        # the output directories are only needed once the job runs,
+        # so create them all at once after the frame loops
+        with string_utils.deferred_makedirs():
+            self.generate_blender_batch_tasks(anim, parent_task, tasktitle,
+                                    frame_begin, frame_end, by, bl_filename)
 
-        job.addChild(parent_task)                                
+            job.addChild(parent_task)                                
 
-        # Don't denoise if we're baking
-        if rm.hider_type == 'RAYTRACE':
-            parent_task = self.generate_denoise_tasks(frame_begin, frame_end, by)                               
-            job.addChild(parent_task)
+            # Don't denoise if we're baking
+            if rm.hider_type == 'RAYTRACE':
+                parent_task = self.generate_denoise_tasks(frame_begin, frame_end, by)                               
+                job.addChild(parent_task)
         
         scene_filename = bpy.data.filepath
         if scene_filename == '':
@@ -404,17 +418,24 @@ class RmanSpool(object):
         self.spool(job, jobfile)
 
     
-    def batch_render(self):
+    def batch_render(self, frame_begin=None, frame_end=None):
 
         scene = self.bl_scene 
         rm = scene.renderman
-        frame_begin = self.bl_scene.frame_start
-        frame_end = self.bl_scene.frame_end
         by = self.bl_scene.frame_step        
 
-        if not rm.external_animation:
-            frame_begin = self.bl_scene.frame_current
-            frame_end = frame_begin
+        # the AOV settings could have changed since the last export
+        display_utils.clear_dspy_dict_cache()
+
+        # an explicit frame range means we're spooling one batch
+        # of a larger animation
+        is_batch = (frame_begin is not None)
+        if not is_batch:
+            frame_begin = self.bl_scene.frame_start
+            frame_end = self.bl_scene.frame_end
+            if not rm.external_animation:
+                frame_begin = self.bl_scene.frame_current
+                frame_end = frame_begin
 
         job = author.Job()
         
@@ -440,21 +461,26 @@ class RmanSpool(object):
         parent_task = author.Task()
         parent_task.title = tasktitle
 
-        self.generate_rib_render_tasks(anim, parent_task, tasktitle,
-                                frame_begin, frame_end, by, threads)
-        job.addChild(parent_task)
-
-        # Don't denoise if we're baking
-        if rm.hider_type == 'RAYTRACE':
-            parent_task = self.generate_denoise_tasks(frame_begin, frame_end, by)                               
+        # the output directories are only needed once the job runs,
+        # so create them all at once after the frame loops
+        with string_utils.deferred_makedirs():
+            self.generate_rib_render_tasks(anim, parent_task, tasktitle,
+                                    frame_begin, frame_end, by, threads)
             job.addChild(parent_task)
 
+            # Don't denoise if we're baking
+            if rm.hider_type == 'RAYTRACE':
+                parent_task = self.generate_denoise_tasks(frame_begin, frame_end, by)                               
+                job.addChild(parent_task)
+
         bl_filename = bpy.data.filepath
         if bl_filename == '':
             jobfile = string_utils.expand_string('<OUT>/<scene>.<layer>.alf', 
                                                 asFilePath=True)            
         else:
             jobfile = os.path.splitext(bl_filename)[0] + '.%s.alf' % bl_view_layer.replace(' ', '_')        
+        if is_batch:
+            jobfile = os.path.splitext(jobfile)[0] + '.%d-%d.alf' % (frame_begin, frame_end)
 
         jobFileCleanup = author.Command(local=False)
         jobFileCleanup.argv = ["TractorBuiltIn", "File", "delete",
@@ -48,9 +48,7 @@ class RmanCameraTranslator(RmanTranslator):
         rman_sg_camera.cam_matrix = v
         rman_sg_camera.sg_node.SetTransform( v )    
 
-    def _update_render_cam_transform(self, ob, rman_sg_camera, index=0, seg=0.0):
-
-        cam = ob.data
+    def get_render_cam_matrix(self, ob):
         mtx = ob.matrix_world
         
         # normalize the matrix
@@ -59,7 +57,13 @@ class RmanCameraTranslator(RmanTranslator):
         except SystemError as e:
             rfb_log().debug("Could not normalize matrix: %s" % str(e))
 
-        v = transform_utils.convert_matrix(mtx)
+        return transform_utils.convert_matrix(mtx)
+
+    def _update_render_cam_transform(self, ob, rman_sg_camera, index=0, seg=0.0, mtx=None):
+
+        v = mtx
+        if v is None:
+            v = self.get_render_cam_matrix(ob)
         if rman_sg_camera.cam_matrix == v:
             return
 
@@ -70,13 +74,13 @@ class RmanCameraTranslator(RmanTranslator):
             rman_sg_camera.sg_node.SetTransform( v )    
                
 
-    def update_transform(self, ob, rman_sg_camera, index=0, seg=0):
+    def update_transform(self, ob, rman_sg_camera, index=0, seg=0, mtx=None):
         if self.rman_scene.is_viewport_render:
             self._update_viewport_transform(rman_sg_camera)
         elif self.rman_scene.is_interactive and not ob:
             self._update_viewport_transform(rman_sg_camera)
         else:
-            self._update_render_cam_transform(ob, rman_sg_camera, index, seg)
+            self._update_render_cam_transform(ob, rman_sg_camera, index, seg, mtx=mtx)
 
     def _export_viewport_cam(self, db_name=""):  
         sg_group = self.rman_scene.sg_scene.CreateGroup(db_name) 
@@ -151,6 +151,9 @@ class RmanCurveTranslator(RmanMeshTranslator):
         if rman_sg_curve.is_mesh:
             rman_sg_curve.sg_mesh_node = self.rman_scene.sg_scene.CreateMesh('%s-MESH' % rman_sg_curve.db_name)
             rman_sg_curve.sg_node.AddChild(rman_sg_curve.sg_mesh_node)            
+            # this is a brand new mesh node, so nothing has been sent to it yet
+            rman_sg_curve.topology_fingerprint = None
+            rman_sg_curve.multi_material_children = []
             super().update(ob, rman_sg_curve, sg_node=rman_sg_curve.sg_mesh_node)
             return True    
 
@@ -24,7 +24,9 @@ class RmanDraTranslator(RmanTranslator):
         rm = ob.renderman
         path_archive = string_utils.expand_string(rm.path_archive)
         bounds = (-100000, 100000, -100000, 100000, -100000, 100000 )
+        self.update_archive(rman_sg_dra, path_archive, bounds)
 
+    def update_archive(self, rman_sg_dra, path_archive, bounds):
         primvar = rman_sg_dra.sg_node.GetPrimVars()
         primvar.SetString(self.rman_scene.rman.Tokens.Rix.k_filename, path_archive)
         primvar.SetFloatArray(self.rman_scene.rman.Tokens.Rix.k_bound, bounds, 6)
@@ -128,9 +128,10 @@ class RmanFluidTranslator(RmanTranslator):
         inv_mtx = ob.matrix_world.inverted_safe()
         cur_frame = self.rman_scene.bl_scene.frame_current
         do_motion = self.rman_scene.do_motion_blur
-        P, next_P, width = particles_utils.get_particles(ob, psys, inv_mtx, cur_frame, get_next_P=do_motion)        
+        particle_data = particles_utils.get_particle_data(psys)
+        P, next_P, width = particles_utils.get_particles(ob, psys, inv_mtx, cur_frame, get_next_P=do_motion, particle_data=particle_data)        
 
-        if not P:
+        if len(P) == 0:
             return
 
         nm_pts = len(P)
@@ -142,14 +143,14 @@ class RmanFluidTranslator(RmanTranslator):
         if do_motion and rman_sg_fluid.motion_steps:
             super().set_primvar_times(rman_sg_fluid.motion_steps, primvar)
         
-        particles_utils.get_primvars_particle(primvar, cur_frame, psys, [cur_frame], 0)      
+        particles_utils.get_primvars_particle(primvar, cur_frame, psys, [cur_frame], 0, particle_data=particle_data)      
         
         if do_motion:
-            primvar.SetPointDetail(self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex", 0) 
-            primvar.SetPointDetail(self.rman_scene.rman.Tokens.Rix.k_P, next_P, "vertex", 1)  
+            scenegraph_utils.set_primvar_buffer(primvar.SetPointDetail, self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex", 0) 
+            scenegraph_utils.set_primvar_buffer(primvar.SetPointDetail, self.rman_scene.rman.Tokens.Rix.k_P, next_P, "vertex", 1)  
         else:
-            primvar.SetPointDetail(self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex")               
-        primvar.SetFloatDetail(self.rman_scene.rman.Tokens.Rix.k_width, width, "vertex")
+            scenegraph_utils.set_primvar_buffer(primvar.SetPointDetail, self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex")               
+        scenegraph_utils.set_primvar_buffer(primvar.SetFloatDetail, self.rman_scene.rman.Tokens.Rix.k_width, width, "vertex")
 
         sg_node.SetPrimVars(primvar)
 
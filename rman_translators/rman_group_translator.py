@@ -14,8 +14,9 @@ class RmanGroupTranslator(RmanTranslator):
         mtx = transform_utils.convert_matrix(ob.matrix_world.copy())
         rman_sg_group.sg_node.SetTransform( mtx )
 
-    def update_transform_sample(self, ob, rman_sg_group, index, seg):
-        mtx = transform_utils.convert_matrix(ob.matrix_world.copy())
+    def update_transform_sample(self, ob, rman_sg_group, index, seg, mtx=None):
+        if mtx is None:
+            mtx = transform_utils.convert_matrix(ob.matrix_world.copy())
         rman_sg_group.sg_node.SetTransformSample( index, mtx, seg)
 
     def update_transform_num_samples(self, rman_sg_group, motion_steps):
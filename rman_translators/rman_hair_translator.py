@@ -32,13 +32,17 @@ class RmanHairTranslator(RmanTranslator):
     def export_deform_sample(self, rman_sg_hair, ob, psys, time_sample):
 
         curves = self._get_strands_(ob, psys)
-        for i, (vertsArray, points, widths, scalpST) in enumerate(curves):
+        if not curves:
+            return
+        for i, (vertsArray, points, widths, scalpST, mcols) in enumerate(curves):
+            if i >= len(rman_sg_hair.sg_curves_list):
+                break
             curves_sg = rman_sg_hair.sg_curves_list[i]
             if not curves_sg:
                 continue
             primvar = curves_sg.GetPrimVars()
 
-            primvar.SetPointDetail(self.rman_scene.rman.Tokens.Rix.k_P, points, "vertex", time_sample)  
+            scenegraph_utils.set_primvar_buffer(primvar.SetPointDetail, self.rman_scene.rman.Tokens.Rix.k_P, points, "vertex", time_sample)
             curves_sg.SetPrimVars(primvar)
 
     def update(self, ob, psys, rman_sg_hair):
@@ -55,23 +59,23 @@ class RmanHairTranslator(RmanTranslator):
             curves_sg.Define(self.rman_scene.rman.Tokens.Rix.k_cubic, "nonperiodic", "catmull-rom", len(vertsArray), len(points))
             primvar = curves_sg.GetPrimVars()
 
-            primvar.SetPointDetail(self.rman_scene.rman.Tokens.Rix.k_P, points, "vertex")                
-            primvar.SetIntegerDetail(self.rman_scene.rman.Tokens.Rix.k_Ri_nvertices, vertsArray, "uniform")
+            scenegraph_utils.set_primvar_buffer(primvar.SetPointDetail, self.rman_scene.rman.Tokens.Rix.k_P, points, "vertex")
+            scenegraph_utils.set_primvar_buffer(primvar.SetIntegerDetail, self.rman_scene.rman.Tokens.Rix.k_Ri_nvertices, vertsArray, "uniform")
             index_nm = psys.settings.renderman.hair_index_name
             if index_nm == '':
                 index_nm = 'index'
-            primvar.SetIntegerDetail(index_nm, range(len(vertsArray)), "uniform")
+            scenegraph_utils.set_primvar_buffer(primvar.SetIntegerDetail, index_nm, np.arange(len(vertsArray), dtype=np.int32), "uniform")
 
-            width_detail = "constant"
-            if isinstance(widths, list):
-                width_detail = "vertex"
-            primvar.SetFloatDetail(self.rman_scene.rman.Tokens.Rix.k_width, widths, width_detail)
+            if isinstance(widths, np.ndarray):
+                scenegraph_utils.set_primvar_buffer(primvar.SetFloatDetail, self.rman_scene.rman.Tokens.Rix.k_width, widths, "vertex")
+            else:
+                primvar.SetFloatDetail(self.rman_scene.rman.Tokens.Rix.k_width, widths, "constant")
             
             if len(scalpST):
-                primvar.SetFloatArrayDetail("scalpST", scalpST, 2, "uniform")
+                scenegraph_utils.set_primvar_buffer(primvar.SetFloatArrayDetail, "scalpST", scalpST, 2, "uniform")
 
             if len(mcols):
-                primvar.SetColorDetail("Cs", mcols, "uniform")
+                scenegraph_utils.set_primvar_buffer(primvar.SetColorDetail, "Cs", mcols, "uniform")
                     
             if rman_sg_hair.motion_steps:
                 super().set_primvar_times(rman_sg_hair.motion_steps, primvar)
@@ -120,11 +124,6 @@ class RmanHairTranslator(RmanTranslator):
             steps = (2 ** psys.settings.display_step)+1
         else:
             steps = (2 ** psys.settings.render_step)+1
-        
-        if conwidth:
-            hair_width = base_width
-        else:
-            hair_width = []
 
         num_parents = len(psys.particles)
         num_children = len(psys.child_particles)
@@ -149,85 +148,113 @@ class RmanHairTranslator(RmanTranslator):
                     mcol_set = i
                     break            
 
-        curve_sets = []
-        points = []
-        vertsArray = []
-        scalpST = []
-        mcols = []
-        nverts = 0
-
-        ob_inv_mtx = ob.matrix_world.inverted_safe()
         start_idx = 0
         if psys.settings.child_type != 'NONE' and num_children > 0:
             start_idx = num_parents
-        
+
+        # Gather the raw strand points in world space. co_hair is the only way to get
+        # at interpolated and child strands, but everything after this is done
+        # in bulk with NumPy.
+        co_hair = psys.co_hair
+        points = []
+        strand_lengths = []
+        scalpST = []
+        mcols = []
         for pindex in range(start_idx, total_hair_count):
-            strand_points = []
+            num_points = 0
             # walk through each strand
             for step in range(0, steps):           
-                pt = psys.co_hair(ob, particle_no=pindex, step=step)
+                pt = co_hair(ob, particle_no=pindex, step=step)
 
                 if pt.length_squared == 0:
                     # this strand ends prematurely                    
                     break                
 
-                # put points in object space
-                pt = ob_inv_mtx @ pt
+                points.append(pt[:])
+                num_points += 1
 
-                strand_points.append(pt)
-
-            if len(strand_points) > 1:
-                # double the first and last
-                strand_points = strand_points[:1] + \
-                    strand_points + strand_points[-1:]
-                vertsInStrand = len(strand_points)
-
-                # catmull-rom requires at least 4 vertices
-                if vertsInStrand < 4:
-                    continue
+            if num_points < 2:
+                del points[len(points)-num_points:]
+                continue
 
-                # for varying width make the width array
+            strand_lengths.append(num_points)
+
+            # get the scalp ST
+            if export_st:
+                particle = psys.particles[
+                    (pindex - num_parents) % num_parents]                        
+                st = psys.uv_on_emitter(psys_modifier, particle=particle, particle_no=pindex, uv_no=uv_set)
+                scalpST.append((st[0], st[1]))
+
+            if export_mcol:
+                particle = psys.particles[
+                    (pindex - num_parents) % num_parents]                  
+                mcol = psys.mcol_on_emitter(psys_modifier, particle=particle, particle_no=pindex, vcol_no=mcol_set)
+                mcols.append((mcol[0], mcol[1], mcol[2]))
+
+        if not strand_lengths:
+            return []
+
+        # put points in object space. Transform in double precision, since
+        # points far from the origin lose too much in float32.
+        ob_inv_mtx = np.array(ob.matrix_world.inverted_safe(), dtype=np.float64)
+        P = np.array(points, dtype=np.float64)
+        P = (P @ ob_inv_mtx[:3, :3].T + ob_inv_mtx[:3, 3]).astype(np.float32)
+
+        # double the first and last point of each strand
+        strand_lengths = np.array(strand_lengths, dtype=np.int32)
+        vertsArray = strand_lengths + 2
+        P = P[_get_strand_point_indices_(strand_lengths)]
+        hair_width = base_width
+        if not conwidth:
+            hair_width = _get_strand_widths_(vertsArray, base_width, tip_width)
+
+        scalpST = np.array(scalpST, dtype=np.float32).reshape(-1, 2)
+        mcols = np.array(mcols, dtype=np.float32).reshape(-1, 3)
+
+        # if we get more than 100000 vertices, start a new set of curves. This
+        # is to avoid a maxint on the array length
+        curve_sets = []
+        vert_offsets = np.cumsum(vertsArray)
+        curve_start = 0
+        vert_start = 0
+        nverts = 0
+        for i, verts_in_strand in enumerate(vertsArray.tolist()):
+            nverts += verts_in_strand
+            if nverts > 100000 or i == len(vertsArray) - 1:
+                vert_end = int(vert_offsets[i])
+                widths = hair_width
                 if not conwidth:
-                    decr = (base_width - tip_width) / (vertsInStrand - 2)
-                    hair_width.extend([base_width] + [(base_width - decr * i)
-                                                    for i in range(vertsInStrand - 2)] +
-                                    [tip_width])
-
-                # add the last point again
-                points.extend(strand_points)
-                vertsArray.append(vertsInStrand)
-                nverts += vertsInStrand
-
-                # get the scalp ST
-                if export_st:
-                    particle = psys.particles[
-                        (pindex - num_parents) % num_parents]                        
-                    st = psys.uv_on_emitter(psys_modifier, particle=particle, particle_no=pindex, uv_no=uv_set)
-                    scalpST.append([st[0], st[1]])
-
-                if export_mcol:
-                    particle = psys.particles[
-                        (pindex - num_parents) % num_parents]                  
-                    mcol = psys.mcol_on_emitter(psys_modifier, particle=particle, particle_no=pindex, vcol_no=mcol_set)
-                    mcols.append([mcol[0], mcol[1], mcol[2]])
-
-            # if we get more than 100000 vertices, export ri.Curve and reset.  This
-            # is to avoid a maxint on the array length
-            if nverts > 100000:
-                curve_sets.append(
-                    (vertsArray, points, hair_width, scalpST, mcols))
-
+                    widths = hair_width[vert_start:vert_end]
+                curve_sets.append((vertsArray[curve_start:i+1],
+                                P[vert_start:vert_end],
+                                widths,
+                                scalpST[curve_start:i+1] if export_st else [],
+                                mcols[curve_start:i+1] if export_mcol else []))
+                curve_start = i + 1
+                vert_start = vert_end
                 nverts = 0
-                points = []
-                vertsArray = []
-                if not conwidth:
-                    hair_width = []
-                scalpST = []
-                mcols = []
-
-        if nverts > 0:
-            curve_sets.append((vertsArray, points,
-                            hair_width, scalpST, mcols))
 
         return curve_sets              
-            
\ No newline at end of file
+
+def _get_strand_point_indices_(strand_lengths):
+    # Indices into the flat strand points array that repeat the first
+    # and last point of every strand, as catmull-rom curves require.
+    num_strands = len(strand_lengths)
+    src_starts = np.cumsum(strand_lengths) - strand_lengths
+    dst_lengths = strand_lengths + 2
+    dst_starts = np.cumsum(dst_lengths) - dst_lengths
+    local_idx = np.arange(int(dst_lengths.sum())) - np.repeat(dst_starts, dst_lengths)
+    local_idx = np.clip(local_idx - 1, 0, np.repeat(strand_lengths - 1, dst_lengths))
+    return np.repeat(src_starts, dst_lengths) + local_idx
+
+def _get_strand_widths_(verts_array, base_width, tip_width):
+    # Per vertex widths that taper linearly from base_width to tip_width,
+    # with the (doubled) end points pinned to the base and tip widths.
+    starts = np.cumsum(verts_array) - verts_array
+    local_idx = np.arange(int(verts_array.sum())) - np.repeat(starts, verts_array)
+    decr = np.repeat((base_width - tip_width) / (verts_array - 2), verts_array)
+    widths = base_width - decr * (local_idx - 1)
+    widths[starts] = base_width
+    widths[starts + verts_array - 1] = tip_width
+    return widths.astype(np.float32)
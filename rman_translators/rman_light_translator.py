@@ -107,6 +107,7 @@ class RmanLightTranslator(RmanTranslator):
                     return
 
             sg_node = self.rman_scene.rman.SGManager.RixSGShader("Light", light_shader_name , rman_sg_light.db_name)
+            rman_sg_light.is_frame_sensitive = False
             property_utils.property_group_to_rixparams(light_shader, rman_sg_light, sg_node, ob=ob)
             
             rixparams = sg_node.params
@@ -6,13 +6,120 @@ from ..rfb_utils import shadergraph_utils
 from ..rfb_utils import color_utils
 from ..rfb_utils import gpmaterial_utils
 from ..rfb_utils import filepath_utils
+from ..rfb_utils import texture_utils
 from ..rfb_utils.shadergraph_utils import RmanConvertNode
 
 from ..rfb_logger import rfb_log
+import hashlib
 import math
 import re
 import bpy
 
+# Cache of built shader networks, keyed by material handle.
+# Each entry is a MaterialCacheEntry. This lives outside of
+# RmanScene, so that it survives across frames and renders.
+__MATERIAL_CACHE__ = dict()
+
+class MaterialCacheEntry(object):
+    def __init__(self, nodetree_hash, rman_sg_material):
+        self.nodetree_hash = nodetree_hash
+        self.sg_shaders = dict(rman_sg_material.sg_shaders)
+        self.is_frame_sensitive = rman_sg_material.is_frame_sensitive
+        self.frame = rman_sg_material.rman_scene.bl_frame_current
+
+def clear_material_cache():
+    __MATERIAL_CACHE__.clear()
+
+def _hash_value_(val):
+    if isinstance(val, (str, int, float, bool)) or val is None:
+        return val
+    try:
+        return tuple(_hash_value_(v) for v in val)
+    except TypeError:
+        return str(val)
+
+def _gather_nodetree_data_(nt, mat, data, seen, frame_params):
+    # Collect everything that can affect the exported shaders
+    # for this node tree: node params, socket values, links,
+    # ramps, the datablocks nodes point to, and the state of
+    # their textures in the txmanager. Params with frame tokens
+    # are added to frame_params.
+    if nt is None or nt in seen:
+        return
+    seen.add(nt)
+    txmgr = texture_utils.get_txmanager()
+    for node in sorted(nt.nodes, key=lambda n: n.name):
+        data.append((node.bl_idname, node.name, node.mute))
+        prop_meta = getattr(node, 'prop_meta', dict())
+        for prop in node.bl_rna.properties:
+            if prop.identifier == 'rna_type' or prop.type == 'COLLECTION':
+                continue
+            val = getattr(node, prop.identifier, None)
+            if prop.type == 'POINTER':
+                # images, objects, textures, etc. Only datablocks
+                # are hashed, by name (and file, for images)
+                if isinstance(val, bpy.types.ID):
+                    data.append((prop.identifier, val.name_full))
+                    if isinstance(val, bpy.types.Image):
+                        data.append(val.filepath)
+                continue
+            data.append((prop.identifier, _hash_value_(val)))
+            if property_utils.has_frame_token(val):
+                frame_params.append((node.name, prop.identifier))
+            if prop.type == 'STRING' and val and prop.identifier in prop_meta:
+                try:
+                    if shadergraph_utils.is_texture_property(prop.identifier, prop_meta[prop.identifier]):
+                        # the path is already in data. Whether the texture has been
+                        # converted yet changes the path the shader gets.
+                        txfile = txmgr.get_txfile(node, prop.identifier, ob=mat)
+                        data.append(getattr(txfile, 'state', None))
+                except KeyError:
+                    pass
+        for sock in node.inputs:
+            default_value = getattr(sock, 'default_value', None)
+            data.append((sock.identifier, sock.is_linked, _hash_value_(default_value)))
+            if property_utils.has_frame_token(default_value):
+                frame_params.append((node.name, sock.identifier))
+        color_ramp = getattr(node, 'color_ramp', None)
+        if color_ramp:
+            data.append([(e.position, tuple(e.color)) for e in color_ramp.elements])
+        mapping = getattr(node, 'mapping', None)
+        if mapping and hasattr(mapping, 'curves'):
+            data.append([[tuple(p.location) for p in c.points] for c in mapping.curves])
+
+        if node.bl_idname == 'ShaderNodeGroup':
+            _gather_nodetree_data_(node.node_tree, mat, data, seen, frame_params)
+        fake_group = getattr(node, 'rman_fake_node_group', '')
+        if fake_group:
+            _gather_nodetree_data_(bpy.data.node_groups.get(fake_group, None), mat, data, seen, frame_params)
+
+    for link in nt.links:
+        data.append((link.from_node.name, link.from_socket.identifier, 
+                    link.to_node.name, link.to_socket.identifier, link.is_muted))
+
+def get_nodetree_hash(mat, handle, frame):
+    '''Return a hash of everything in a material's node tree that affects
+    the shaders we export for it. If any string param has a frame token
+    (ex: <f4>), its expanded value changes every frame, so the frame is
+    part of the hash.
+
+    Args:
+        mat (bpy.types.Material) - the material
+        handle (str) - the material handle used to name the shaders
+        frame (int) - the frame being exported
+
+    Returns:
+        (str, bool) - hex digest of the node tree, and whether it has
+                      frame tokens
+    '''
+    data = [handle, bpy.data.filepath]
+    frame_params = list()
+    _gather_nodetree_data_(mat.node_tree, mat, data, set(), frame_params)
+    is_frame_sensitive = len(frame_params) > 0
+    if is_frame_sensitive:
+        data.append(('frame', frame))
+    return (hashlib.md5(repr(data).encode('utf-8')).hexdigest(), is_frame_sensitive)
+
 def get_root_node(node, type='bxdf'):
     rman_type = getattr(node, 'renderman_node_type', node.bl_idname)
     if rman_type == type:
@@ -36,16 +143,18 @@ class RmanMaterialTranslator(RmanTranslator):
 
         sg_material = self.rman_scene.sg_scene.CreateMaterial(db_name)
         rman_sg_material = RmanSgMaterial(self.rman_scene, sg_material, db_name)
-        self.update(mat, rman_sg_material)
+        self.update(mat, rman_sg_material, use_cache=True)
         return rman_sg_material
 
-    def update(self, mat, rman_sg_material, time_sample=0):
+    def update(self, mat, rman_sg_material, time_sample=0, use_cache=False):
 
         mat = mat.original
         rm = mat.renderman
         succeed = False
 
         rman_sg_material.has_meshlight = False
+        rman_sg_material.is_frame_sensitive = False
+        rman_sg_material.sg_shaders.clear()
         rman_sg_material.sg_node.SetBxdf(None)        
         rman_sg_material.sg_node.SetLight(None)
         rman_sg_material.sg_node.SetDisplace(None)        
@@ -56,12 +165,47 @@ class RmanMaterialTranslator(RmanTranslator):
                 self.export_shader_grease_pencil(mat, rman_sg_material, handle=handle)
                 return
 
+        nodetree_hash = None
+        if mat.node_tree and self.is_cacheable(mat):
+            nodetree_hash, is_frame_sensitive = get_nodetree_hash(mat, handle, self.rman_scene.bl_frame_current)
+            if use_cache and self.set_shaders_from_cache(rman_sg_material, handle, nodetree_hash):
+                return
+
         if mat.node_tree:
             succeed = self.export_shader_nodetree(mat, rman_sg_material, handle=handle)
+            if nodetree_hash and is_frame_sensitive:
+                rman_sg_material.is_frame_sensitive = True
+            if succeed and nodetree_hash and not rman_sg_material.has_meshlight:
+                __MATERIAL_CACHE__[handle] = MaterialCacheEntry(nodetree_hash, rman_sg_material)
 
         if not succeed:
             succeed = self.export_simple_shader(mat, rman_sg_material, mat_handle=handle)     
 
+    def is_cacheable(self, mat):
+        # Materials with a solo node or a light are never cached; 
+        # solo is only used for IPR, and lights have side effects (light filters,
+        # light groups) that aren't part of the shader network.
+        out = shadergraph_utils.is_renderman_nodetree(mat)
+        if not out or out.solo_node_name:
+            return False
+        return not out.inputs['Light'].is_linked
+
+    def set_shaders_from_cache(self, rman_sg_material, handle, nodetree_hash):
+        entry = __MATERIAL_CACHE__.get(handle, None)
+        if not entry or entry.nodetree_hash != nodetree_hash:
+            return False
+        if entry.is_frame_sensitive and entry.frame != self.rman_scene.bl_frame_current:
+            return False
+
+        rfb_log().debug("Using cached shaders for material: %s" % handle)
+        rman_sg_material.is_frame_sensitive = entry.is_frame_sensitive
+        rman_sg_material.sg_shaders.update(entry.sg_shaders)
+        if 'bxdf' in entry.sg_shaders:
+            rman_sg_material.sg_node.SetBxdf(entry.sg_shaders['bxdf'])
+        if 'displace' in entry.sg_shaders:
+            rman_sg_material.sg_node.SetDisplace(entry.sg_shaders['displace'])
+        return True
+
     def export_shader_grease_pencil(self, mat, rman_sg_material, handle):
         gp_mat = mat.grease_pencil
         rman_sg_material.is_gp_material = True
@@ -95,6 +239,7 @@ class RmanMaterialTranslator(RmanTranslator):
         instance = string_utils.sanitize_node_name(handle + '_PXRDIFFUSE')
         sg_node = self.rman_scene.rman.SGManager.RixSGShader("Bxdf", 'PxrDiffuse', instance) 
         rman_sg_material.sg_node.SetBxdf([sg_node])                   
+        rman_sg_material.sg_shaders['bxdf'] = [sg_node]
              
     def export_shader_nodetree(self, material, rman_sg_material, handle):
 
@@ -133,6 +278,7 @@ class RmanMaterialTranslator(RmanTranslator):
                         
                         if bxdfList:
                             rman_sg_material.sg_node.SetBxdf(bxdfList)   
+                            rman_sg_material.sg_shaders['bxdf'] = bxdfList
                     else:
                         self.create_pxrdiffuse_node(rman_sg_material, handle)         
                 else:
@@ -175,6 +321,7 @@ class RmanMaterialTranslator(RmanTranslator):
                                                                               
                         if dispList:
                             rman_sg_material.sg_node.SetDisplace(dispList)  
+                            rman_sg_material.sg_shaders['displace'] = dispList
 
                 return True                        
                     
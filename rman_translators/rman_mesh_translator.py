@@ -4,31 +4,34 @@ from ..rfb_utils import object_utils
 from ..rfb_utils import string_utils
 from ..rfb_utils import property_utils
 from ..rfb_utils import scenegraph_utils
+from ..rfb_utils.prefs_utils import get_pref
 from ..rfb_logger import rfb_log
+from .. import rman_constants
 
 import bpy
 import math
+import hashlib
+import operator
 import numpy as np
 
-def _get_mats_faces_(nverts, material_ids):
-
+def _get_mats_faces_(material_ids):
+    # partition the faces by material index, using a stable sort
+    # so that the face ids for each material stay in ascending order
+    material_ids = np.asarray(material_ids)
+    order = np.argsort(material_ids, kind='stable').astype(np.int32)
+    mat_ids, starts = np.unique(material_ids[order], return_index=True)
     mats = {}
-    for face_id, num_verts in enumerate(nverts):
-        mat_id = material_ids[face_id]
-        if mat_id not in mats:
-            mats[mat_id] = []
-        mats[mat_id].append(face_id)
+    for mat_id, faces in zip(mat_ids.tolist(), np.split(order, starts[1:])):
+        mats[mat_id] = faces
     return mats
 
-def _is_multi_material_(ob, mesh):
+def _is_multi_material_(ob, mesh, material_ids=None):
     if len(ob.data.materials) < 2 or len(mesh.polygons) == 0:
         return False
 
-    first_mat = mesh.polygons[0].material_index
-    for p in mesh.polygons:
-        if p.material_index != first_mat:
-            return True
-    return False
+    if material_ids is None:
+        material_ids = _get_material_ids(ob, mesh)
+    return bool((material_ids != material_ids[0]).any())
 
 # requires facevertex interpolation
 def _get_mesh_uv_(mesh, name=""):
@@ -89,26 +92,48 @@ def _get_mesh_vattr_(mesh, name=""):
 
     return attrs 
 
-def _get_mesh_vgroup_(ob, mesh, name=""):
-    vgroup = ob.vertex_groups[name] if name != "" else ob.vertex_groups.active
-    weights = []
-
-    if vgroup is None:
-        return None
-
+def _get_mesh_vgroups_(ob, mesh, names):
+    # Build dense, per vertex, weight arrays for all of the requested vertex groups,
+    # keyed by the requested name. Vertices not in a group get a weight of 0.
+    group_indices = dict()
+    for name in names:
+        vgroup = ob.vertex_groups.get(name, None) if name != "" else ob.vertex_groups.active
+        if vgroup is not None:
+            group_indices[name] = vgroup.index
+
+    weights = dict()
+    if not group_indices:
+        return weights
+
+    # gather every vertex's group assignments in one flattened pass,
+    # and scatter the ones we want into their group's row
+    num_verts = len(mesh.vertices)
+    rows = dict([(idx, i) for i, idx in enumerate(set(group_indices.values()))])
+    dense_weights = np.zeros((len(rows), num_verts), dtype=np.float32)
+    counts = list()
+    elements = list()
     for v in mesh.vertices:
-        if len(v.groups) == 0:
-            weights.append(0.0)
-        else:
-            weights.extend([g.weight for g in v.groups
-                            if g.group == vgroup.index])
-
+        groups = v.groups
+        counts.append(len(groups))
+        elements.extend(groups)
+    if elements:
+        group_ids = np.fromiter(map(operator.attrgetter('group'), elements), dtype=np.int64, count=len(elements))
+        group_weights = np.fromiter(map(operator.attrgetter('weight'), elements), dtype=np.float32, count=len(elements))
+        vert_indices = np.repeat(np.arange(num_verts), counts)
+        group_rows = np.full(max(int(group_ids.max()), max(rows)) + 1, -1, dtype=np.int64)
+        for idx, row in rows.items():
+            group_rows[idx] = row
+        assigned_rows = group_rows[group_ids]
+        wanted = assigned_rows >= 0
+        dense_weights[assigned_rows[wanted], vert_indices[wanted]] = group_weights[wanted]
+
+    for name, idx in group_indices.items():
+        weights[name] = dense_weights[rows[idx]]
     return weights
 
 def _get_material_ids(ob, geo):        
-    fast_material_ids = np.zeros(len(geo.polygons), dtype=np.int)
-    geo.polygons.foreach_get("material_index", fast_material_ids)
-    material_ids = fast_material_ids.tolist()
+    material_ids = np.zeros(len(geo.polygons), dtype=np.int32)
+    geo.polygons.foreach_get("material_index", material_ids)
     return material_ids
 
 def _export_reference_pose(ob, rm, rixparams, vertex_detail):
@@ -161,8 +186,8 @@ def _export_reference_pose(ob, rm, rixparams, vertex_detail):
         rixparams.SetNormalDetail('__WNref', rman__WNref, 'vertex')
     '''
 
-def export_tangents(ob, geo, rixparams, uvmap="", name=""):
-    # also export the tangent and bitangent vectors
+def _get_mesh_tangents_(geo, uvmap=""):
+    # returns the tangent and bitangent vectors, or None if they can't be computed
     try:
         if uvmap == "":
             geo.calc_tangents(uvmap=geo.uv_layers.active.name)         
@@ -178,15 +203,136 @@ def export_tangents(ob, geo, rixparams, uvmap="", name=""):
         geo.loops.foreach_get('bitangent', fastbitangent)
         bitangent = fastbitangent.tolist()      
         geo.free_tangents()    
-
-        if name == "":
-            rixparams.SetVectorDetail('Tn', tangents, 'facevarying')
-            rixparams.SetVectorDetail('Bn', bitangent, 'facevarying')    
-        else:
-            rixparams.SetVectorDetail('%s_Tn' % name, tangents, 'facevarying')
-            rixparams.SetVectorDetail('%s_Bn' % name, bitangent, 'facevarying')                
+        return (tangents, bitangent)
     except RuntimeError as err:
         rfb_log().debug("Can't export tangent vectors: %s" % str(err))       
+    return None
+
+def _set_mesh_tangents_(rixparams, tangents, bitangent, name=""):
+    if name == "":
+        rixparams.SetVectorDetail('Tn', tangents, 'facevarying')
+        rixparams.SetVectorDetail('Bn', bitangent, 'facevarying')    
+    else:
+        rixparams.SetVectorDetail('%s_Tn' % name, tangents, 'facevarying')
+        rixparams.SetVectorDetail('%s_Bn' % name, bitangent, 'facevarying')                
+
+def export_tangents(ob, geo, rixparams, uvmap="", name=""):
+    # also export the tangent and bitangent vectors
+    result = _get_mesh_tangents_(geo, uvmap=uvmap)
+    if result:
+        _set_mesh_tangents_(rixparams, result[0], result[1], name=name)
+
+def _hash_layer_(hasher, collection, attr, size):
+    values = np.zeros(len(collection) * size, dtype=np.float32)
+    collection.foreach_get(attr, values)
+    hasher.update(values.tobytes())
+
+def _get_topology_fingerprint_(ob, rman_sg_mesh, geo, nverts, verts, material_ids, get_normals):
+    # Hash everything update() sends to the mesh, other than the primvars
+    # that depend on the point positions (P, N and tangents). If this
+    # doesn't change between updates, we only need to resend those.
+    rm = ob.original.data.renderman
+    rm_scene = rman_sg_mesh.rman_scene.bl_scene.renderman
+    hasher = hashlib.md5()
+    hasher.update(np.asarray(nverts, dtype=np.int32).tobytes())
+    hasher.update(np.asarray(verts, dtype=np.int32).tobytes())
+
+    settings = [rman_sg_mesh.is_subdiv, rman_sg_mesh.is_deforming, get_normals,
+                getattr(ob.data.renderman, 'rman_subdiv_scheme', 'none'),
+                rm.export_default_uv, rm.export_default_vcol, len(rm.reference_pose)]
+    if rman_sg_mesh.is_subdiv:
+        settings.extend([ob.data.renderman.rman_subdivInterp,
+                         ob.data.renderman.rman_subdivFacevaryingInterp])
+        _hash_layer_(hasher, geo.edges, 'crease', 1)
+    for p in rm.prim_vars:
+        settings.append((p.name, p.data_source, p.data_name, p.export_tangents))
+    for prop_name, meta in rm.prop_meta.items():
+        if 'primvar' in meta:
+            settings.append((prop_name, str(getattr(rm, prop_name)), str(getattr(rm_scene, prop_name, None))))
+    if material_ids is not None:
+        hasher.update(material_ids.tobytes())
+        for mat in ob.data.materials:
+            if not mat:
+                settings.append(None)
+                continue
+            sg_material = rman_sg_mesh.rman_scene.rman_materials.get(mat.original, None)
+            settings.append((mat.original.name_full, id(sg_material)))
+    hasher.update(repr(settings).encode('utf-8'))
+    _hash_mesh_primvars_(hasher, ob, geo)
+    return hasher.hexdigest()
+
+def _hash_mesh_primvars_(hasher, ob, geo):
+    # facevarying and vertex primvars
+    rm = ob.original.data.renderman
+    if rm.export_default_uv and geo.uv_layers.active:
+        _hash_layer_(hasher, geo.uv_layers.active.data, 'uv', 2)
+    if rm.export_default_vcol and geo.vertex_colors.active:
+        _hash_layer_(hasher, geo.vertex_colors.active.data, 'color', 4)
+    vgroup_names = []
+    for p in rm.prim_vars:
+        if p.data_source == 'UV_TEXTURE':
+            layer = geo.uv_layers.get(p.data_name, None)
+            if layer:
+                _hash_layer_(hasher, layer.data, 'uv', 2)
+        elif p.data_source == 'VERTEX_COLOR':
+            layer = geo.vertex_colors.get(p.data_name, None)
+            if layer:
+                _hash_layer_(hasher, layer.data, 'color', 4)
+        elif p.data_source == 'VERTEX_ATTR_COLOR':
+            layer = geo.attributes.get(p.data_name, None)
+            if layer:
+                _hash_layer_(hasher, layer.data, 'color', 4)
+        elif p.data_source == 'VERTEX_GROUP':
+            vgroup_names.append(p.data_name)
+    for name, weights in _get_mesh_vgroups_(ob, geo, vgroup_names).items():
+        hasher.update(name.encode('utf-8'))
+        hasher.update(weights.tobytes())
+
+    if len(rm.reference_pose) > 0:
+        for attr in ('rman__Pref', 'rman__WPref', 'rman__Nref', 'rman__WNref'):
+            _hash_layer_(hasher, rm.reference_pose, attr, 3)
+
+def get_content_hash(ob, geo, rm_scene, material_hashes):
+    '''Return a hash of everything we write out for a mesh, including the point
+    positions and the materials, but not its transform. Unlike the topology fingerprint,
+    this only depends on the content of the mesh, so it is the same across sessions
+    and can be used to name files.
+
+    Args:
+        ob (bpy.types.Object) - the mesh object
+        geo (bpy.types.Mesh) - the evaluated mesh
+        rm_scene (RendermanSceneSettings) - the scene's renderman settings
+        material_hashes (list) - hashes of the object's materials, in slot order
+
+    Returns:
+        (str) - hex digest of the mesh
+    '''
+    rm = ob.original.data.renderman
+    rm_ob = ob.original.renderman
+    hasher = hashlib.md5()
+    _hash_layer_(hasher, geo.vertices, 'co', 3)
+    npolys = len(geo.polygons)
+    for attr in ('loop_total', 'material_index', 'use_smooth'):
+        values = np.zeros(npolys, dtype=np.int32)
+        geo.polygons.foreach_get(attr, values)
+        hasher.update(values.tobytes())
+    verts = np.zeros(len(geo.loops), dtype=np.int32)
+    geo.loops.foreach_get('vertex_index', verts)
+    hasher.update(verts.tobytes())
+    _hash_layer_(hasher, geo.edges, 'crease', 1)
+
+    settings = [rman_constants.RFB_ADDON_VERSION_STRING, object_utils.is_subdmesh(ob), 
+                geo.use_auto_smooth, len(rm.reference_pose), material_hashes]
+    for prop_name in rm.prop_meta:
+        settings.append((prop_name, str(getattr(rm, prop_name)), str(getattr(rm_scene, prop_name, None))))
+    for p in rm.prim_vars:
+        settings.append((p.name, p.data_source, p.data_name, p.export_tangents))
+    for prop_name, meta in rm_ob.prop_meta.items():
+        if 'primvar' in meta:
+            settings.append((prop_name, str(getattr(rm_ob, prop_name)), str(getattr(rm_scene, prop_name, None))))
+    hasher.update(repr(settings).encode('utf-8'))
+    _hash_mesh_primvars_(hasher, ob, geo)
+    return hasher.hexdigest()
 
 def _get_primvars_(ob, rman_sg_mesh, geo, rixparams):
     #rm = ob.data.renderman
@@ -215,6 +361,8 @@ def _get_primvars_(ob, rman_sg_mesh, geo, rixparams):
         _export_reference_pose(ob, rm, rixparams, vertex_detail)
     
     # custom prim vars
+    vgroup_names = [p.data_name for p in rm.prim_vars if p.data_source == 'VERTEX_GROUP']
+    vgroup_weights = _get_mesh_vgroups_(ob, geo, vgroup_names) if vgroup_names else dict()
     for p in rm.prim_vars:
         if p.data_source == 'VERTEX_COLOR':
             vcols = _get_mesh_vcol_(geo, p.data_name)
@@ -232,10 +380,10 @@ def _get_primvars_(ob, rman_sg_mesh, geo, rixparams):
                     export_tangents(ob, geo, rixparams, uvmap=p.data_name, name=p.name) 
 
         elif p.data_source == 'VERTEX_GROUP':
-            weights = _get_mesh_vgroup_(ob, geo, p.data_name)
-            if weights and len(weights) > 0:
+            weights = vgroup_weights.get(p.data_name, None)
+            if weights is not None and len(weights) > 0:
                 detail = "facevarying" if facevarying_detail == len(weights) else "vertex"
-                rixparams.SetFloatDetail(p.name, weights, detail)
+                scenegraph_utils.set_primvar_buffer(rixparams.SetFloatDetail, p.name, weights, detail)
         elif p.data_source == 'VERTEX_ATTR_COLOR':
             vattr = _get_mesh_vattr_(geo, p.data_name)            
             if vattr and len(vattr) > 0:
@@ -272,37 +420,68 @@ class RmanMeshTranslator(RmanTranslator):
         self.bl_type = 'MESH' 
 
     def _get_subd_tags_(self, ob, mesh, primvar):
-        creases = []
+        num_edges = len(mesh.edges)
+        crease_values = np.zeros(num_edges, dtype=np.float32)
+        mesh.edges.foreach_get('crease', crease_values)
+        edge_verts = np.zeros(num_edges * 2, dtype=np.int32)
+        mesh.edges.foreach_get('vertices', edge_verts)
 
         # only do creases 1 edge at a time for now,
         # detecting chains might be tricky..
-        for e in mesh.edges:
-            if e.crease > 0.0:
-                creases.append((e.vertices[0], e.vertices[1],
-                                e.crease * e.crease * 10))
-                # squared, to match blender appareance better
-                #: range 0 - 10 (infinitely sharp)
+        crease_edges = np.nonzero(crease_values > 0.0)[0]
+        num_creases = len(crease_edges)
 
         tags = ['interpolateboundary', 'facevaryinginterpolateboundary']
-        nargs = [1, 0, 0, 1, 0, 0]
-        intargs = [ int(ob.data.renderman.rman_subdivInterp),
-                int(ob.data.renderman.rman_subdivFacevaryingInterp)]
-        floatargs = []
-        stringargs = []   
+        tags.extend(['crease'] * num_creases)
+
+        nargs = np.empty(6 + num_creases * 3, dtype=np.int32)
+        nargs[:6] = [1, 0, 0, 1, 0, 0]
+        nargs[6:] = np.tile(np.array([2, 1, 0], dtype=np.int32), num_creases)
 
-        if len(creases) > 0:
-            for c in creases:
-                tags.append('crease')
-                nargs.extend([2, 1, 0])
-                intargs.extend([c[0], c[1]])
-                floatargs.append(c[2])           
+        intargs = np.empty(2 + num_creases * 2, dtype=np.int32)
+        intargs[0] = int(ob.data.renderman.rman_subdivInterp)
+        intargs[1] = int(ob.data.renderman.rman_subdivFacevaryingInterp)
+        intargs[2:] = edge_verts.reshape(-1, 2)[crease_edges].ravel()
+
+        # squared, to match blender appareance better
+        #: range 0 - 10 (infinitely sharp)
+        floatargs = crease_values[crease_edges]
+        floatargs = floatargs * floatargs * 10
+        stringargs = []   
 
         primvar.SetStringArray(self.rman_scene.rman.Tokens.Rix.k_Ri_subdivtags, tags, len(tags))
-        primvar.SetIntegerArray(self.rman_scene.rman.Tokens.Rix.k_Ri_subdivtagnargs, nargs, len(nargs))
-        primvar.SetIntegerArray(self.rman_scene.rman.Tokens.Rix.k_Ri_subdivtagintargs, intargs, len(intargs))
-        primvar.SetFloatArray(self.rman_scene.rman.Tokens.Rix.k_Ri_subdivtagfloatargs, floatargs, len(floatargs))
+        scenegraph_utils.set_primvar_buffer(primvar.SetIntegerArray, self.rman_scene.rman.Tokens.Rix.k_Ri_subdivtagnargs, nargs, len(nargs))
+        scenegraph_utils.set_primvar_buffer(primvar.SetIntegerArray, self.rman_scene.rman.Tokens.Rix.k_Ri_subdivtagintargs, intargs, len(intargs))
+        scenegraph_utils.set_primvar_buffer(primvar.SetFloatArray, self.rman_scene.rman.Tokens.Rix.k_Ri_subdivtagfloatargs, floatargs, len(floatargs))
         primvar.SetStringArray(self.rman_scene.rman.Tokens.Rix.k_Ri_subdivtagstringtags, stringargs, len(stringargs))        
 
+    def _update_points_(self, ob, rman_sg_mesh, mesh, sg_node, P, N):
+        # The topology and facevarying data haven't changed since the last update,
+        # so only resend the primvars that depend on the point positions.
+        rm = ob.original.data.renderman
+        numnverts = rman_sg_mesh.nverts
+
+        # tangents depend on the point positions as well
+        tangents = []
+        if rm.export_default_uv and mesh.uv_layers.active:
+            tangents.append(("", _get_mesh_tangents_(mesh)))
+        for p in rm.prim_vars:
+            if p.data_source == 'UV_TEXTURE' and p.export_tangents and mesh.uv_layers.get(p.data_name, None):
+                tangents.append((p.name, _get_mesh_tangents_(mesh, uvmap=p.data_name)))
+
+        for node in [sg_node] + rman_sg_mesh.multi_material_children:
+            primvar = node.GetPrimVars()
+            if rman_sg_mesh.is_deforming and len(rman_sg_mesh.deform_motion_steps) > 1:
+                super().set_primvar_times(rman_sg_mesh.deform_motion_steps, primvar)
+            scenegraph_utils.set_primvar_buffer(primvar.SetPointDetail, self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex")
+            if len(N) > 0:
+                detail = "facevarying" if len(N) == numnverts else "uniform"
+                scenegraph_utils.set_primvar_buffer(primvar.SetNormalDetail, self.rman_scene.rman.Tokens.Rix.k_N, N, detail)
+            for name, result in tangents:
+                if result:
+                    _set_mesh_tangents_(primvar, result[0], result[1], name=name)
+            node.SetPrimVars(primvar)
+
     def export(self, ob, db_name):
         
         sg_node = self.rman_scene.sg_scene.CreateMesh(db_name)
@@ -314,14 +493,20 @@ class RmanMeshTranslator(RmanTranslator):
 
         return rman_sg_mesh
 
-    def export_deform_sample(self, rman_sg_mesh, ob, time_sample, sg_node=None):
-
-        mesh = None
+    def get_deform_points(self, ob):
         mesh = ob.to_mesh()
+        use_buffers = get_pref('rman_mesh_export_buffers', default=True)
+        P = object_utils._get_mesh_points_(mesh, as_array=use_buffers)
+        ob.to_mesh_clear()
+        return P
+
+    def export_deform_sample(self, rman_sg_mesh, ob, time_sample, sg_node=None, P=None):
+
+        if P is None:
+            P = self.get_deform_points(ob)
         if not sg_node:
             sg_node = rman_sg_mesh.sg_node
         primvar = sg_node.GetPrimVars()
-        P = object_utils._get_mesh_points_(mesh)
         npoints = len(P)
 
         if rman_sg_mesh.npoints != npoints:
@@ -336,18 +521,16 @@ class RmanMeshTranslator(RmanTranslator):
                     c.SetPrimVars(pvar)            
             return       
 
-        primvar.SetPointDetail(self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex", time_sample)                            
+        scenegraph_utils.set_primvar_buffer(primvar.SetPointDetail, self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex", time_sample)
 
         sg_node.SetPrimVars(primvar)
 
         if rman_sg_mesh.is_multi_material:
             for c in rman_sg_mesh.multi_material_children:
                 pvar = c.GetPrimVars()
-                pvar.SetPointDetail(self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex", time_sample)                                  
+                scenegraph_utils.set_primvar_buffer(pvar.SetPointDetail, self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex", time_sample)
                 c.SetPrimVars(pvar)
 
-        ob.to_mesh_clear()    
-
     def update(self, ob, rman_sg_mesh, input_mesh=None, sg_node=None):
         rm = ob.renderman
         mesh = input_mesh
@@ -362,10 +545,11 @@ class RmanMeshTranslator(RmanTranslator):
         rman_sg_mesh.is_subdiv = object_utils.is_subdmesh(ob)
         use_smooth_normals = getattr(ob.data.renderman, 'rman_smoothnormals', False)
         get_normals = (rman_sg_mesh.is_subdiv == 0 and not use_smooth_normals)
-        (nverts, verts, P, N) = object_utils._get_mesh_(mesh, get_normals=get_normals)
+        use_buffers = get_pref('rman_mesh_export_buffers', default=True)
+        (nverts, verts, P, N) = object_utils._get_mesh_(mesh, get_normals=get_normals, as_array=use_buffers)
         
         # if this is empty continue:
-        if nverts == []:
+        if len(nverts) == 0:
             if not input_mesh:
                 ob.to_mesh_clear()
             rman_sg_mesh.npoints = 0
@@ -373,18 +557,36 @@ class RmanMeshTranslator(RmanTranslator):
             rman_sg_mesh.nverts = 0
             rman_sg_mesh.is_transforming = False
             rman_sg_mesh.is_deforming = False
+            rman_sg_mesh.topology_fingerprint = None
             return None
 
         npolys = len(nverts) 
         npoints = len(P)
         numnverts = len(verts)
 
+        material_ids = None
+        if len(ob.data.materials) > 1:
+            material_ids = _get_material_ids(ob, mesh)
+
+        # if only the points moved, skip resending the topology
+        # and facevarying data. Only IPR updates the same mesh again, so
+        # other renders don't pay for the fingerprint.
+        fingerprint = None
+        if self.rman_scene.is_interactive or rman_sg_mesh.topology_fingerprint is not None:
+            fingerprint = _get_topology_fingerprint_(ob, rman_sg_mesh, mesh, nverts, verts, material_ids, get_normals)
+        if fingerprint is not None and fingerprint == rman_sg_mesh.topology_fingerprint and npoints == rman_sg_mesh.npoints:
+            self._update_points_(ob, rman_sg_mesh, mesh, sg_node, P, N)
+            if not input_mesh:
+                ob.to_mesh_clear()
+            return True
+        rman_sg_mesh.topology_fingerprint = fingerprint
+
         rman_sg_mesh.npoints = npoints
         rman_sg_mesh.npolys = npolys
         rman_sg_mesh.nverts = numnverts
 
         sg_node.Define( npolys, npoints, numnverts )
-        rman_sg_mesh.is_multi_material = _is_multi_material_(ob, mesh)
+        rman_sg_mesh.is_multi_material = _is_multi_material_(ob, mesh, material_ids=material_ids)
             
         primvar = sg_node.GetPrimVars()
         primvar.Clear()
@@ -392,11 +594,11 @@ class RmanMeshTranslator(RmanTranslator):
         if rman_sg_mesh.is_deforming and len(rman_sg_mesh.deform_motion_steps) > 1:
             super().set_primvar_times(rman_sg_mesh.deform_motion_steps, primvar)
         
-        primvar.SetPointDetail(self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex")
+        scenegraph_utils.set_primvar_buffer(primvar.SetPointDetail, self.rman_scene.rman.Tokens.Rix.k_P, P, "vertex")
         _get_primvars_(ob, rman_sg_mesh, mesh, primvar)   
 
-        primvar.SetIntegerDetail(self.rman_scene.rman.Tokens.Rix.k_Ri_nvertices, nverts, "uniform")
-        primvar.SetIntegerDetail(self.rman_scene.rman.Tokens.Rix.k_Ri_vertices, verts, "facevarying")                  
+        scenegraph_utils.set_primvar_buffer(primvar.SetIntegerDetail, self.rman_scene.rman.Tokens.Rix.k_Ri_nvertices, nverts, "uniform")
+        scenegraph_utils.set_primvar_buffer(primvar.SetIntegerDetail, self.rman_scene.rman.Tokens.Rix.k_Ri_vertices, verts, "facevarying")
 
         if rman_sg_mesh.is_subdiv:
             creases = self._get_subd_tags_(ob, mesh, primvar)
@@ -408,18 +610,22 @@ class RmanMeshTranslator(RmanTranslator):
 
         else:
             sg_node.SetScheme(None)
-            if N:
+            if len(N) > 0:
                 if len(N) == numnverts:
-                    primvar.SetNormalDetail(self.rman_scene.rman.Tokens.Rix.k_N, N, "facevarying")         
+                    scenegraph_utils.set_primvar_buffer(primvar.SetNormalDetail, self.rman_scene.rman.Tokens.Rix.k_N, N, "facevarying")
                 else:
-                    primvar.SetNormalDetail(self.rman_scene.rman.Tokens.Rix.k_N, N, "uniform")         
+                    scenegraph_utils.set_primvar_buffer(primvar.SetNormalDetail, self.rman_scene.rman.Tokens.Rix.k_N, N, "uniform")
         subdiv_scheme = getattr(ob.data.renderman, 'rman_subdiv_scheme', 'none')
         rman_sg_mesh.subdiv_scheme = subdiv_scheme
 
+        for c in rman_sg_mesh.multi_material_children:
+            sg_node.RemoveChild(c)
+            self.rman_scene.sg_scene.DeleteDagNode(c)
+        rman_sg_mesh.multi_material_children = []
+
         if rman_sg_mesh.is_multi_material:
-            material_ids = _get_material_ids(ob, mesh)
             for mat_id, faces in \
-                _get_mats_faces_(nverts, material_ids).items():
+                _get_mats_faces_(material_ids).items():
 
                 mat = ob.data.materials[mat_id]
                 if not mat:
@@ -427,7 +633,7 @@ class RmanMeshTranslator(RmanTranslator):
                 sg_material = self.rman_scene.rman_materials.get(mat.original, None)
 
                 if mat_id == 0:
-                    primvar.SetIntegerArray(self.rman_scene.rman.Tokens.Rix.k_shade_faceset, faces, len(faces))
+                    scenegraph_utils.set_primvar_buffer(primvar.SetIntegerArray, self.rman_scene.rman.Tokens.Rix.k_shade_faceset, faces, len(faces))
                     scenegraph_utils.set_material(sg_node, sg_material.sg_node)
                 else:                
                     sg_sub_mesh =  self.rman_scene.sg_scene.CreateMesh("")
@@ -438,15 +644,13 @@ class RmanMeshTranslator(RmanTranslator):
                     if rman_sg_mesh.is_deforming and len(rman_sg_mesh.deform_motion_steps) > 1:
                         super().set_primvar_times(rman_sg_mesh.deform_motion_steps, pvars)
                     pvars.Inherit(primvar)
-                    pvars.SetIntegerArray(self.rman_scene.rman.Tokens.Rix.k_shade_faceset, faces, len(faces))                    
+                    scenegraph_utils.set_primvar_buffer(pvars.SetIntegerArray, self.rman_scene.rman.Tokens.Rix.k_shade_faceset, faces, len(faces))                    
                     sg_sub_mesh.SetPrimVars(pvars)
                     # call export_object_primvars so we can get things like displacement bound
                     super().export_object_primvars(ob, rman_sg_mesh, sg_sub_mesh)
                     scenegraph_utils.set_material(sg_sub_mesh, sg_material.sg_node)
                     sg_node.AddChild(sg_sub_mesh)
                     rman_sg_mesh.multi_material_children.append(sg_sub_mesh)
-        else:
-            rman_sg_mesh.multi_material_children = []
 
         sg_node.SetPrimVars(primvar)
 
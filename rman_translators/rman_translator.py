@@ -6,6 +6,7 @@ from ..rfb_utils import object_utils
 from ..rfb_utils import prefs_utils
 from ..rfb_utils import shadergraph_utils
 from ..rfb_utils import scene_utils
+from ..rfb_utils import profile_utils
 import hashlib
 import os
 
@@ -35,6 +36,15 @@ class RmanTranslator(object):
     def __init__(self, rman_scene):
         self.rman_scene = rman_scene
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # time the main entry points of every translator,
+        # when the export profiler is on
+        for method_name in ('export', 'update', 'export_deform_sample'):
+            method = cls.__dict__.get(method_name, None)
+            if method:
+                setattr(cls, method_name, profile_utils.profile_translator(method))
+
     @property
     def rman_scene(self):
         return self.__rman_scene